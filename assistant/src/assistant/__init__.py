@@ -8,6 +8,10 @@ from google.genai import types
 
 load_dotenv()
 
+# The tools read their settings from the environment, so they're imported after .env is loaded
+from assistant.registry import function_declarations, get_tool_result, get_tool_result_async
+from assistant.tools.weather import prefetch_weather
+
 client = genai.Client(
     api_key=os.environ.get("GOOGLE_API_KEY")
 )
@@ -107,14 +111,12 @@ def get_system_message() -> str:
 model = "claude-3-5-haiku-20241022"
 
 async def run() -> None:
+    # Keep the weather for LOCATION cached, since it's what gets asked about most
+    prefetch_weather()
+
     tools = [
         {'code_execution': {}},
-        {
-            "function_declarations": [
-                # TODO
-                {"name": "turn_on_the_lights"}, {"name": "turn_off_the_lights"}
-            ]
-        }
+        {"function_declarations": function_declarations()}
     ]
     
     config = types.LiveConnectConfig(
@@ -143,32 +145,20 @@ async def run() -> None:
                 function_responses = []
                 for fc in chunk.tool_call.function_calls:
                     print(f"Tool call: {fc.name}({fc.args})")
+                    try:
+                        response = {"result": await get_tool_result_async(fc.name, fc.args or {})}
+                    except Exception as e:
+                        response = {"error": str(e)}
                     function_response = types.FunctionResponse(
                         id=fc.id,
                         name=fc.name,
-                        response={ "result": "ok" } # Temporary
+                        response=response
                     )
                     function_responses.append(function_response)
 
                 await session.send_tool_response(function_responses=function_responses)
 
 
-def get_tool_result(tool_name: str, tool_input: object) -> str:
-    from assistant.tools.calculator import calculate
-    from assistant.tools.weather import get_weather
-    from assistant.tools.time import get_time
-
-    if tool_name == "calculate":
-        return calculate(tool_input["expression"]) # type: ignore
-    elif tool_name == "get_weather":
-        data = get_weather(tool_input["location"]) # type: ignore
-        print("Weather data:", data)
-        return data
-    elif tool_name == "get_time":
-        return get_time(tool_input["timezone"]) # type: ignore
-    else:
-        raise ValueError(f"Unknown tool name: {tool_name}")
-
 def main() -> int:
     asyncio.run(run())
     return 0
\ No newline at end of file
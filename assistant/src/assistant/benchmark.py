@@ -0,0 +1,265 @@
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from assistant.tools.calculator import Token, TokenType, FUNCTIONS, CONSTANTS, tokenize, compile_expression, calculate, calculate_many
+
+def legacy_evaluate(tokens: list[Token]) -> float:
+    """
+    The calculator's previous evaluator, which consumes the tokens with pop(0), making it
+    quadratic in the length of the expression. Kept here as the baseline.
+    """
+    def add_sub():
+        result = mul_div()
+        while tokens and tokens[0].type in (TokenType.PLUS, TokenType.MINUS):
+            if tokens.pop(0).type == TokenType.PLUS:
+                result += mul_div()
+            else:
+                result -= mul_div()
+        return result
+
+    def mul_div():
+        result = exponent()
+        while tokens and tokens[0].type in (TokenType.MULTIPLY, TokenType.DIVIDE):
+            if tokens.pop(0).type == TokenType.MULTIPLY:
+                result *= exponent()
+            else:
+                result /= exponent()
+        return result
+
+    def exponent():
+        result = unary()
+        while tokens and tokens[0].type == TokenType.EXPONENT:
+            tokens.pop(0)
+            result **= unary()
+        return result
+
+    def unary():
+        if tokens and tokens[0].type == TokenType.MINUS:
+            tokens.pop(0)
+            return -primary()
+        return primary()
+
+    def primary():
+        token = tokens.pop(0)
+        if token.type == TokenType.NUMBER:
+            return float(token.value)
+        if token.type == TokenType.IDENTIFIER:
+            if token.value in CONSTANTS:
+                return CONSTANTS[token.value]
+            tokens.pop(0)  # '('
+            result = FUNCTIONS[token.value](add_sub())
+            tokens.pop(0)  # ')'
+            return result
+        result = add_sub()
+        tokens.pop(0)  # ')'
+        return result
+
+    return add_sub()
+
+def random_expression(rng: random.Random, terms: int) -> str:
+    """
+    A long, well-behaved expression like the ones the model writes when it does a whole
+    calculation in one call: sums of products, constants, functions and parentheses.
+    """
+    parts = []
+    for i in range(terms):
+        kind = rng.random()
+        if kind < 0.4:
+            term = f"{rng.uniform(0, 1000):.2f}"
+        elif kind < 0.6:
+            term = f"{rng.choice(['sqrt', 'sin', 'cos', 'abs'])}({rng.uniform(0, 100):.1f})"
+        elif kind < 0.8:
+            term = f"({rng.uniform(1, 10):.1f} * {rng.choice(list(CONSTANTS))} - {rng.randint(1, 9)})"
+        else:
+            term = f"{rng.uniform(1, 2):.3f}^{rng.randint(1, 3)}"
+        if i > 0:
+            parts.append(rng.choice([" + ", " - ", " * ", " / "]))
+        parts.append(term)
+    return "".join(parts)
+
+def measure(function, repeats: int) -> float:
+    # Best of a few runs, in seconds per call
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            function()
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return best
+
+def benchmark_calculator(lengths=(10, 100, 1000, 10000), batch_size=100, table_rows=1000, seed=0):
+    """
+    Compare the previous pop(0) evaluator with compiling (uncached and cached) on expressions of
+    increasing length, time calculate_many on a batch of them, and compare evaluating a table
+    one row at a time with evaluating it over variables.
+    """
+    rng = random.Random(seed)
+    print(f"{'Terms':>6}{'Tokens':>8}{'Previous (ms)':>15}{'Compile (ms)':>14}{'Cached (ms)':>13}{'Speedup':>9}{'Cached speedup':>16}")
+    for terms in lengths:
+        expression = random_expression(rng, terms)
+        tokens = tokenize(expression)
+        repeats = max(1, 2000 // terms)
+
+        expected = legacy_evaluate(list(tokens))
+        result = compile_expression(expression).evaluate()
+        if not math.isclose(result, expected, rel_tol=1e-9, abs_tol=1e-9):
+            raise AssertionError(f"Results differ for a {terms}-term expression: {result} != {expected}")
+
+        previous = measure(lambda: legacy_evaluate(tokenize(expression)), repeats)
+        compiled = measure(lambda: compile_expression.__wrapped__(expression).evaluate(), repeats)
+        cached = measure(lambda: compile_expression(expression).evaluate(), repeats)
+        print(f"{terms:>6}{len(tokens):>8}{previous * 1000:>15.3f}{compiled * 1000:>14.3f}{cached * 1000:>13.3f}"
+              f"{previous / compiled:>8.1f}x{previous / cached:>15.1f}x")
+
+    expressions = [random_expression(rng, 20) for _ in range(batch_size)]
+    batch = measure(lambda: calculate_many(expressions), 10)
+    print(f"calculate_many: {batch_size} 20-term expressions in {batch * 1000:.3f} ms ({batch / batch_size * 1e6:.1f} us each, cached)")
+
+    # A table the model would otherwise build with one call per row
+    expression = "1000 * (1 + r / 12)^(12 * n) - 1000"
+    values = list(range(1, table_rows + 1))
+    looped = measure(lambda: [calculate(expression.replace("r", "0.05").replace("n", str(n))) for n in values], 10)
+    vectorized = measure(lambda: calculate(expression, {"n": {"start": 1, "stop": table_rows}, "r": 0.05}), 10)
+    print(f"{table_rows}-row table: {looped * 1000:.3f} ms as separate expressions, {vectorized * 1000:.3f} ms vectorized "
+          f"(and one tool call instead of {table_rows})")
+
+def stub_weather_payload(location: str) -> dict:
+    """
+    A response shaped like wttr.in's format=j2: current conditions, the nearest area and three
+    days of forecasts, each with eight 3-hourly entries.
+    """
+    def conditions(temperature):
+        return {
+            "FeelsLikeC": str(temperature - 1), "FeelsLikeF": str(temperature * 9 // 5 + 30), "cloudcover": "40",
+            "humidity": "62", "precipInches": "0.0", "precipMM": "0.0", "pressure": "1016", "pressureInches": "30",
+            "tempC": str(temperature), "tempF": str(temperature * 9 // 5 + 32), "uvIndex": "3", "visibility": "10",
+            "visibilityMiles": "6", "weatherCode": "116", "weatherDesc": [{"value": "Partly cloudy"}],
+            "weatherIconUrl": [{"value": ""}], "winddir16Point": "WSW", "winddirDegree": "250",
+            "windspeedKmph": "13", "windspeedMiles": "8"
+        }
+
+    current = conditions(18)
+    current["temp_C"], current["temp_F"] = current.pop("tempC"), current.pop("tempF")
+    current.update({"localObsDateTime": "2025-05-17 02:15 PM", "observation_time": "09:15 PM"})
+    days = []
+    for day in range(3):
+        hourly = [{**conditions(12 + hour // 2), "time": str(hour * 100), "chanceofrain": "10", "chanceofsnow": "0",
+                   "DewPointC": "9", "HeatIndexC": "18", "WindChillC": "17", "WindGustKmph": "20"} for hour in range(0, 24, 3)]
+        days.append({
+            "astronomy": [{"moon_illumination": "80", "moon_phase": "Waning Gibbous", "moonrise": "11:45 PM",
+                           "moonset": "08:12 AM", "sunrise": "05:55 AM", "sunset": "08:10 PM"}],
+            "avgtempC": "16", "avgtempF": "61", "date": f"2025-05-{17 + day}", "maxtempC": "21", "maxtempF": "70",
+            "mintempC": "11", "mintempF": "52", "sunHour": "12.5", "totalSnow_cm": "0.0", "uvIndex": "4",
+            "hourly": hourly
+        })
+    return {
+        "current_condition": [current],
+        "nearest_area": [{"areaName": [{"value": location}], "country": [{"value": "United States of America"}],
+                          "latitude": "37.775", "longitude": "-122.418", "population": "0", "region": [{"value": "California"}],
+                          "weatherUrl": [{"value": ""}]}],
+        "request": [{"query": location, "type": "City"}],
+        "weather": days
+    }
+
+def start_weather_stub(latency: float = 0.0):
+    """
+    Serve stub_weather_payload on a local port, like wttr.in but with a fixed `latency`. Returns
+    the server and its base URL, for WeatherClient(base_url=...) or the WEATHER_URL variable.
+    `server.requests` counts the requests it's received.
+    """
+    class WeatherStubHandler(BaseHTTPRequestHandler):
+        # Keep-alive needs HTTP/1.1
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body are written separately, which Nagle's algorithm would delay on a kept-alive connection
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            with self.server.lock:
+                self.server.requests += 1
+            time.sleep(latency)
+            location = urllib.parse.unquote(urllib.parse.urlparse(self.path).path.lstrip("/"))
+            body = json.dumps(stub_weather_payload(location)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WeatherStubHandler)
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def benchmark_weather(requests_count=50, latency=0.05):
+    """
+    Compare a fresh requests.get per call (how get_weather used to work) with the pooled client,
+    with and without its cache, against a local stub server with `latency` seconds of delay.
+    """
+    import requests
+    from assistant.tools.weather import WeatherClient
+
+    server, url = start_weather_stub(latency)
+    try:
+        def unpooled():
+            requests.get(f"{url}/Seattle", params={"format": "j2"}).json()
+
+        # No cache, so every call goes over a kept-alive connection
+        pooled_client = WeatherClient(url, ttl=0, stale_ttl=0)
+        cached_client = WeatherClient(url)
+        cached_client.get("Seattle")
+
+        unpooled_time = measure(unpooled, requests_count)
+        pooled_time = measure(lambda: pooled_client.get("Seattle"), requests_count)
+        cached_time = measure(lambda: cached_client.get("Seattle"), requests_count)
+
+        # Stale entries are returned immediately and refreshed in the background
+        stale_client = WeatherClient(url, ttl=0)
+        stale_client.get("Seattle")
+        stale_time = measure(lambda: stale_client.get("Seattle"), requests_count)
+
+        async def concurrent():
+            await asyncio.gather(*(pooled_client.get_async(f"City {i}") for i in range(8)))
+        start = time.perf_counter()
+        asyncio.run(concurrent())
+        async_time = time.perf_counter() - start
+
+        print(f"Stub server latency: {latency * 1000:.0f} ms")
+        print(f"New connection per call: {unpooled_time * 1000:8.2f} ms")
+        print(f"Pooled connection:       {pooled_time * 1000:8.2f} ms")
+        print(f"Cached:                  {cached_time * 1000:8.3f} ms")
+        print(f"Stale (revalidating):    {stale_time * 1000:8.3f} ms")
+        print(f"8 locations with get_async: {async_time * 1000:.1f} ms total, without blocking the event loop")
+
+        from assistant.results import get_token_budget, estimate_tokens, shape_weather
+        raw = json.dumps(cached_client.get("Seattle"), separators=(',', ':'))
+        shaped = shape_weather(raw, get_token_budget())
+        print(f"Result sent to the model: ~{estimate_tokens(raw)} tokens raw, ~{estimate_tokens(shaped)} shaped")
+        for client in (pooled_client, cached_client, stale_client):
+            client.close()
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("calculator", "weather"):
+        print("Usage: python -m assistant.benchmark calculator [lengths] | weather [latency]")
+        sys.exit(1)
+
+    if sys.argv[1] == "calculator":
+        lengths = tuple(int(length) for length in sys.argv[2].split(",")) if len(sys.argv) > 2 else (10, 100, 1000, 10000)
+        benchmark_calculator(lengths)
+    else:
+        benchmark_weather(latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.05)
@@ -0,0 +1,138 @@
+from typing import Awaitable, Callable
+from assistant.tools.calculator import calculate
+from assistant.tools.weather import get_weather, get_weather_async
+from assistant.tools.time import get_time
+from assistant.results import shape_result
+
+class Tool:
+    """
+    A tool the model can call: the function that runs it, plus what the model is told about it.
+    `parameters` maps each argument name to its JSON schema. With `async_function`, async
+    dispatch awaits it instead of calling `function`.
+    """
+
+    def __init__(self, name: str, description: str, function: Callable[..., str], parameters: dict[str, dict] | None = None,
+                 required: list[str] | None = None, async_function: Callable[..., Awaitable[str]] | None = None):
+        self.name = name
+        self.description = description
+        self.function = function
+        self.parameters = parameters or {}
+        self.required = required if required is not None else list(self.parameters)
+        self.async_function = async_function
+
+    def declaration(self) -> dict:
+        """
+        The function declaration for the Gemini API.
+        """
+        declaration: dict = {"name": self.name, "description": self.description}
+        if self.parameters:
+            declaration["parameters"] = {"type": "object", "properties": self.parameters, "required": self.required}
+        return declaration
+
+# Tool name -> Tool
+TOOLS: dict[str, Tool] = {}
+
+def register_tool(tool: Tool) -> Tool:
+    if tool.name in TOOLS:
+        raise ValueError(f"A tool named {tool.name} is already registered")
+    TOOLS[tool.name] = tool
+    return tool
+
+def function_declarations() -> list[dict]:
+    return [tool.declaration() for tool in TOOLS.values()]
+
+def get_tool_result(tool_name: str, tool_input: dict) -> str:
+    tool = TOOLS.get(tool_name)
+    if tool is None:
+        raise ValueError(f"Unknown tool name: {tool_name}")
+    # Only pass the model what it needs, within the token budget
+    return shape_result(tool_name, tool.function(**tool_input))
+
+async def get_tool_result_async(tool_name: str, tool_input: dict) -> str:
+    tool = TOOLS.get(tool_name)
+    if tool is None:
+        raise ValueError(f"Unknown tool name: {tool_name}")
+    if tool.async_function is not None:
+        result = await tool.async_function(**tool_input)
+    else:
+        result = tool.function(**tool_input)
+    return shape_result(tool_name, result)
+
+def calculate_tool(expression: str, variables: list[dict] | None = None) -> str:
+    """
+    Gemini's schemas can't describe a map of arbitrary names, so variables arrive as a list of
+    {"name", ...} objects. Turn them into calculate's {name: value} form.
+    """
+    if not variables:
+        return calculate(expression)
+
+    bindings = {}
+    for variable in variables:
+        variable = dict(variable)
+        name = variable.pop("name")
+        if "values" in variable:
+            bindings[name] = variable["values"]
+        elif "value" in variable:
+            bindings[name] = variable["value"]
+        else:
+            bindings[name] = variable
+    return calculate(expression, bindings)
+
+register_tool(Tool(
+    name="get_weather",
+    description="Get the current weather and forecast in a given location.",
+    function=get_weather,
+    async_function=get_weather_async,
+    parameters={
+        "location": {
+            "type": "string",
+            "description": "The city and state, e.g. San Francisco, CA. If prepended with a tilde (~), landmarks can be used instead of cities."
+        }
+    }
+))
+
+register_tool(Tool(
+    name="calculate",
+    description="Queries a calculator to perform basic arithmetic operations. This should be used whenever non-trivial math is needed. "
+                "The calculator supports addition (+), subtraction (-), multiplication (*), division (/), exponentiation (^), trigonometric functions (sin, cos, tan), "
+                "logarithms (log), square roots (sqrt), and mathematical constants (e, pi). Standard textual math notation is used. "
+                "To compute a table, e.g. for every year from 1 to 30, use variables instead of calling this once per value.",
+    function=calculate_tool,
+    parameters={
+        "expression": {
+            "type": "string",
+            "description": "The mathematical expression to evaluate, e.g. '2+2', 'sin(pi)', 'log(100)', '(4-1.5)*sqrt(16)', '1000*(1+r)^n'."
+        },
+        "variables": {
+            "type": "array",
+            "description": "Optional variables used in the expression, each bound to a value, a list of values, or a range. "
+                           "The expression is evaluated for every value and the results are returned as a table.",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "description": "The variable name, letters only, e.g. 'n'."},
+                    "value": {"type": "number", "description": "A single value."},
+                    "values": {"type": "array", "items": {"type": "number"}, "description": "A list of values."},
+                    "start": {"type": "string", "description": "The start of a range, a number or expression, e.g. '0' or '2*pi'."},
+                    "stop": {"type": "string", "description": "The end of a range, which is included."},
+                    "step": {"type": "number", "description": "The step of a range; 1 by default."},
+                    "count": {"type": "integer", "description": "Instead of a step, this many evenly spaced values."}
+                },
+                "required": ["name"]
+            }
+        }
+    },
+    required=["expression"]
+))
+
+register_tool(Tool(
+    name="get_time",
+    description="Get the current time in a given time zone.",
+    function=get_time,
+    parameters={
+        "timezone": {
+            "type": "string",
+            "description": "The IANA time zone name, e.g. America/Los_Angeles"
+        }
+    }
+))
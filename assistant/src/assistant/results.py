@@ -0,0 +1,167 @@
+import os
+import json
+import math
+from typing import Callable
+
+# Tool results are cut down to roughly this many tokens before they're sent to the model. Every
+# token of a tool result is read by the model before it can answer, so this is latency too.
+# Overridden by the TOOL_RESULT_TOKEN_BUDGET variable.
+DEFAULT_TOKEN_BUDGET = 400
+
+# A rough rule of thumb for English text and JSON
+CHARS_PER_TOKEN = 4
+
+def get_token_budget() -> int:
+    # Read on use rather than at import, so it works when it's set in .env
+    return int(os.environ.get("TOOL_RESULT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def first_value(items) -> str | None:
+    # wttr.in wraps a lot of strings as [{"value": ...}]
+    return items[0]["value"] if items else None
+
+def project_forecast_day(day: dict) -> dict:
+    projected = {
+        "date": day.get("date"),
+        "min_c": day.get("mintempC"), "max_c": day.get("maxtempC"),
+        "min_f": day.get("mintempF"), "max_f": day.get("maxtempF"),
+        "uv_index": day.get("uvIndex"),
+    }
+    astronomy = day.get("astronomy") or [{}]
+    projected["sunrise"], projected["sunset"] = astronomy[0].get("sunrise"), astronomy[0].get("sunset")
+
+    # format=j2 leaves out the hourly forecast, but j1-style data has it
+    hourly = day.get("hourly")
+    if hourly:
+        projected["chance_of_rain"] = max(int(hour.get("chanceofrain", 0)) for hour in hourly)
+        descriptions = [first_value(hour.get("weatherDesc")) for hour in hourly]
+        projected["conditions"] = sorted(set(filter(None, (description.strip() for description in descriptions if description))))
+    return projected
+
+def project_weather(data: dict) -> dict:
+    """
+    Keep what the model needs to talk about the weather: where it is, the current conditions,
+    and the forecast for today, then the following days.
+    """
+    if "error" in data:
+        return data
+
+    current = (data.get("current_condition") or [{}])[0]
+    area = (data.get("nearest_area") or [{}])[0]
+    return {
+        "location": ", ".join(filter(None, (first_value(area.get(key)) for key in ("areaName", "region", "country")))),
+        "current": {
+            "description": first_value(current.get("weatherDesc")),
+            "temp_c": current.get("temp_C"), "temp_f": current.get("temp_F"),
+            "feels_like_c": current.get("FeelsLikeC"), "feels_like_f": current.get("FeelsLikeF"),
+            "humidity": current.get("humidity"),
+            "wind_kmph": current.get("windspeedKmph"), "wind_mph": current.get("windspeedMiles"),
+            "wind_direction": current.get("winddir16Point"),
+            "precip_mm": current.get("precipMM"),
+            "observed": current.get("localObsDateTime")
+        },
+        "forecast": [project_forecast_day(day) for day in data.get("weather", [])]
+    }
+
+def minify(data) -> str:
+    return json.dumps(data, separators=(',', ':'))
+
+# If today's forecast alone is still over the budget, these are dropped, in order, until it fits:
+# (section, field), where the section is "today" or "current"
+OPTIONAL_WEATHER_FIELDS = [
+    ("today", "conditions"),
+    ("current", "observed"), ("current", "precip_mm"), ("current", "wind_direction"), ("current", "wind_mph"),
+    ("current", "wind_kmph"), ("current", "humidity"), ("current", "feels_like_f"), ("current", "feels_like_c"),
+    ("today", "sunrise"), ("today", "sunset"), ("today", "uv_index"), ("today", "chance_of_rain"),
+]
+
+def shape_weather(result: str, budget: int) -> str:
+    """
+    Fit the weather in `budget` tokens by dropping whole fields rather than cutting the text, so
+    it's always valid JSON. If even the bare minimum is over the budget, it's sent anyway.
+    """
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return truncate_to_budget(result, budget)
+
+    projected = project_weather(data)
+    text = minify(projected)
+    # Drop forecast days from the end until it fits, but always keep today
+    while estimate_tokens(text) > budget and len(projected.get("forecast", [])) > 1:
+        projected["forecast"].pop()
+        text = minify(projected)
+
+    sections = {"today": (projected.get("forecast") or [{}])[0], "current": projected.get("current", {})}
+    for section, field in OPTIONAL_WEATHER_FIELDS:
+        if estimate_tokens(text) <= budget:
+            break
+        if field in sections[section]:
+            del sections[section][field]
+            text = minify(projected)
+    return text
+
+# Tool name -> function(result, token budget) -> shaped result. Shapers fit the result in the budget
+# themselves; everything else is truncated.
+SHAPERS: dict[str, Callable[[str, int], str]] = {
+    "get_weather": shape_weather
+}
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """
+    The last resort for results that are still too long: cut them off, at a line break if
+    there's one, and say so. The last line is kept if it's short, since that's where summaries
+    (like the calculator's) go.
+    """
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+
+    last_line = text[text.rfind("\n") + 1:] if "\n" in text else ""
+    if len(last_line) > limit // 2:
+        last_line = ""
+    limit -= len(last_line)
+
+    cut = text.rfind("\n", 0, limit)
+    truncated = text[:cut if cut > limit // 2 else limit] + "\n... (truncated)"
+    return truncated + "\n" + last_line if last_line else truncated
+
+class ToolResultStats:
+    """
+    Running totals of tool result sizes, per tool, before and after shaping.
+    """
+
+    def __init__(self):
+        # Tool name -> [calls, raw tokens, shaped tokens]
+        self.totals: dict[str, list[int]] = {}
+
+    def record(self, tool_name: str, raw_tokens: int, shaped_tokens: int):
+        totals = self.totals.setdefault(tool_name, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += raw_tokens
+        totals[2] += shaped_tokens
+
+    def summary(self, tool_name: str) -> str:
+        calls, raw, shaped = self.totals[tool_name]
+        saved = 1 - shaped / raw if raw else 0.0
+        return f"{calls} call(s), ~{raw} -> ~{shaped} tokens in total ({saved:.0%} saved)"
+
+stats = ToolResultStats()
+
+def shape_result(tool_name: str, result: str, budget: int | None = None) -> str:
+    """
+    Project a tool's result down to what matters and fit it in `budget` tokens (by default,
+    get_token_budget()), logging the sizes before and after.
+    """
+    budget = budget if budget is not None else get_token_budget()
+    shaper = SHAPERS.get(tool_name)
+    # Cutting a shaped result off could leave invalid JSON, so shapers do their own fitting
+    shaped = shaper(result, budget) if shaper is not None else truncate_to_budget(result, budget)
+
+    raw_tokens, shaped_tokens = estimate_tokens(result), estimate_tokens(shaped)
+    stats.record(tool_name, raw_tokens, shaped_tokens)
+    print(f"Tool result {tool_name}: {len(result)} -> {len(shaped)} chars, ~{raw_tokens} -> ~{shaped_tokens} tokens; "
+          f"{stats.summary(tool_name)}")
+    return shaped
@@ -1,6 +1,10 @@
 from enum import Enum
 import math
+import re
+import operator
+from functools import lru_cache
 from typing import Callable
+import numpy as np
 
 class TokenType(Enum):
     NUMBER = 1
@@ -14,6 +18,8 @@ class TokenType(Enum):
     IDENTIFIER = 9
 
 class Token:
+    __slots__ = ("type", "value")
+
     def __init__(self, type: TokenType, value: str):
         self.type = type
         self.value = value
@@ -21,189 +27,385 @@ class Token:
     def __repr__(self):
         return f"Token({self.type}, {self.value})"
 
+# One group per kind of token: numbers (starting with a digit, or a dot followed by one),
+# identifiers (runs of letters), operators, and anything else, which is an error. Whitespace is
+# matched but not captured.
+TOKEN_PATTERN = re.compile(r"((?:\d|\.\d)[\d.]*)|([^\W\d_]+)|([-+*/^()])|\s+|(.)", re.DOTALL)
+# Variable names have to tokenize as a single identifier
+TOKEN_NAME_PATTERN = re.compile(r"[^\W\d_]+")
+OPERATOR_TOKENS = {
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.MULTIPLY,
+    '/': TokenType.DIVIDE,
+    '^': TokenType.EXPONENT,
+    '(': TokenType.LPAREN,
+    ')': TokenType.RPAREN
+}
+
 def tokenize(expression: str) -> list[Token]:
     """
     Tokenize the input expression into a list of tokens.
-    
-    Each token is represented as a tuple of (TokenType, value).
     """
     
     tokens: list[Token] = []
-    i = 0
-    while i < len(expression):
-        char = expression[i]
-
-        if char.isdigit() or (char == '.' and i + 1 < len(expression) and expression[i + 1].isdigit()):
-            start = i
-            while i < len(expression) and (expression[i].isdigit() or expression[i] == '.'):
-                i += 1
-            tokens.append(Token(TokenType.NUMBER, expression[start:i]))
-        elif char == '+':
-            tokens.append(Token(TokenType.PLUS, char))
-            i += 1
-        elif char == '-':
-            tokens.append(Token(TokenType.MINUS, char))
-            i += 1
-        elif char == '*':
-            tokens.append(Token(TokenType.MULTIPLY, char))
-            i += 1
-        elif char == '/':
-            tokens.append(Token(TokenType.DIVIDE, char))
-            i += 1
-        elif char == '^':
-            tokens.append(Token(TokenType.EXPONENT, char))
-            i += 1
-        elif char == '(':
-            tokens.append(Token(TokenType.LPAREN, char))
-            i += 1
-        elif char == ')':
-            tokens.append(Token(TokenType.RPAREN, char))
-            i += 1
-        elif char.isalpha():
-            start = i
-            while i < len(expression) and expression[i].isalpha():
-                i += 1
-            tokens.append(Token(TokenType.IDENTIFIER, expression[start:i]))
-        elif char.isspace():
-            i += 1
-        else:
-            raise ValueError(f"Unexpected character: {char}")
+    for number, identifier, op, unexpected in TOKEN_PATTERN.findall(expression):
+        if op:
+            tokens.append(Token(OPERATOR_TOKENS[op], op))
+        elif number:
+            tokens.append(Token(TokenType.NUMBER, number))
+        elif identifier:
+            tokens.append(Token(TokenType.IDENTIFIER, identifier))
+        elif unexpected:
+            raise ValueError(f"Unexpected character: {unexpected}")
     return tokens
 
-def eval_expression(tokens: list[Token]) -> float:
+# Available functions and constants. Built once, instead of on every call.
+FUNCTIONS: dict[str, Callable[[float], float]] = {
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'log': math.log,
+    'sqrt': math.sqrt,
+    # Just throw in a bunch of stuff we don't explicitly say we support
+    # ...in case, I guess? Who knows with LLMs.
+    'abs': abs,
+    'exp': math.exp,
+    'log10': math.log10,
+    'log2': math.log2,
+    'ln': math.log,
+    'asin': math.asin,
+    'acos': math.acos,
+    'atan': math.atan,
+    'arcsin': math.asin,
+    'arccos': math.acos,
+    'arctan': math.atan,
+}
+CONSTANTS: dict[str, float] = {
+    'e': math.e,
+    'pi': math.pi,
+    'tau': math.tau,
+    'phi': (1 + math.sqrt(5)) / 2
+}
+# The same functions for evaluating over arrays of values at once
+NUMPY_FUNCTIONS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'log': np.log,
+    'sqrt': np.sqrt,
+    'abs': np.abs,
+    'exp': np.exp,
+    'log10': np.log10,
+    'log2': np.log2,
+    'ln': np.log,
+    'asin': np.arcsin,
+    'acos': np.arccos,
+    'atan': np.arctan,
+    'arcsin': np.arcsin,
+    'arccos': np.arccos,
+    'arctan': np.arctan,
+}
+
+# Variables can be bound to at most this many values, in case the model asks for something silly
+MAX_VARIABLE_SIZE = 10000
+# Longer tables only show their first and last rows
+MAX_TABLE_ROWS = 20
+
+# How many compiled expressions to keep around. The LLM tends to repeat itself, e.g. when it
+# re-checks an answer, and compiling is most of the cost of a short expression.
+EXPRESSION_CACHE_SIZE = 256
+
+class Op(Enum):
+    PUSH = 1
+    NEGATE = 2
+    ADD = 3
+    SUBTRACT = 4
+    MULTIPLY = 5
+    DIVIDE = 6
+    EXPONENT = 7
+    CALL = 8
+    LOAD = 9
+
+BINARY_OPS = {
+    TokenType.PLUS: Op.ADD,
+    TokenType.MINUS: Op.SUBTRACT,
+    TokenType.MULTIPLY: Op.MULTIPLY,
+    TokenType.DIVIDE: Op.DIVIDE,
+    TokenType.EXPONENT: Op.EXPONENT
+}
+BINARY_OPERATORS: dict[Op, Callable[[float, float], float]] = {
+    Op.ADD: operator.add,
+    Op.SUBTRACT: operator.sub,
+    Op.MULTIPLY: operator.mul,
+    Op.DIVIDE: operator.truediv,
+    Op.EXPONENT: operator.pow
+}
+
+Instruction = tuple[Op, object]
+
+class Parser:
     """
-    Evaluate the expression represented by the list of tokens.
-    Because our expression language is so simple, we don't need a full parser.
-    We just use a single-pass recursive descent parser.
+    Compiles a list of tokens into a postfix program for a stack machine.
+    Because our expression language is so simple, we don't need a full parser generator.
+    We just use a single-pass recursive descent parser that walks the tokens by index, so parsing
+    is linear in the length of the expression.
     """
-    return eval_add_sub(tokens)
 
-def eval_add_sub(tokens: list[Token]) -> float:
+    def __init__(self, tokens: list[Token], variables: tuple[str, ...] = ()):
+        self.tokens = tokens
+        self.variables = variables
+        # The token types, with a None at the end so looking ahead never goes out of bounds
+        self.types: list[TokenType | None] = [token.type for token in tokens] + [None]
+        self.position = 0
+        self.program: list[Instruction] = []
+
+    def next(self) -> Token:
+        if self.position >= len(self.tokens):
+            raise ValueError("Unexpected end of expression")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expect_rparen(self):
+        if self.types[self.position] != TokenType.RPAREN:
+            raise ValueError("Missing closing parenthesis")
+        self.position += 1
+
+    def parse(self) -> list[Instruction]:
+        self.parse_add_sub()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected token: {self.tokens[self.position]}")
+        return self.program
+
+    def parse_add_sub(self):
+        """
+        Parse addition and subtraction.
+        """
+        self.parse_mul_div()
+        while self.types[self.position] in (TokenType.PLUS, TokenType.MINUS):
+            op = BINARY_OPS[self.types[self.position]]
+            self.position += 1
+            self.parse_mul_div()
+            self.program.append((op, None))
+
+    def parse_mul_div(self):
+        """
+        Parse multiplication and division.
+        """
+        self.parse_exponent()
+        while self.types[self.position] in (TokenType.MULTIPLY, TokenType.DIVIDE):
+            op = BINARY_OPS[self.types[self.position]]
+            self.position += 1
+            self.parse_exponent()
+            self.program.append((op, None))
+
+    def parse_exponent(self):
+        """
+        Parse exponentiation. Like the rest, it's left-associative: 2^3^2 is 64.
+        """
+        self.parse_unary()
+        while self.types[self.position] == TokenType.EXPONENT:
+            self.position += 1
+            self.parse_unary()
+            self.program.append((Op.EXPONENT, None))
+
+    def parse_unary(self):
+        """
+        Parse unary operations (like negation).
+        """
+        if self.types[self.position] == TokenType.MINUS:
+            self.position += 1  # Skip the '-' token
+            self.parse_primary()
+            self.program.append((Op.NEGATE, None))
+        else:
+            self.parse_primary()
+
+    def parse_primary(self):
+        """
+        Parse primary expressions (numbers, identifiers, and parenthesized expressions).
+        """
+        token = self.next()
+
+        if token.type == TokenType.NUMBER:
+            self.program.append((Op.PUSH, float(token.value)))
+        elif token.type == TokenType.IDENTIFIER:
+            self.parse_identifier(token.value)
+        elif token.type == TokenType.LPAREN:
+            self.parse_add_sub()
+            self.expect_rparen()
+        else:
+            raise ValueError(f"Unexpected token: {token}")
+
+    def parse_identifier(self, name: str):
+        """
+        Parse variables, functions (like sin, cos, tan, log, sqrt) and constants (like pi).
+        """
+        if name in self.variables:
+            self.program.append((Op.LOAD, name))
+        elif name in CONSTANTS:
+            self.program.append((Op.PUSH, CONSTANTS[name]))
+        elif name in FUNCTIONS:
+            # Functions always take a parenthesized argument
+            if self.types[self.position] != TokenType.LPAREN:
+                raise ValueError(f"Missing argument for function: {name}")
+            self.position += 1  # Skip the '('
+            self.parse_add_sub()
+            self.expect_rparen()
+            self.program.append((Op.CALL, name))
+        else:
+            raise ValueError(f"Unknown function or variable: {name}")
+
+class CompiledExpression:
     """
-    Evaluate addition and subtraction.
+    An expression compiled to a postfix program, which can be evaluated any number of times.
     """
-    result = eval_mul_div(tokens)
-    while tokens and (tokens[0].type == TokenType.PLUS or tokens[0].type == TokenType.MINUS):
-        op = tokens.pop(0)
-        if op.type == TokenType.PLUS:
-            result += eval_mul_div(tokens)
-        elif op.type == TokenType.MINUS:
-            result -= eval_mul_div(tokens)
-    return result
 
-def eval_mul_div(tokens: list[Token]) -> float:
+    def __init__(self, program: list[Instruction]):
+        self.program = tuple(program)
+
+    def evaluate(self, variables: dict | None = None, functions: dict[str, Callable] = FUNCTIONS):
+        """
+        Run the program. With NUMPY_FUNCTIONS and arrays as variables, the whole expression is
+        evaluated over every value at once.
+        """
+        stack: list = []
+        for op, arg in self.program:
+            if op is Op.PUSH:
+                stack.append(arg)
+            elif op is Op.LOAD:
+                stack.append(variables[arg])  # type: ignore
+            elif op is Op.NEGATE:
+                stack[-1] = -stack[-1]
+            elif op is Op.CALL:
+                stack[-1] = functions[arg](stack[-1])  # type: ignore
+            else:
+                right = stack.pop()
+                stack[-1] = BINARY_OPERATORS[op](stack[-1], right)
+        return stack[0]
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression: str, variables: tuple[str, ...] = ()) -> CompiledExpression:
     """
-    Evaluate multiplication and division.
+    Tokenize and compile an expression, in which the names in `variables` can be used. The most
+    recently used ones are cached.
     """
-    result = eval_exponent(tokens)
-    while tokens and (tokens[0].type == TokenType.MULTIPLY or tokens[0].type == TokenType.DIVIDE):
-        op = tokens.pop(0)
-        if op.type == TokenType.MULTIPLY:
-            result *= eval_exponent(tokens)
-        elif op.type == TokenType.DIVIDE:
-            result /= eval_exponent(tokens)
-    return result
+    return CompiledExpression(Parser(tokenize(expression), variables).parse())
 
-def eval_exponent(tokens: list[Token]) -> float:
+def eval_expression(tokens: list[Token]) -> float:
     """
-    Evaluate exponentiation.
+    Evaluate the expression represented by the list of tokens.
     """
-    result = eval_unary(tokens)
-    while tokens and tokens[0].type == TokenType.EXPONENT:
-        tokens.pop(0)  # Remove the exponent token
-        result **= eval_unary(tokens)
-    return result
+    return CompiledExpression(Parser(tokens).parse()).evaluate()
+
+def evaluate_bound(value) -> float:
+    # Bounds can be expressions themselves, like "2*pi"
+    if isinstance(value, str):
+        return float(compile_expression(value).evaluate())
+    return float(value)
 
-def eval_unary(tokens: list[Token]) -> float:
+def parse_variable(name: str, value) -> np.ndarray:
     """
-    Evaluate unary operations (like negation).
+    Turn a variable's value into an array. It can be a number or expression, a list of them, or a
+    range: {"start", "stop", "step"} with `stop` included and a step of 1 by default, or
+    {"start", "stop", "count"} for `count` evenly spaced values.
     """
-    if tokens and tokens[0].type == TokenType.MINUS:
-        tokens.pop(0)  # Remove the '-' token
-        return -eval_primary(tokens)
-    return eval_primary(tokens)
+    if not TOKEN_NAME_PATTERN.fullmatch(name) or name in FUNCTIONS or name in CONSTANTS:
+        raise ValueError(f"Invalid variable name: {name}")
 
-def eval_primary(tokens: list[Token]) -> float:
+    if isinstance(value, dict):
+        start, stop = evaluate_bound(value["start"]), evaluate_bound(value["stop"])
+        if "count" in value:
+            count = int(value["count"])
+            if count < 1:
+                raise ValueError(f"The range of {name} is empty")
+            if count > MAX_VARIABLE_SIZE:
+                raise ValueError(f"Too many values for {name}; the limit is {MAX_VARIABLE_SIZE}")
+            return np.linspace(start, stop, count)
+
+        step = evaluate_bound(value.get("step", 1))
+        if step == 0 or (stop - start) / step < 0:
+            raise ValueError(f"The range of {name} is empty")
+        if (stop - start) / step >= MAX_VARIABLE_SIZE:
+            raise ValueError(f"Too many values for {name}; the limit is {MAX_VARIABLE_SIZE}")
+        # Nudge the end so `stop` is included despite rounding
+        return np.arange(start, stop + step * 1e-9, step)
+
+    if isinstance(value, (list, tuple)):
+        if len(value) > MAX_VARIABLE_SIZE:
+            raise ValueError(f"Too many values for {name}; the limit is {MAX_VARIABLE_SIZE}")
+        return np.array([evaluate_bound(item) for item in value], dtype=np.float64)
+
+    return np.array(evaluate_bound(value))
+
+def format_number(value) -> str:
+    return f"{value:.10g}"
+
+def format_table(columns: dict[str, np.ndarray], max_rows: int = MAX_TABLE_ROWS) -> str:
     """
-    Evaluate primary expressions (numbers, identifiers, and parenthesized expressions).
+    Format equal-length columns as a compact pipe-separated table. Long tables keep only their
+    first and last rows, followed by a summary of the results.
     """
-    if not tokens:
-        raise ValueError("Unexpected end of expression")
+    names = list(columns)
+    length = len(columns[names[-1]])
+    rows = list(range(length))
+    if length > max_rows:
+        rows = rows[:max_rows // 2] + [-1] + rows[-(max_rows // 2):]
 
-    token = tokens.pop(0)
-    
-    if token.type == TokenType.NUMBER:
-        return float(token.value)
-    elif token.type == TokenType.IDENTIFIER:
-        return eval_function(token.value, tokens)
-    elif token.type == TokenType.LPAREN:
-        result = eval_expression(tokens)
-        if tokens and tokens[0].type == TokenType.RPAREN:
-            tokens.pop(0)  # Remove the ')'
-            return result
+    lines = [" | ".join(names)]
+    for row in rows:
+        if row == -1:
+            lines.append(f"... ({length - max_rows} more rows)")
         else:
-            raise ValueError("Missing closing parenthesis")
-    else:
-        raise ValueError(f"Unexpected token: {token}")
-
-def eval_function(name: str, tokens: list[Token]) -> float:
-    """
-    Evaluate functions (like sin, cos, tan, log, sqrt).
-    """
-    FUNCTIONS: dict[str, float | Callable[[float], float]] = {
-        'sin': lambda x: math.sin(x),
-        'cos': lambda x: math.cos(x),
-        'tan': lambda x: math.tan(x),
-        'log': lambda x: math.log(x),
-        'sqrt': lambda x: math.sqrt(x),
-        # Just throw in a bunch of stuff we don't explicitly say we support
-        # ...in case, I guess? Who knows with LLMs.
-        'abs': lambda x: abs(x),
-        'exp': lambda x: math.exp(x),
-        'log10': lambda x: math.log10(x),
-        'log2': lambda x: math.log2(x),
-        'ln': lambda x: math.log(x),
-        'asin': lambda x: math.asin(x),
-        'acos': lambda x: math.acos(x),
-        'atan': lambda x: math.atan(x),
-        'arcsin': lambda x: math.asin(x),
-        'arccos': lambda x: math.acos(x),
-        'arctan': lambda x: math.atan(x),
-        
-        'e': math.e,
-        'pi': math.pi,
-        'tau': math.tau,
-        'phi': (1 + math.sqrt(5)) / 2
-    }
-    
-    if name in FUNCTIONS:
-        func = FUNCTIONS[name]
-        # If the function is a lambda, expect a call
-        if callable(func):
-            if tokens and tokens[0].type == TokenType.LPAREN:
-                tokens.pop(0)  # Remove the '('
-                arg = eval_expression(tokens)
-                if tokens and tokens[0].type == TokenType.RPAREN:
-                    tokens.pop(0)  # Remove the ')'
-                else:
-                    raise ValueError("Missing closing parenthesis")
-                return func(arg)
-            raise ValueError(f"Missing argument for function: {name}")
-        # If it's a constant, return its value
-        return func
-    else:
-        raise ValueError(f"Unknown function or variable: {name}")
-
-def calculate(expression: str) -> str:
+            lines.append(" | ".join(format_number(columns[name][row]) for name in names))
+
+    results = columns[names[-1]]
+    finite = results[np.isfinite(results)]
+    if length > max_rows and len(finite):
+        lines.append(f"{len(results)} rows; result min {format_number(finite.min())}, max {format_number(finite.max())}, "
+                     f"mean {format_number(finite.mean())}, sum {format_number(finite.sum())}")
+    return "\n".join(lines)
+
+def calculate_table(expression: str, variables: dict) -> str:
+    """
+    Evaluate an expression over every value of its variables in one vectorized pass, and format
+    the results as a table. Variables bound to arrays must all be the same length; the ones bound
+    to single values are the same on every row.
+    """
+    arrays = {name: parse_variable(name, value) for name, value in variables.items()}
+    lengths = {arr.size for arr in arrays.values() if arr.ndim > 0}
+    if len(lengths) > 1:
+        raise ValueError("Variables bound to lists or ranges must have the same number of values")
+
+    compiled = compile_expression(expression, tuple(sorted(arrays)))
+    with np.errstate(all='ignore'):
+        result = compiled.evaluate(arrays, NUMPY_FUNCTIONS)
+    if not lengths:
+        return format_number(float(result))
+
+    size = lengths.pop()
+    columns = {name: arr for name, arr in arrays.items() if arr.ndim > 0}
+    columns["result"] = np.broadcast_to(result, (size,))
+    return format_table(columns)
+
+def calculate(expression: str, variables: dict | None = None) -> str:
     """
     Evaluate a mathematical expression and return the result as a string.
     
     The calculator supports addition (+), subtraction (-), multiplication (*), division (/), exponentiation (^), trigonometric functions (sin, cos, tan),
     logarithms (log), square roots (sqrt), and mathematical constants (e, pi). Standard textual math notation is used."
+    With `variables`, e.g. {"n": {"start": 1, "stop": 30}}, the expression is evaluated for every value and the results are returned as a table.
     """
     
     try:
-        tokens = tokenize(expression)
-        return str(eval_expression(tokens))
+        if variables:
+            return calculate_table(expression, variables)
+        return str(compile_expression(expression).evaluate())
     except Exception as e:
-        return f"Error: {str(e)}"
\ No newline at end of file
+        return f"Error: {str(e)}"
+
+def calculate_many(expressions: list[str]) -> list[str]:
+    """
+    Evaluate a list of expressions, returning a result (or error) string for each one.
+    """
+    return [calculate(expression) for expression in expressions]
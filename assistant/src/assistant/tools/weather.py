@@ -1,18 +1,168 @@
+import os
 import json
+import time
+import asyncio
+import threading
 import requests
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# https://wttr.in/{location}?format=j2 is a nice API that returns a JSON object with the weather information.
+# It can be pointed somewhere else, e.g. a local stub server, with the WEATHER_URL variable.
+DEFAULT_WEATHER_URL = "https://wttr.in"
+
+# (connect, read) timeouts in seconds. The model is waiting on us, so don't hang around.
+TIMEOUT = (3.05, 8.0)
+
+# Weather is served from the cache for CACHE_TTL seconds. After that, and up to STALE_TTL, the old
+# data is still returned immediately, but refreshed in the background.
+CACHE_TTL = 10 * 60
+STALE_TTL = 60 * 60
+PREFETCH_INTERVAL = CACHE_TTL
+
+class WeatherClient:
+    """
+    A wttr.in client with a keep-alive connection pool and a per-location cache. Safe to use from
+    multiple threads.
+    """
+
+    def __init__(self, base_url=None, ttl=CACHE_TTL, stale_ttl=STALE_TTL, timeout=TIMEOUT, clock=time.monotonic):
+        # Read here rather than at import, so it works when it's set in .env
+        base_url = base_url or os.environ.get("WEATHER_URL", DEFAULT_WEATHER_URL)
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.clock = clock
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Normalized location -> (fetch time, data)
+        self.cache: dict[str, tuple[float, dict]] = {}
+        self.refreshing: set[str] = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather")
+        self.prefetch_stop = threading.Event()
+
+    @staticmethod
+    def cache_key(location: str) -> str:
+        return " ".join(location.lower().split())
+
+    def fetch(self, location: str) -> dict:
+        """
+        Fetch the weather, bypassing the cache, and store it.
+        """
+        url = f"{self.base_url}/{urllib.parse.quote(location)}"
+        response = self.session.get(url, params={"format": "j2"}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        with self.lock:
+            self.cache[self.cache_key(location)] = (self.clock(), data)
+        return data
+
+    def refresh(self, location: str):
+        key = self.cache_key(location)
+        try:
+            self.fetch(location)
+        except requests.RequestException as e:
+            print(f"Failed to refresh the weather for {location}: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def refresh_in_background(self, location: str):
+        key = self.cache_key(location)
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        self.executor.submit(self.refresh, location)
+
+    def get(self, location: str) -> dict:
+        """
+        Get the weather for a location, from the cache if it's fresh enough. Raises
+        requests.RequestException if it has to be fetched and that fails.
+        """
+        with self.lock:
+            entry = self.cache.get(self.cache_key(location))
+
+        if entry is not None:
+            fetched_at, data = entry
+            age = self.clock() - fetched_at
+            if age < self.ttl:
+                return data
+            if age < self.stale_ttl:
+                self.refresh_in_background(location)
+                return data
+
+        return self.fetch(location)
+
+    async def get_async(self, location: str) -> dict:
+        """
+        Like `get`, but runs any request on a worker thread instead of blocking the event loop.
+        """
+        return await asyncio.to_thread(self.get, location)
+
+    def start_prefetch(self, location: str, interval=PREFETCH_INTERVAL):
+        """
+        Keep `location`'s weather warm in the cache, refreshing it every `interval` seconds on a
+        daemon thread.
+        """
+        def run():
+            while True:
+                self.refresh(location)
+                if self.prefetch_stop.wait(interval):
+                    return
+
+        threading.Thread(target=run, name="weather-prefetch", daemon=True).start()
+
+    def close(self):
+        self.prefetch_stop.set()
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+_client: WeatherClient | None = None
+
+def get_client() -> WeatherClient:
+    global _client
+    if _client is None:
+        _client = WeatherClient()
+    return _client
+
+def format_weather(data: dict) -> str:
+    # Minify the JSON
+    return json.dumps(data, separators=(',', ':'))
+
+def weather_error() -> str:
+    return json.dumps({"error": "Unable to fetch weather data."})
 
 def get_weather(location: str) -> str:
     """
     Get the weather for a given location.
     """
-    # https://wttr.in/{location}?format=j2 is a nice API that returns a JSON object with the weather information.
-    url = f"https://wttr.in/{urllib.parse.quote(location)}?format=j2"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        # Minify the JSON
-        json_data = response.json()
-        return json.dumps(json_data, separators=(',', ':'))
-    else:
-        return json.dumps({"error": "Unable to fetch weather data."})
\ No newline at end of file
+    try:
+        return format_weather(get_client().get(location))
+    except (requests.RequestException, ValueError):
+        return weather_error()
+
+async def get_weather_async(location: str) -> str:
+    """
+    Get the weather for a given location without blocking the event loop.
+    """
+    try:
+        return format_weather(await get_client().get_async(location))
+    except (requests.RequestException, ValueError):
+        return weather_error()
+
+def prefetch_weather(location: str | None = None):
+    """
+    Start keeping the weather for `location` (by default, the LOCATION environment variable) cached,
+    so the first question about it doesn't wait on the network.
+    """
+    location = location or os.environ.get("LOCATION")
+    if location:
+        get_client().start_prefetch(location)
@@ -0,0 +1,17 @@
+import os
+import pytest
+
+# Importing the package creates the Gemini client, which needs a key, though the tests never use it
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from assistant.benchmark import start_weather_stub
+
+@pytest.fixture
+def weather_server():
+    """
+    A local stub of wttr.in, as (server, base URL); `server.requests` counts what it's been asked.
+    """
+    server, url = start_weather_stub()
+    yield server, url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,117 @@
+import math
+import random
+import pytest
+from assistant.tools.calculator import MAX_VARIABLE_SIZE, tokenize, compile_expression, calculate, calculate_many
+from assistant.benchmark import legacy_evaluate, random_expression
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2+3*4", 14.0),
+    ("(2+3)*4", 20.0),
+    ("10-4-3", 3.0),
+    ("12/3/2", 2.0),
+    ("2*3^2", 18.0),
+    # Exponentiation is left-associative, like the rest
+    ("2^3^2", 64.0),
+    # Unary minus binds tighter than ^
+    ("-2^2", 4.0),
+    ("-(2^2)", -4.0),
+    ("3--2", 5.0),
+    ("sqrt(16)+abs(-2)", 6.0),
+    ("2*pi", 2 * math.pi),
+    (".5+1.25", 1.75),
+])
+def test_precedence_and_associativity(expression, expected):
+    assert float(calculate(expression)) == pytest.approx(expected)
+
+@pytest.mark.parametrize("expression, error", [
+    ("2 3", "Error: Unexpected token: Token(TokenType.NUMBER, 3)"),
+    ("(1+2) (3)", "Error: Unexpected token: Token(TokenType.LPAREN, ()"),
+    ("1+2)", "Error: Unexpected token: Token(TokenType.RPAREN, ))"),
+    ("(1+2", "Error: Missing closing parenthesis"),
+    ("1+", "Error: Unexpected end of expression"),
+    ("", "Error: Unexpected end of expression"),
+    ("*2", "Error: Unexpected token: Token(TokenType.MULTIPLY, *)"),
+    ("2 $ 3", "Error: Unexpected character: $"),
+    ("foo(2)", "Error: Unknown function or variable: foo"),
+    ("sin 2", "Error: Missing argument for function: sin"),
+    ("1/0", "Error: float division by zero"),
+])
+def test_errors(expression, error):
+    assert calculate(expression) == error
+
+def test_compiled_expressions_are_cached():
+    compile_expression.cache_clear()
+    assert calculate("1 + 2*3") == "7.0"
+    assert calculate("1 + 2*3") == "7.0"
+    info = compile_expression.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    assert compile_expression("1 + 2*3") is compile_expression("1 + 2*3")
+
+def test_calculate_many():
+    assert calculate_many(["1+1", "2 3", "sqrt(9)"]) == ["2.0", "Error: Unexpected token: Token(TokenType.NUMBER, 3)", "3.0"]
+    assert calculate_many([]) == []
+
+@pytest.mark.parametrize("terms", [1, 10, 100, 1000])
+def test_matches_legacy_evaluator(terms):
+    rng = random.Random(terms)
+    for _ in range(5):
+        expression = random_expression(rng, terms)
+        expected = legacy_evaluate(tokenize(expression))
+        assert compile_expression(expression).evaluate() == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+def table(text):
+    # The rows of a table, without the header or summary
+    return [line.split(" | ") for line in text.split("\n")[1:] if " | " in line]
+
+def test_count_range_includes_stop():
+    result = calculate("x", {"x": {"start": 0, "stop": 1, "count": 5}})
+    assert table(result) == [["0", "0"], ["0.25", "0.25"], ["0.5", "0.5"], ["0.75", "0.75"], ["1", "1"]]
+
+def test_step_range_includes_stop():
+    # 0.1 doesn't add up to exactly 0.3, but the stop is still included
+    assert [row[0] for row in table(calculate("x", {"x": {"start": 0, "stop": 0.3, "step": 0.1}}))] == ["0", "0.1", "0.2", "0.3"]
+    assert [row[0] for row in table(calculate("x", {"x": {"start": 3, "stop": 1, "step": -1}}))] == ["3", "2", "1"]
+    # A step of 1 by default
+    assert [row[0] for row in table(calculate("n", {"n": {"start": 1, "stop": 3}}))] == ["1", "2", "3"]
+
+def test_string_bounds():
+    result = calculate("sin(x)", {"x": {"start": "0", "stop": "2*pi", "count": 3}})
+    assert [row[0] for row in table(result)] == ["0", "3.141592654", "6.283185307"]
+    assert calculate("x", {"x": ["pi", "1+1"]}) == "x | result\n3.141592654 | 3.141592654\n2 | 2"
+
+def test_single_values_apply_to_every_row():
+    assert calculate("x*y", {"x": [1, 2], "y": 10}) == "x | result\n1 | 10\n2 | 20"
+    assert calculate("x*2", {"x": 3}) == "6"
+
+def test_mismatched_lengths_are_rejected():
+    assert calculate("x+y", {"x": [1, 2], "y": [1, 2, 3]}) == "Error: Variables bound to lists or ranges must have the same number of values"
+
+def test_variable_size_limit():
+    error = f"Error: Too many values for x; the limit is {MAX_VARIABLE_SIZE}"
+    assert calculate("x", {"x": {"start": 0, "stop": 1, "count": MAX_VARIABLE_SIZE + 1}}) == error
+    assert calculate("x", {"x": {"start": 0, "stop": MAX_VARIABLE_SIZE}}) == error
+    assert calculate("x", {"x": list(range(MAX_VARIABLE_SIZE + 1))}) == error
+    assert not calculate("x", {"x": {"start": 1, "stop": MAX_VARIABLE_SIZE}}).startswith("Error")
+
+@pytest.mark.parametrize("name", ["sin", "pi", "x1", "my_var", ""])
+def test_invalid_variable_names(name):
+    assert calculate("1", {name: [1, 2]}) == f"Error: Invalid variable name: {name}"
+
+@pytest.mark.parametrize("value", [
+    {"start": 0, "stop": 1, "count": -1},
+    {"start": 0, "stop": 1, "count": 0},
+    {"start": 1, "stop": 0},
+    {"start": 0, "stop": 1, "step": 0},
+])
+def test_empty_ranges(value):
+    assert calculate("x", {"x": value}) == "Error: The range of x is empty"
+
+def test_non_finite_rows():
+    assert calculate("1/x", {"x": [0, 1]}) == "x | result\n0 | inf\n1 | 1"
+    assert calculate("log(x)", {"x": [-1, 0]}) == "x | result\n-1 | nan\n0 | -inf"
+
+    # The summary of a long table only counts the finite results
+    result = calculate("log(x-25)", {"x": {"start": 1, "stop": 30}})
+    assert result.endswith("30 rows; result min 0, max 1.609437912, mean 0.9574983486, sum 4.787491743")
+    # ...and is left out if there aren't any
+    assert "rows; result" not in calculate("log(-x)", {"x": {"start": 1, "stop": 30}})
@@ -0,0 +1,47 @@
+import json
+import pytest
+from assistant.benchmark import stub_weather_payload
+from assistant.results import estimate_tokens, shape_result, truncate_to_budget
+
+RAW_WEATHER = json.dumps(stub_weather_payload("Seattle"))
+
+def test_weather_is_projected():
+    shaped = json.loads(shape_result("get_weather", RAW_WEATHER, budget=400))
+    assert shaped["location"] == "Seattle, California, United States of America"
+    assert shaped["current"]["temp_c"] == "18"
+    assert len(shaped["forecast"]) == 3
+    assert shaped["forecast"][0]["chance_of_rain"] == 10
+    assert estimate_tokens(json.dumps(shaped, separators=(',', ':'))) < estimate_tokens(RAW_WEATHER)
+
+@pytest.mark.parametrize("budget", [400, 150, 100, 80, 50, 10])
+def test_weather_stays_valid_json(budget):
+    shaped = shape_result("get_weather", RAW_WEATHER, budget=budget)
+    data = json.loads(shaped)
+    # Today and the temperatures are always kept
+    assert data["forecast"][0]["date"] == "2025-05-17"
+    assert data["current"]["temp_c"] == "18"
+    assert "truncated" not in shaped
+
+def test_weather_drops_fields_until_it_fits():
+    shaped = shape_result("get_weather", RAW_WEATHER, budget=100)
+    assert estimate_tokens(shaped) <= 100
+    data = json.loads(shaped)
+    assert len(data["forecast"]) == 1
+    assert "conditions" not in data["forecast"][0]
+    assert "observed" not in data["current"]
+
+def test_weather_errors_are_passed_through():
+    error = {"error": "Unable to fetch weather data."}
+    assert json.loads(shape_result("get_weather", json.dumps(error), budget=10)) == error
+
+def test_other_results_are_truncated():
+    rows = "\n".join(f"{i} | {i * i}" for i in range(1000)) + "\n1000 rows; result min 0"
+    shaped = shape_result("calculate", rows, budget=50)
+    assert len(shaped) <= 50 * 4 + len("\n... (truncated)\n")
+    assert "... (truncated)" in shaped
+    # The summary on the last line is kept
+    assert shaped.endswith("\n1000 rows; result min 0")
+
+def test_short_results_are_unchanged():
+    assert truncate_to_budget("4.0", 10) == "4.0"
+    assert shape_result("get_time", "12:00 PM", budget=10) == "12:00 PM"
@@ -0,0 +1,11 @@
+import re
+import pytest
+import pytz
+from assistant.registry import get_tool_result
+
+def test_get_time():
+    assert re.fullmatch(r"\d\d:\d\d [AP]M", get_tool_result("get_time", {"timezone": "America/Los_Angeles"}))
+
+def test_unknown_time_zone():
+    with pytest.raises(pytz.UnknownTimeZoneError):
+        get_tool_result("get_time", {"timezone": "Mars/Olympus_Mons"})
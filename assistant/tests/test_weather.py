@@ -0,0 +1,84 @@
+import socket
+import asyncio
+from assistant.tools import weather
+from assistant.tools.weather import WeatherClient, get_weather, get_weather_async, weather_error
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def unused_url():
+    # Nothing listens on a port that was just released, so connecting to it is refused
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+def test_fresh_hit_does_not_request_again(weather_server):
+    server, url = weather_server
+    client = WeatherClient(url, ttl=10, stale_ttl=100, clock=FakeClock())
+
+    first = client.get("Seattle")
+    assert first["request"][0]["query"] == "Seattle"
+    # The cache is keyed case- and whitespace-insensitively
+    assert client.get("  seattle ") is first
+    assert server.requests == 1
+    client.close()
+
+def test_stale_hit_is_returned_and_refreshed_once(weather_server):
+    server, url = weather_server
+    clock = FakeClock()
+    client = WeatherClient(url, ttl=10, stale_ttl=100, clock=clock)
+    first = client.get("Seattle")
+
+    clock.now = 50
+    assert client.get("Seattle") is first
+    assert client.get("Seattle") is first
+    # Wait for the background refresh
+    client.executor.shutdown(wait=True)
+
+    assert server.requests == 2
+    fetched_at, _ = client.cache["seattle"]
+    assert fetched_at == 50
+    client.close()
+
+def test_expired_entry_is_fetched(weather_server):
+    server, url = weather_server
+    clock = FakeClock()
+    client = WeatherClient(url, ttl=10, stale_ttl=100, clock=clock)
+    first = client.get("Seattle")
+
+    clock.now = 100
+    second = client.get("Seattle")
+    assert second is not first
+    assert server.requests == 2
+    client.close()
+
+def test_connection_error_returns_weather_error(monkeypatch):
+    client = WeatherClient(unused_url())
+    monkeypatch.setattr(weather, "_client", client)
+    assert get_weather("Seattle") == weather_error()
+    assert asyncio.run(get_weather_async("Seattle")) == weather_error()
+    client.close()
+
+def test_get_async(weather_server):
+    server, url = weather_server
+    client = WeatherClient(url, clock=FakeClock())
+
+    async def get_all():
+        return await asyncio.gather(*(client.get_async(f"City {i}") for i in range(4)))
+    results = asyncio.run(get_all())
+
+    assert [data["request"][0]["query"] for data in results] == [f"City {i}" for i in range(4)]
+    assert server.requests == 4
+    client.close()
+
+def test_get_weather_async(weather_server, monkeypatch):
+    _, url = weather_server
+    client = WeatherClient(url)
+    monkeypatch.setattr(weather, "_client", client)
+    assert '"query":"Seattle"' in asyncio.run(get_weather_async("Seattle"))
+    client.close()
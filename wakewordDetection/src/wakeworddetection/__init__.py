@@ -1,5 +1,19 @@
 import sys
 
+def get_option(name, default=None, type=str):
+    """
+    Get the value following `--name` in the command line arguments, or `default` if it isn't given.
+    """
+    flag = f"--{name}"
+    if flag in sys.argv:
+        index = sys.argv.index(flag)
+        if index + 1 < len(sys.argv):
+            return type(sys.argv[index + 1])
+    return default
+
+def has_flag(name):
+    return f"--{name}" in sys.argv
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python -m wakeworddetection <command>")
@@ -10,28 +24,111 @@ def main():
         record()
     elif sys.argv[1] == "record_negatives":
         from wakeworddetection.record import record_negatives
-        record_negatives()
+        record_negatives(session=has_flag("session"))
     elif sys.argv[1] == "validate":
         from wakeworddetection.record import validate
         validate()
     elif sys.argv[1] == "process":
         from wakeworddetection.process import process_dataset
-        process_dataset()
+        process_dataset(workers=get_option("workers", None, int))
     elif sys.argv[1] == "augment":
         from wakeworddetection.augment import augment_wakewords
-        augment_wakewords()
+        augment_wakewords(seed=get_option("seed", 0, int), workers=get_option("workers", None, int))
+    elif sys.argv[1] == "build_noise_bank":
+        from wakeworddetection.augment import build_noise_bank
+        build_noise_bank(workers=get_option("workers", None, int))
     elif sys.argv[1] == "load_datasets":
         from wakeworddetection.load_datasets import load_datasets
-        load_datasets()
+        load_datasets(
+            samples=get_option("samples", 10000, int),
+            seed=get_option("seed", 0, int),
+            workers=get_option("workers", None, int),
+            rescan=has_flag("rescan")
+        )
     elif sys.argv[1] == "generate_noise":
         from wakeworddetection.generate_noise import generate_silence
-        generate_silence()
+        generate_silence(
+            samples=get_option("samples", 1000, int),
+            seed=get_option("seed", 0, int),
+            profiles=get_option("profiles", "white").split(","),
+            to_shards=has_flag("shards"),
+            workers=get_option("workers", None, int)
+        )
     elif sys.argv[1] == "train":
         from wakeworddetection.train import train_model
-        train_model()
+        train_model(
+            online_augment=has_flag("online-augment"),
+            seed=get_option("seed", 0, int),
+            workers=get_option("workers", None, int),
+            stage1=not has_flag("skip-stage1")
+        )
+    elif sys.argv[1] == "sweep":
+        from wakeworddetection.sweep import sweep
+        architectures = get_option("architectures")
+        sweep(
+            architectures=architectures.split(",") if architectures else None,
+            epochs=get_option("epochs", 50, int),
+            mode=get_option("mode", "dynamic"),
+            workers=get_option("workers", None, int)
+        )
     elif sys.argv[1] == "convert":
-        from wakeworddetection.convert_to_tflite import convert_to_tflite
-        convert_to_tflite()
+        from wakeworddetection.convert_to_tflite import convert_models
+        convert_models(mode=get_option("mode", "dynamic"))
+    elif sys.argv[1] == "convert_report":
+        from wakeworddetection.convert_to_tflite import compare_tflite
+        compare_tflite()
+    elif sys.argv[1] == "evaluate":
+        from wakeworddetection.evaluate import evaluate, evaluate_cascade, MODEL_PATH, STAGE1_PATH, EVAL_BATCH_SIZE
+        if has_flag("cascade"):
+            from wakeworddetection.test import DEFAULT_THRESHOLD, STAGE1_THRESHOLD
+            evaluate_cascade(
+                model_path=get_option("model", MODEL_PATH),
+                stage1_path=get_option("stage1", STAGE1_PATH),
+                threshold=get_option("threshold", DEFAULT_THRESHOLD, float),
+                stage1_threshold=get_option("stage1-threshold", STAGE1_THRESHOLD, float),
+                batch_size=get_option("batch-size", EVAL_BATCH_SIZE, int),
+                threads=get_option("threads", None, int)
+            )
+        else:
+            evaluate(
+                model_path=get_option("model", MODEL_PATH),
+                batch_size=get_option("batch-size", EVAL_BATCH_SIZE, int),
+                threads=get_option("threads", None, int)
+            )
     elif sys.argv[1] == "test":
-        from wakeworddetection.test import test_model
-        test_model()
\ No newline at end of file
+        from wakeworddetection.test import test_model, CATCH_UP, STAGE1_THRESHOLD, METRICS_INTERVAL
+        test_model(
+            policy=get_option("policy", CATCH_UP),
+            vad=has_flag("vad"),
+            cascade=has_flag("cascade"),
+            stage1_threshold=get_option("stage1-threshold", STAGE1_THRESHOLD, float),
+            metrics_path=get_option("metrics"),
+            metrics_interval=get_option("metrics-interval", METRICS_INTERVAL, float)
+        )
+    elif sys.argv[1] == "replay":
+        from wakeworddetection.replay import replay_directory
+        from wakeworddetection.test import CATCH_UP, DEFAULT_THRESHOLD, STAGE1_THRESHOLD
+        if len(sys.argv) < 3:
+            print("Usage: python -m wakeworddetection replay <directory> [--labels labels.csv] [--model model.tflite] [--output report.json] [--vad] [--stage1 stage1.tflite]")
+            return
+        replay_directory(
+            sys.argv[2],
+            labels_path=get_option("labels"),
+            model_path=get_option("model"),
+            threshold=get_option("threshold", DEFAULT_THRESHOLD, float),
+            policy=get_option("policy", CATCH_UP),
+            output_path=get_option("output"),
+            vad=has_flag("vad"),
+            stage1_path=get_option("stage1"),
+            stage1_threshold=get_option("stage1-threshold", STAGE1_THRESHOLD, float)
+        )
+    elif sys.argv[1] == "benchmark_features":
+        from wakeworddetection.benchmark import benchmark_features
+        benchmark_features()
+    elif sys.argv[1] == "benchmark_startup":
+        from wakeworddetection.benchmark import benchmark_startup
+        benchmark_startup(
+            model_path=get_option("model", './processed/wakeword_model.tflite'),
+            runs=get_option("runs", 3, int),
+            baseline=not has_flag("no-baseline")
+        )
@@ -1,5 +1,8 @@
 import os
+import json
+import zlib
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 import librosa
 import numpy as np
 import soundfile as sf
@@ -13,110 +16,299 @@ NOT_WAKEWORD_DIR = './data/not_wakeword/'
 AUGMENTED_WAKEWORD_DIR = './data/augmented_wakeword/'
 AUGMENTED_NOT_WAKEWORD_DIR = './data/augmented_not_wakeword/'
 
-def load_noise_files(max=500):
+NOISE_BANK_PATH = './processed/noise_bank.f32'
+NOISE_BANK_INDEX_PATH = './processed/noise_bank.json'
+
+# Records the parameters the outputs in an augmented directory were generated with
+STATE_FILE = '.augment.json'
+
+def load_noise(path):
+    y, _ = librosa.load(path, sr=16000)
+    peak = np.max(np.abs(y))
+    if peak == 0:
+        return None
+    # A lot of the noise files are extremely loud, so we normalize them to a relatively low level
+    y = y / peak
+    # Normalize to -10 dBFS
+    y = y * 10**(-10 / 20)
+    return y.astype(np.float32)
+
+def load_noise_files(max=500, seed=0):
     noise_files = []
-    files = os.listdir(NOISE_DIR)
-    files = random.sample(files, min(max, len(files)))
-    
+    files = sorted(os.listdir(NOISE_DIR))
+    files = random.Random(seed).sample(files, min(max, len(files)))
+
     for i, fname in enumerate(files):
         print(f"Loading noise file {i+1}/{len(files)}: {fname}")
-        
+
         if fname.endswith('.wav'):
-            y, _ = librosa.load(os.path.join(NOISE_DIR, fname), sr=16000)
-            # A lot of the noise files are extremely loud, so we normalize them to a relatively low level
-            y = y / np.max(np.abs(y))
-            # Normalize to -10 dBFS
-            y = y * 10**(-10 / 20)
-            
-            noise_files.append(y)
+            y = load_noise(os.path.join(NOISE_DIR, fname))
+            if y is not None:
+                noise_files.append(y)
     return noise_files
 
-def add_background_noise(y, noises, signal_to_noise_ratio_db=20):
-    noise = random.choice(noises)
-    if len(noise) < len(y):
-        noise = np.pad(noise, (0, len(y) - len(noise)))
+def build_noise_bank(workers=None):
+    """
+    Decode, resample and normalize every noise file once, and write them all into one contiguous
+    float32 file with a JSON index of offsets, which NoiseBank memory-maps.
+    """
+    files = sorted(fname for fname in os.listdir(NOISE_DIR) if fname.endswith('.wav'))
+    paths = [os.path.join(NOISE_DIR, fname) for fname in files]
+    print(f"Building noise bank from {len(files)} files...")
+
+    os.makedirs(os.path.dirname(NOISE_BANK_PATH), exist_ok=True)
+    index = []
+    offset = 0
+    temp_path = NOISE_BANK_PATH + '.tmp'
+    with open(temp_path, 'wb') as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        for i, (fname, y) in enumerate(zip(files, executor.map(load_noise, paths, chunksize=8))):
+            if y is None:
+                print(f"Skipping silent noise file {fname}")
+                continue
+            f.write(y.tobytes())
+            index.append({"name": fname, "offset": offset, "length": len(y)})
+            offset += len(y)
+            if (i + 1) % 100 == 0:
+                print(f"Added {i + 1}/{len(files)} noise files")
+
+    temp_index_path = NOISE_BANK_INDEX_PATH + '.tmp'
+    with open(temp_index_path, 'w') as f:
+        json.dump({"sample_rate": 16000, "samples": offset, "files": index}, f)
+
+    # Both are fully written before either is replaced, and the index goes last. A crash between
+    # the two leaves the old index with the new bank, which NoiseBank catches by its size.
+    os.replace(temp_path, NOISE_BANK_PATH)
+    os.replace(temp_index_path, NOISE_BANK_INDEX_PATH)
+
+    print(f"Wrote {offset / 16000:.0f} seconds of noise from {len(index)} files to {NOISE_BANK_PATH}")
+
+class NoiseBank:
+    """
+    Read-only, memory-mapped view of the noise written by build_noise_bank. Picking noise costs
+    nothing to decode, and worker processes share the pages through the OS page cache; pickling a
+    NoiseBank only sends its paths.
+    """
+
+    def __init__(self, path=NOISE_BANK_PATH, index_path=NOISE_BANK_INDEX_PATH):
+        self.path = path
+        self.index_path = index_path
+
+        with open(index_path) as f:
+            index = json.load(f)
+        files = index["files"]
+        self.names = [entry["name"] for entry in files]
+        self.offsets = np.array([entry["offset"] for entry in files], dtype=np.int64)
+        self.lengths = np.array([entry["length"] for entry in files], dtype=np.int64)
+        self.data = np.memmap(path, dtype=np.float32, mode='r')
+
+        # Indexes from before the size was recorded can only be checked against their last file
+        samples = index.get("samples", int(self.offsets[-1] + self.lengths[-1]) if files else 0)
+        if len(self.data) != samples:
+            raise ValueError(f"The noise bank at {path} doesn't match its index ({len(self.data)} samples, "
+                             f"expected {samples}); run build_noise_bank again")
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        return (self.path, self.index_path)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def random_slice(self, length, rng=random):
+        """
+        A random `length`-sample slice of a random noise file, zero-padded if the file is shorter.
+        """
+        i = rng.randrange(len(self.names))
+        offset, noise_length = int(self.offsets[i]), int(self.lengths[i])
+        if noise_length < length:
+            return np.pad(self.data[offset:offset + noise_length], (0, length - noise_length))
+        start = offset + rng.randint(0, noise_length - length)
+        return np.array(self.data[start:start + length])
+
+def load_noises(seed=0):
+    """
+    The noise bank if it's been built, otherwise a random sample of decoded noise files.
+    """
+    if os.path.exists(NOISE_BANK_PATH) and os.path.exists(NOISE_BANK_INDEX_PATH):
+        bank = NoiseBank()
+        print(f"Using noise bank with {len(bank)} files")
+        return bank
+
+    print("No noise bank found (run build_noise_bank to create one), loading noise files...")
+    return load_noise_files(seed=seed)
+
+def add_background_noise(y, noises, signal_to_noise_ratio_db=20, rng=random):
+    if isinstance(noises, NoiseBank):
+        noise = noises.random_slice(len(y), rng)
     else:
-        # Pick a random subsection of the noise
-        start = random.randint(0, len(noise) - len(y))
-        noise = noise[start:start + len(y)]
-    
+        noise = rng.choice(noises)
+        if len(noise) < len(y):
+            noise = np.pad(noise, (0, len(y) - len(noise)))
+        else:
+            # Pick a random subsection of the noise
+            start = rng.randint(0, len(noise) - len(y))
+            noise = noise[start:start + len(y)]
+
     signal_power = np.mean(y ** 2)
     noise_power = np.mean(noise ** 2)
     scale = np.sqrt(signal_power / (10**(signal_to_noise_ratio_db / 10) * noise_power))
     noisy = y + scale * noise
     return noisy
 
-def time_stretch(y):
-    rate = random.uniform(0.9, 1.0)
+def time_stretch(y, rng=random):
+    rate = rng.uniform(0.9, 1.0)
     return librosa.effects.time_stretch(y, rate=rate)
 
 # Seems to reduce quality
-# def pitch_shift(y, sr):
-#     steps = random.random() * 2 - 1  # Random shift between -1 and 1 semitones
+# def pitch_shift(y, sr, rng=random):
+#     steps = rng.random() * 2 - 1  # Random shift between -1 and 1 semitones
 #     return librosa.effects.pitch_shift(y, sr=sr, n_steps=steps)
 
-def change_volume(y):
+def change_volume(y, rng=random):
     # Randomly change volume between -10 dB and +5 dB
-    volume_change = random.uniform(-10, 5)
+    volume_change = rng.uniform(-10, 5)
     y = y * 10**(volume_change / 20)
     return y
 
-def augment_sample(y, sr, noises):
+def augment_sample(y, sr, noises, rng=random):
     y_aug = np.copy(y)
-    
-    if random.random() < 0.4:
-        y_aug = time_stretch(y_aug)
-    
-    # if random.random() < 0.4:
-    #     y_aug = pitch_shift(y_aug, sr)
-    
-    if random.random() < 0.4:
-        y_aug = change_volume(y_aug)
-    
-    if random.random() < 0.8:
-        y_aug = add_background_noise(y_aug, noises)
-    
+
+    if rng.random() < 0.4:
+        y_aug = time_stretch(y_aug, rng)
+
+    # if rng.random() < 0.4:
+    #     y_aug = pitch_shift(y_aug, sr, rng)
+
+    if rng.random() < 0.4:
+        y_aug = change_volume(y_aug, rng)
+
+    if rng.random() < 0.8:
+        y_aug = add_background_noise(y_aug, noises, rng=rng)
+
     y_aug = librosa.util.fix_length(y_aug, size=16000)
     return y_aug
 
-def augment(noises, input_dir, output_dir, n_augment):
+def get_file_seed(seed, fname):
+    """
+    Each input file gets its own seed, so its augmentations don't depend on which worker handles it
+    or on the order files are processed in.
+    """
+    return zlib.crc32(f"{seed}:{fname}".encode())
+
+def get_output_names(fname, n_augment):
+    return [f"{fname[:-4]}_aug{i}.wav" for i in range(n_augment)] + [f"{fname[:-4]}_orig.wav"]
+
+def is_up_to_date(input_path, output_dir, output_names):
+    input_mtime = os.path.getmtime(input_path)
+    for out_name in output_names:
+        out_path = os.path.join(output_dir, out_name)
+        if not os.path.exists(out_path) or os.path.getmtime(out_path) < input_mtime:
+            return False
+    return True
+
+# Set in each worker process by init_worker, so the noise is only sent to each worker once. A
+# NoiseBank is reopened in each worker instead of being copied.
+_noises = None
+
+def init_worker(noises):
+    global _noises
+    _noises = noises
+
+def load_recording(path):
+    y, _ = librosa.load(path, sr=16000)
+
+    # Normalize the original file to -10 dBFS
+    y = y / np.max(np.abs(y))
+    y = y * 10**(-10 / 20)
+    return y
+
+def augment_file(input_path, output_dir, n_augment, seed):
+    fname = os.path.basename(input_path)
+    rng = random.Random(get_file_seed(seed, fname))
+
+    y, sr = load_recording(input_path), 16000
+
+    output_names = get_output_names(fname, n_augment)
+    for i in range(n_augment):
+        y_aug = augment_sample(y, sr, _noises, rng)
+        sf.write(os.path.join(output_dir, output_names[i]), y_aug, sr)
+
+    # Also copy the original file
+    shutil.copy(input_path, os.path.join(output_dir, output_names[-1]))
+    return fname
+
+def augment(noises, input_dir, output_dir, n_augment, seed=0, workers=None):
+    """
+    Augment every wav in `input_dir` into `output_dir`. Inputs whose outputs are newer than them are
+    skipped, unless the augmentation parameters changed since the last run. `noises` can be a
+    function returning the noise files, so they're only loaded if something needs augmenting.
+    """
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Delete all files in the augmented directory
-    for fname in os.listdir(output_dir):
-        os.remove(os.path.join(output_dir, fname))
+
+    state = {"n_augment": n_augment, "seed": seed}
+    state_path = os.path.join(output_dir, STATE_FILE)
+    previous_state = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            previous_state = json.load(f)
+        if previous_state != state:
+            # Remove it until we're done, so an interrupted run doesn't leave outputs from the old
+            # parameters looking up to date
+            os.remove(state_path)
 
     print(f"Augmenting wakeword files in {input_dir} into {output_dir}")
-    
-    for fname in os.listdir(input_dir):
-        if not fname.endswith('.wav'):
-            continue
-        
-        y, sr = librosa.load(os.path.join(input_dir, fname), sr=16000)
-        
-        # Normalize the original file to -10 dBFS
-        y = y / np.max(np.abs(y))
-        y = y * 10**(-10 / 20)
-        
-        for i in range(n_augment):
-            y_aug = augment_sample(y, sr, noises)
-            out_name = f"{fname[:-4]}_aug{i}.wav"
-            sf.write(os.path.join(output_dir, out_name), y_aug, sr)
-        
-        # Also copy the original file
-        out_name = f"{fname[:-4]}_orig.wav"
-        shutil.copy(os.path.join(input_dir, fname), os.path.join(output_dir, out_name))
-        print(f"Augmented {fname} into {n_augment} times and copied original.")
-    
+
+    inputs = sorted(fname for fname in os.listdir(input_dir) if fname.endswith('.wav'))
+    expected_outputs = set()
+    pending = []
+    for fname in inputs:
+        output_names = get_output_names(fname, n_augment)
+        expected_outputs.update(output_names)
+        input_path = os.path.join(input_dir, fname)
+        if previous_state != state or not is_up_to_date(input_path, output_dir, output_names):
+            pending.append(input_path)
+
+    # Delete outputs from inputs that were removed, or from a larger n_augment
+    for fname in os.listdir(output_dir):
+        if fname.endswith('.wav') and fname not in expected_outputs:
+            os.remove(os.path.join(output_dir, fname))
+
+    print(f"{len(inputs) - len(pending)} files are up to date, augmenting {len(pending)}")
+    if pending:
+        if callable(noises):
+            noises = noises()
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            init_worker(noises)
+            results = (augment_file(path, output_dir, n_augment, seed) for path in pending)
+            for i, fname in enumerate(results):
+                print(f"Augmented {fname} ({i + 1}/{len(pending)}) {n_augment} times and copied original.")
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(noises,)) as executor:
+                n = len(pending)
+                results = executor.map(augment_file, pending, [output_dir] * n, [n_augment] * n, [seed] * n)
+                for i, fname in enumerate(results):
+                    print(f"Augmented {fname} ({i + 1}/{len(pending)}) {n_augment} times and copied original.")
+
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
     print(f"Done augmenting into {output_dir}")
 
 
-def augment_wakewords(n_augment=10):
-    print("Loading noise files...")
-    noises = load_noise_files()
-    
+def augment_wakewords(n_augment=10, seed=0, workers=None):
+    noises = None
+
+    def get_noises():
+        nonlocal noises
+        if noises is None:
+            noises = load_noises(seed)
+        return noises
+
     print("Augmenting wakeword samples...")
-    augment(noises, WAKEWORD_DIR, AUGMENTED_WAKEWORD_DIR, n_augment)
+    augment(get_noises, WAKEWORD_DIR, AUGMENTED_WAKEWORD_DIR, n_augment, seed, workers)
     print("Augmenting not wakeword samples...")
-    augment(noises, NOT_WAKEWORD_DIR, AUGMENTED_NOT_WAKEWORD_DIR, n_augment)
-    
\ No newline at end of file
+    augment(get_noises, NOT_WAKEWORD_DIR, AUGMENTED_NOT_WAKEWORD_DIR, n_augment, seed, workers)
@@ -0,0 +1,131 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from wakeworddetection.augment import WAKEWORD_DIR, NOT_WAKEWORD_DIR, augment_sample, get_file_seed, load_noises, load_recording
+from wakeworddetection.dataset import FEATURE_SHAPE, get_split
+from wakeworddetection.features import SAMPLE_RATE, fix_length, mfcc
+
+# Samples per task sent to a worker
+TASK_SIZE = 64
+# Tasks kept in flight ahead of training, so the model doesn't wait for augmentation
+PREFETCH_TASKS = 16
+
+# Set in each worker process by init_worker
+_clips = None
+_noises = None
+
+def init_worker(clips, noises):
+    global _clips, _noises
+    _clips = clips
+    _noises = noises
+
+def load_recordings(split):
+    """
+    Load the normalized recordings from WAKEWORD_DIR and NOT_WAKEWORD_DIR in the given split.
+    Returns (clips, labels, sources).
+    """
+    clips, labels, sources = [], [], []
+    for label, folder in [(1, WAKEWORD_DIR), (0, NOT_WAKEWORD_DIR)]:
+        if not os.path.isdir(folder):
+            continue
+        for fname in sorted(os.listdir(folder)):
+            path = os.path.join(folder, fname)
+            if fname.endswith('.wav') and get_split(path) == split:
+                clips.append(fix_length(load_recording(path)))
+                labels.append(label)
+                sources.append(path)
+
+    clips = np.stack(clips) if clips else np.empty((0, SAMPLE_RATE), dtype=np.float32)
+    return clips.astype(np.float32), np.array(labels, dtype=np.float32), sources
+
+def make_batch(clip_indices, seeds):
+    """
+    Augment and featurize a batch of clips. A seed of None means the clip is used unaugmented.
+    """
+    audio = np.empty((len(clip_indices), SAMPLE_RATE), dtype=np.float32)
+    for i, (clip, seed) in enumerate(zip(clip_indices, seeds)):
+        if seed is None:
+            audio[i] = _clips[clip]
+        else:
+            audio[i] = augment_sample(_clips[clip], SAMPLE_RATE, _noises, random.Random(seed))
+    return mfcc(audio)
+
+class AugmentedStream:
+    """
+    Produces freshly augmented, featurized samples of the recordings in WAKEWORD_DIR and
+    NOT_WAKEWORD_DIR for every epoch, instead of training on a fixed set of augmented files.
+    Each epoch contains every recording once as-is and `n_augment` times augmented.
+
+    Augmentation runs in a background process pool; call close() (or use it as a context manager)
+    to shut the pool down.
+    """
+
+    def __init__(self, split='train', n_augment=10, seed=0, workers=None):
+        self.n_augment = n_augment
+        self.seed = seed
+        self.epoch = 0
+
+        self.clips, self.labels, self.sources = load_recordings(split)
+
+        noises = load_noises(seed)
+
+        workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(self.clips, noises))
+
+    def __len__(self):
+        return len(self.clips) * (1 + self.n_augment)
+
+    def batches(self):
+        """
+        Yield (features, labels) batches for one epoch. Every call produces a new epoch with
+        different augmentations; the result is still deterministic for a given seed.
+        """
+        epoch_seed = get_file_seed(self.seed, f"epoch{self.epoch}")
+        self.epoch += 1
+        rng = np.random.default_rng(epoch_seed)
+
+        clip_indices = np.repeat(np.arange(len(self.clips)), 1 + self.n_augment)
+        variants = np.tile(np.arange(1 + self.n_augment), len(self.clips))
+        order = rng.permutation(len(clip_indices))
+        clip_indices, variants = clip_indices[order], variants[order]
+
+        pending = deque()
+        for start in range(0, len(clip_indices), TASK_SIZE):
+            indices = clip_indices[start:start + TASK_SIZE]
+            seeds = [None if variant == 0 else get_file_seed(epoch_seed, f"{self.sources[clip]}:{variant}") for clip, variant in zip(indices, variants[start:start + TASK_SIZE])]
+            pending.append((self.executor.submit(make_batch, indices, seeds), indices))
+
+            if len(pending) >= PREFETCH_TASKS:
+                future, indices = pending.popleft()
+                yield future.result(), self.labels[indices]
+
+        while pending:
+            future, indices = pending.popleft()
+            yield future.result(), self.labels[indices]
+
+    def as_tf_dataset(self):
+        """
+        An unbatched tf.data.Dataset of (features[..., np.newaxis], label), with new augmentations
+        every time it's iterated.
+        """
+        import tensorflow as tf
+
+        def generator():
+            for X, y in self.batches():
+                yield X[..., np.newaxis], y
+
+        return tf.data.Dataset.from_generator(generator, output_signature=(
+            tf.TensorSpec(shape=(None, *FEATURE_SHAPE, 1), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        )).unbatch()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
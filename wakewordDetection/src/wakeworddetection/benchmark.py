@@ -0,0 +1,173 @@
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE, N_FFT, HOP_LENGTH, N_MFCC, StreamingMFCC, mfcc
+
+def make_test_audio(n_clips, seed=0):
+    """
+    Noise with some louder bursts and tones, so the features aren't all clipped to the same level.
+    """
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, 0.05, (n_clips, WINDOW_SIZE)).astype(np.float32)
+    t = np.arange(WINDOW_SIZE) / SAMPLE_RATE
+    for clip in audio:
+        start = rng.integers(0, WINDOW_SIZE // 2)
+        clip[start:start + WINDOW_SIZE // 4] *= rng.uniform(2, 20)
+        clip += 0.1 * np.sin(2 * np.pi * rng.uniform(100, 4000) * t).astype(np.float32)
+    return audio
+
+def time_call(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+def benchmark_features(n_clips=256, repeats=5, tolerance=1e-3):
+    """
+    Check that wakeworddetection.features matches librosa.feature.mfcc, and compare their speed.
+    librosa is only imported here, as a reference implementation.
+    """
+    import librosa
+    
+    def librosa_mfcc(y):
+        return librosa.feature.mfcc(y=y, sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH).T
+    
+    audio = make_test_audio(n_clips)
+    
+    print("Checking parity with librosa...")
+    expected = np.stack([librosa_mfcc(y) for y in audio])
+    batch_error = np.max(np.abs(mfcc(audio) - expected))
+    single_error = max(np.max(np.abs(mfcc(y) - e)) for y, e in zip(audio, expected))
+    
+    # Stream the clips back to back and compare every stride against the batch features
+    stream = audio.reshape(-1)
+    stride = 8 * HOP_LENGTH
+    streaming = StreamingMFCC()
+    streaming_error = 0.0
+    for end in range(WINDOW_SIZE, len(stream) + 1, stride):
+        window = stream[end - WINDOW_SIZE:end]
+        error = np.max(np.abs(streaming.update(window, end - WINDOW_SIZE) - librosa_mfcc(window)))
+        streaming_error = max(streaming_error, error)
+    
+    for name, error in [("Single clip", single_error), ("Batch", batch_error), ("Streaming", streaming_error)]:
+        status = "OK" if error <= tolerance else "MISMATCH"
+        print(f"  {name}: max abs error {error:.2e} [{status}]")
+    
+    print("Benchmarking...")
+    clip = audio[0]
+    librosa_single = time_call(lambda: librosa_mfcc(clip), repeats * 20)
+    numpy_single = time_call(lambda: mfcc(clip), repeats * 20)
+    librosa_batch = time_call(lambda: [librosa_mfcc(y) for y in audio], repeats)
+    numpy_batch = time_call(lambda: mfcc(audio), repeats)
+    
+    streaming = StreamingMFCC()
+    windows = [(stream[end - WINDOW_SIZE:end], end - WINDOW_SIZE) for end in range(WINDOW_SIZE, len(stream) + 1, stride)]
+    start = time.perf_counter()
+    for window, window_start in windows:
+        streaming.update(window, window_start)
+    numpy_stride = (time.perf_counter() - start) / len(windows)
+    
+    print(f"  Single clip: librosa {librosa_single * 1e3:.3f} ms, numpy {numpy_single * 1e3:.3f} ms ({librosa_single / numpy_single:.1f}x)")
+    print(f"  Batch of {n_clips}: librosa {librosa_batch * 1e3:.1f} ms, numpy {numpy_batch * 1e3:.1f} ms ({librosa_batch / numpy_batch:.1f}x)")
+    print(f"  Streaming stride: {numpy_stride * 1e3:.3f} ms ({librosa_single / numpy_stride:.1f}x faster than librosa on the full window)")
+    
+    return max(single_error, batch_error, streaming_error) <= tolerance
+
+# What a listener does before it can evaluate its first stride, minus opening the audio device.
+# Run in a fresh interpreter, so nothing is already imported.
+LISTENER_STARTUP_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import numpy as np
+from wakeworddetection.test import Detector, WakewordListener
+from wakeworddetection.tflite_model import get_interpreter
+detector = Detector("startup", sys.argv[1])
+listener = WakewordListener([detector], on_detection=lambda *args: None)
+ready = time.perf_counter() - start
+listener.detect_wakeword(np.zeros(listener.window.shape, dtype=np.float32), 0)
+first_stride = time.perf_counter() - start
+print(json.dumps({"runtime": get_interpreter()[0], "ready": ready, "first_stride": first_stride,
+                  "heavy_modules": sorted(name for name in ("tensorflow", "librosa", "scipy") if name in sys.modules)}))
+"""
+
+# The listener as it used to start: full TensorFlow and librosa, for comparison
+TENSORFLOW_STARTUP_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import numpy as np
+import librosa
+import tensorflow as tf
+interpreter = tf.lite.Interpreter(model_path=sys.argv[1])
+interpreter.allocate_tensors()
+ready = time.perf_counter() - start
+features = librosa.feature.mfcc(y=np.zeros(16000, dtype=np.float32), sr=16000, n_mfcc=13).T
+input_details = interpreter.get_input_details()[0]
+interpreter.set_tensor(input_details['index'], features[np.newaxis, ..., np.newaxis].astype(np.float32))
+interpreter.invoke()
+first_stride = time.perf_counter() - start
+print(json.dumps({"runtime": "tensorflow", "ready": ready, "first_stride": first_stride,
+                  "heavy_modules": sorted(name for name in ("tensorflow", "librosa", "scipy") if name in sys.modules)}))
+"""
+
+# Appended to the startup scripts to report peak memory. resource doesn't exist on Windows.
+MAX_RSS_SCRIPT = """
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    print(json.dumps({"max_rss_mb": rss / (1024 * 1024 if sys.platform == "darwin" else 1024)}))
+except ImportError:
+    print(json.dumps({"max_rss_mb": None}))
+"""
+
+# Regression thresholds for the slim listener
+STARTUP_BUDGET_SECONDS = 1.0
+RSS_BUDGET_MB = 150
+
+def measure_startup(script, model_path, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script + MAX_RSS_SCRIPT, model_path],
+                                capture_output=True, text=True, check=True).stdout
+        result = {}
+        # Only the last two lines are ours; TensorFlow likes to print things
+        for line in output.strip().splitlines()[-2:]:
+            result.update(json.loads(line))
+        results.append(result)
+
+    return {
+        "runtime": results[0]["runtime"],
+        "heavy_modules": results[0]["heavy_modules"],
+        "ready_s": float(np.median([result["ready"] for result in results])),
+        "first_stride_s": float(np.median([result["first_stride"] for result in results])),
+        "max_rss_mb": max(result["max_rss_mb"] for result in results) if results[0]["max_rss_mb"] is not None else None
+    }
+
+def benchmark_startup(model_path='./processed/wakeword_model.tflite', runs=3, baseline=True):
+    """
+    Measure the listener's cold start (until it could evaluate a stride, and until it has
+    evaluated one) and peak RSS in fresh processes, optionally against the full TensorFlow and
+    librosa startup it replaced. Returns whether the listener is within the budgets.
+    """
+    scenarios = [("listener", LISTENER_STARTUP_SCRIPT)]
+    if baseline:
+        scenarios.append(("tensorflow", TENSORFLOW_STARTUP_SCRIPT))
+
+    results = {}
+    for name, script in scenarios:
+        print(f"Measuring {name} startup ({runs} runs)...")
+        results[name] = measure_startup(script, model_path, runs)
+
+    for name, result in results.items():
+        rss = f"{result['max_rss_mb']:.0f} MB" if result["max_rss_mb"] is not None else "unknown"
+        print(f"  {name} ({result['runtime']}): ready {result['ready_s']:.3f} s, first stride {result['first_stride_s']:.3f} s, "
+              f"peak RSS {rss}, heavy modules: {', '.join(result['heavy_modules']) or 'none'}")
+
+    listener = results["listener"]
+    ok = listener["first_stride_s"] <= STARTUP_BUDGET_SECONDS and (listener["max_rss_mb"] is None or listener["max_rss_mb"] <= RSS_BUDGET_MB)
+    if listener["runtime"] == "tensorflow":
+        print("  No TFLite runtime is installed (ai-edge-litert or tflite-runtime), so the listener fell back to TensorFlow")
+    print(f"  Budget: {STARTUP_BUDGET_SECONDS:.1f} s, {RSS_BUDGET_MB} MB [{'OK' if ok else 'OVER BUDGET'}]")
+    return ok
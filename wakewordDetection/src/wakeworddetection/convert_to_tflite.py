@@ -1,18 +1,111 @@
+import os
+import json
+import numpy as np
 import tensorflow as tf
+from wakeworddetection.dataset import DATASET_DIR, ShardedDataset
+from wakeworddetection.tflite_model import TFLiteModel, measure_latency
 
 MODEL_PATH = './processed/wakeword_model.keras'
 OUTPUT_PATH = './processed/wakeword_model.tflite'
+STAGE1_MODEL_PATH = './processed/wakeword_stage1.keras'
+REPORT_PATH = './processed/tflite_report.json'
+
+# "dynamic" is dynamic-range quantization with float input and output, which is what we've always
+# exported. "int8" is full-integer quantization, including the input and output.
+MODES = ("float", "dynamic", "int8")
+OUTPUT_PATHS = {
+    "float": './processed/wakeword_model_float.tflite',
+    "dynamic": OUTPUT_PATH,
+    "int8": './processed/wakeword_model_int8.tflite'
+}
+STAGE1_OUTPUT_PATHS = {
+    "float": './processed/wakeword_stage1_float.tflite',
+    "dynamic": './processed/wakeword_stage1.tflite',
+    "int8": './processed/wakeword_stage1_int8.tflite'
+}
+
+# Training samples used to calibrate full-integer quantization
+REPRESENTATIVE_SAMPLES = 500
+# Threshold used for the accuracy report; the same as the live detector's default
+REPORT_THRESHOLD = 0.7
+
+def representative_dataset(n_samples=REPRESENTATIVE_SAMPLES):
+    X, _ = ShardedDataset(DATASET_DIR).load('train', limit=n_samples, seed=0)
+
+    def generator():
+        for features in X:
+            yield [features[np.newaxis, ..., np.newaxis]]
+    return generator
+
+def convert(model, mode="dynamic"):
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}")
 
-def convert_to_tflite():
-    model = tf.keras.models.load_model(MODEL_PATH)
-   
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
-    # Enable optimizations for size and performance
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
-    
-    tflite_model = converter.convert()
+    if mode in ("dynamic", "int8"):
+        # Enable optimizations for size and performance
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "int8":
+        converter.representative_dataset = representative_dataset()
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    return converter.convert()
+
+def convert_to_tflite(mode="dynamic", model_path=MODEL_PATH, output_path=None):
+    model = tf.keras.models.load_model(model_path)
+    output_path = output_path or OUTPUT_PATHS[mode]
+
+    tflite_model = convert(model, mode)
 
-    with open(OUTPUT_PATH, 'wb') as f:
+    with open(output_path, 'wb') as f:
         f.write(tflite_model)
 
-    print("Converted to TFLite!")
\ No newline at end of file
+    print(f"Converted to TFLite ({mode}): {output_path}")
+    return output_path
+
+def convert_models(mode="dynamic"):
+    """
+    Convert the model, and the cascade's first-stage model if one has been trained.
+    """
+    convert_to_tflite(mode)
+    if os.path.exists(STAGE1_MODEL_PATH):
+        convert_to_tflite(mode, STAGE1_MODEL_PATH, STAGE1_OUTPUT_PATHS[mode])
+
+def compare_tflite(threshold=REPORT_THRESHOLD):
+    """
+    Export the float, dynamic-range and int8 variants and compare their size, invoke latency and
+    validation accuracy.
+    """
+    X_val, Y_val = ShardedDataset(DATASET_DIR).load('val')
+    positives = Y_val == 1
+
+    report = {}
+    for mode in MODES:
+        path = convert_to_tflite(mode)
+        model = TFLiteModel(path, batch_size=256)
+
+        predictions = np.concatenate([model.predict(X_val[i:i + 256]) for i in range(0, len(X_val), 256)])
+        detected = predictions > threshold
+
+        report[mode] = {
+            "path": path,
+            "size_kb": os.path.getsize(path) / 1024,
+            "latency_ms": measure_latency(model) * 1000,
+            "accuracy": float(np.mean(detected == positives)),
+            "recall": float(np.mean(detected[positives])) if positives.any() else None,
+            "false_accept_rate": float(np.mean(detected[~positives])) if (~positives).any() else None
+        }
+
+    print(f"Validation samples: {len(X_val)}, threshold: {threshold}")
+    print(f"{'Mode':<10}{'Size (KB)':>12}{'Latency (ms)':>15}{'Accuracy':>11}{'Recall':>9}{'FAR':>9}")
+    for mode, result in report.items():
+        recall = f"{result['recall']:.4f}" if result['recall'] is not None else "-"
+        far = f"{result['false_accept_rate']:.4f}" if result['false_accept_rate'] is not None else "-"
+        print(f"{mode:<10}{result['size_kb']:>12.1f}{result['latency_ms']:>15.3f}{result['accuracy']:>11.4f}{recall:>9}{far:>9}")
+
+    with open(REPORT_PATH, 'w') as f:
+        json.dump({"threshold": threshold, "validation_samples": len(X_val), "models": report}, f, indent=2)
+    print(f"Wrote report to {REPORT_PATH}")
+    return report
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import zlib
+import numpy as np
+from wakeworddetection.features import N_FRAMES, N_MFCC
+
+DATASET_DIR = './processed/dataset/'
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Samples per shard; 4096 samples of (32, 13) float32 features is about 6.5 MB
+SHARD_SIZE = 4096
+FEATURE_SHAPE = (N_FRAMES, N_MFCC)
+
+VALIDATION_FRACTION = 0.2
+
+def get_split(source: str) -> str:
+    """
+    Deterministically assign a sample to 'train' or 'val' based on its source, so a sample keeps its
+    split as the dataset grows. Augmented variants of a recording are grouped with the original so
+    they can't leak across splits, whether they're augmented on disk or while training.
+    """
+    folder = os.path.basename(os.path.normpath(os.path.dirname(source))).removeprefix('augmented_')
+    name = re.sub(r'_(aug\d+|orig)(?=\.wav$)', '', os.path.basename(source))
+    bucket = zlib.crc32(f"{folder}/{name}".encode()) % 1000
+    return 'val' if bucket < VALIDATION_FRACTION * 1000 else 'train'
+
+def shard_path(directory, shard):
+    return os.path.join(directory, f"shard_{shard:05d}.npy")
+
+class ShardWriter:
+    """
+    Writes features to fixed-shape float32 .npy shards, plus a manifest with one JSON line per sample.
+    Existing shards are never rewritten, so opening a dataset again appends to it.
+    """
+
+    def __init__(self, directory=DATASET_DIR, overwrite=False, shard_size=SHARD_SIZE):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+        if overwrite:
+            for fname in os.listdir(directory):
+                if fname.startswith('shard_') or fname == MANIFEST_NAME:
+                    os.remove(os.path.join(directory, fname))
+
+        self.shard = 0
+        while os.path.exists(shard_path(directory, self.shard)):
+            self.shard += 1
+
+        self.buffer = np.empty((shard_size, *FEATURE_SHAPE), dtype=np.float32)
+        self.entries: list[dict] = []
+        self.written = 0
+
+    def add(self, features: np.ndarray, label: int, source: str, split: str | None = None):
+        row = len(self.entries)
+        self.buffer[row] = features
+        self.entries.append({
+            "source": source,
+            "label": int(label),
+            "split": split or get_split(source),
+            "shard": self.shard,
+            "index": row
+        })
+        if len(self.entries) == self.shard_size:
+            self.flush()
+
+    def add_batch(self, features: np.ndarray, labels, sources, split: str | None = None):
+        for row, label, source in zip(features, labels, sources):
+            self.add(row, label, source, split)
+
+    def flush(self):
+        if not self.entries:
+            return
+
+        # Write the shard before the manifest, so the manifest never points at a missing shard
+        np.save(shard_path(self.directory, self.shard), self.buffer[:len(self.entries)])
+        with open(self.manifest_path, 'a') as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + '\n')
+
+        self.written += len(self.entries)
+        self.entries = []
+        self.shard += 1
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ShardedDataset:
+    """
+    Reads a dataset written by ShardWriter. Shards are memory-mapped, so only the samples that are
+    currently being used have to be in memory.
+    """
+
+    def __init__(self, directory=DATASET_DIR):
+        self.directory = directory
+        self.sources: list[str] = []
+        labels, splits, shards, indices = [], [], [], []
+
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.sources.append(entry["source"])
+                labels.append(entry["label"])
+                splits.append(entry["split"])
+                shards.append(entry["shard"])
+                indices.append(entry["index"])
+
+        self.labels = np.array(labels, dtype=np.int8)
+        self.splits = np.array(splits)
+        self.shards = np.array(shards, dtype=np.int32)
+        self.indices = np.array(indices, dtype=np.int32)
+        self._shard_cache: dict[int, np.ndarray] = {}
+
+    def get_shard(self, shard: int) -> np.ndarray:
+        if shard not in self._shard_cache:
+            self._shard_cache[shard] = np.load(shard_path(self.directory, shard), mmap_mode='r')
+        return self._shard_cache[shard]
+
+    def select(self, split: str | None = None, exclude_folders=()) -> np.ndarray:
+        """
+        Manifest row numbers in the given split, or all of them, optionally excluding samples from
+        the given data folders.
+        """
+        mask = np.ones(len(self.labels), dtype=bool)
+        if split is not None:
+            mask &= self.splits == split
+        if exclude_folders:
+            folders = np.array([os.path.basename(os.path.dirname(source)) for source in self.sources])
+            mask &= ~np.isin(folders, list(exclude_folders))
+        return np.flatnonzero(mask)
+
+    def count(self, split: str | None = None, exclude_folders=()) -> int:
+        return len(self.select(split, exclude_folders))
+
+    def iter_batches(self, split: str | None = None, batch_size=256, shuffle=False, seed=None, exclude_folders=()):
+        """
+        Yield (features, labels) batches. When shuffling, shards are visited in a random order and
+        samples are shuffled within each shard; combine with a shuffle buffer to mix across shards.
+        """
+        rng = np.random.default_rng(seed)
+        rows = self.select(split, exclude_folders)
+        shard_ids = np.unique(self.shards[rows])
+        if shuffle:
+            rng.shuffle(shard_ids)
+
+        for shard in shard_ids:
+            shard_rows = rows[self.shards[rows] == shard]
+            if shuffle:
+                rng.shuffle(shard_rows)
+            data = self.get_shard(shard)
+            for i in range(0, len(shard_rows), batch_size):
+                batch = shard_rows[i:i + batch_size]
+                yield np.asarray(data[self.indices[batch]]), self.labels[batch]
+
+    def load(self, split: str | None = None, limit: int | None = None, seed=None, exclude_folders=()):
+        """
+        Load (a random subset of) a split into memory as (features, labels).
+        """
+        rows = self.select(split, exclude_folders)
+        if limit is not None and limit < len(rows):
+            rows = np.sort(np.random.default_rng(seed).choice(rows, limit, replace=False))
+
+        X = np.empty((len(rows), *FEATURE_SHAPE), dtype=np.float32)
+        for shard in np.unique(self.shards[rows]):
+            mask = self.shards[rows] == shard
+            X[mask] = self.get_shard(shard)[self.indices[rows[mask]]]
+        return X, self.labels[rows]
+
+    def as_tf_dataset(self, split: str | None = None, batch_size=32, shuffle=False, shuffle_buffer=8192, exclude_folders=()):
+        """
+        A batched tf.data.Dataset of (features[..., np.newaxis], label) read from the memory-mapped shards.
+        A new shuffle order is used every time the dataset is iterated (i.e. every epoch).
+        """
+        import tensorflow as tf
+
+        def generator():
+            for X, y in self.iter_batches(split, batch_size=1024, shuffle=shuffle, exclude_folders=exclude_folders):
+                yield X[..., np.newaxis], y.astype(np.float32)
+
+        dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+            tf.TensorSpec(shape=(None, *FEATURE_SHAPE, 1), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        )).unbatch()
+
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer)
+        return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
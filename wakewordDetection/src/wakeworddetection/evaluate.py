@@ -0,0 +1,214 @@
+import os
+import csv
+import time
+import threading
+import numpy as np
+from wakeworddetection.dataset import DATASET_DIR, ShardedDataset
+from wakeworddetection.tflite_model import TFLiteModel, measure_latency
+
+MODEL_PATH = './processed/wakeword_model.tflite'
+STAGE1_PATH = './processed/wakeword_stage1.tflite'
+CURVE_PATH = './processed/evaluation_curve.csv'
+
+EVAL_BATCH_SIZE = 256
+# Thresholds shown in the printed table; the CSV has every distinct score
+TABLE_THRESHOLDS = np.round(np.arange(0.05, 1.0, 0.05), 2)
+# The false accept rate we're willing to accept when picking an operating point
+TARGET_FALSE_ACCEPT_RATE = 0.01
+# First-stage thresholds compared by evaluate_cascade
+STAGE1_TABLE_THRESHOLDS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5)
+
+def predict_batched(path, X, batch_size=EVAL_BATCH_SIZE, threads=None):
+    """
+    Predict every sample in X with the model at `path`. X is split between `threads` threads, each
+    with its own interpreter resized to `batch_size`; TFLite releases the GIL while invoking, so
+    they run in parallel. Returns (predictions, seconds).
+    """
+    threads = max(1, min(threads or os.cpu_count() or 1, -(-len(X) // batch_size)))
+    predictions = np.empty(len(X), dtype=np.float32)
+    chunks = np.array_split(np.arange(len(X)), threads)
+    models = [TFLiteModel(path, num_threads=1, batch_size=batch_size) for _ in range(threads)]
+    errors = []
+
+    def run(model, indices):
+        try:
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                predictions[batch] = model.predict(X[batch])
+        except Exception as e:
+            errors.append(e)
+
+    start_time = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(model, chunk)) for model, chunk in zip(models, chunks)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start_time
+
+    if errors:
+        raise errors[0]
+    return predictions, elapsed
+
+def error_rates(predictions, labels, thresholds):
+    """
+    False accept and false reject rates when detecting at `prediction > threshold`, for each threshold.
+    """
+    positives = np.sort(predictions[labels == 1])
+    negatives = np.sort(predictions[labels == 0])
+    # Number of scores at or below each threshold
+    rejected_positives = np.searchsorted(positives, thresholds, side='right')
+    rejected_negatives = np.searchsorted(negatives, thresholds, side='right')
+
+    false_accept_rate = 1 - rejected_negatives / max(len(negatives), 1)
+    false_reject_rate = rejected_positives / max(len(positives), 1)
+    return false_accept_rate, false_reject_rate
+
+def roc_curve(predictions, labels):
+    """
+    Thresholds covering the whole ROC/DET curve, and the false accept and false reject rates at
+    each: one just below the lowest score, where everything is detected, then every distinct score.
+    """
+    scores = np.unique(predictions).astype(np.float64)
+    # Detecting at `prediction > threshold`, so 0 isn't low enough when a score is exactly 0, which
+    # quantized models give often. It's kept finite so it can be written to the curve CSV.
+    thresholds = np.concatenate([[np.nextafter(scores[0], -np.inf)], scores])
+    false_accept_rate, false_reject_rate = error_rates(predictions, labels, thresholds)
+    return thresholds, false_accept_rate, false_reject_rate
+
+def roc_auc(false_accept_rate, false_reject_rate):
+    """
+    The area under the ROC curve, for rates from roc_curve.
+    """
+    # The false accept rate falls as the threshold rises
+    true_positive_rate = 1 - false_reject_rate
+    return float(np.sum(-np.diff(false_accept_rate) * (true_positive_rate[1:] + true_positive_rate[:-1]) / 2))
+
+def operating_points(thresholds, false_accept_rate, false_reject_rate):
+    """
+    The equal error rate point, and the lowest false reject rate with a false accept rate of at
+    most TARGET_FALSE_ACCEPT_RATE. Ties go to the lower false accept rate, then the higher
+    threshold, since there are usually whole ranges of thresholds with the same rates.
+    """
+    # np.lexsort sorts by its last key first
+    gap = np.abs(false_accept_rate - false_reject_rate)
+    eer = int(np.lexsort((-thresholds, false_accept_rate, gap))[0])
+    points = {
+        "equal_error_rate": {
+            "threshold": float(thresholds[eer]),
+            "false_accept_rate": float(false_accept_rate[eer]),
+            "false_reject_rate": float(false_reject_rate[eer])
+        }
+    }
+
+    allowed = np.flatnonzero(false_accept_rate <= TARGET_FALSE_ACCEPT_RATE)
+    if len(allowed):
+        best = allowed[np.lexsort((-thresholds[allowed], false_accept_rate[allowed], false_reject_rate[allowed]))[0]]
+        points["target_false_accept_rate"] = {
+            "threshold": float(thresholds[best]),
+            "false_accept_rate": float(false_accept_rate[best]),
+            "false_reject_rate": float(false_reject_rate[best])
+        }
+    return points
+
+def evaluate(model_path=MODEL_PATH, batch_size=EVAL_BATCH_SIZE, threads=None, curve_path=CURVE_PATH):
+    """
+    Evaluate a TFLite model on the validation split. Writes the ROC/DET curve (false accept rate,
+    false reject rate and true positive rate at every distinct score) to `curve_path`, and prints a
+    threshold table, the suggested operating points and the throughput.
+    """
+    X, Y = ShardedDataset(DATASET_DIR).load('val')
+    if not len(X):
+        print("No validation samples found; run process first")
+        return None
+    print(f"Evaluating {model_path} on {len(X)} validation samples ({int(Y.sum())} positive)")
+
+    predictions, elapsed = predict_batched(model_path, X, batch_size, threads)
+
+    thresholds, false_accept_rate, false_reject_rate = roc_curve(predictions, Y)
+    true_positive_rate = 1 - false_reject_rate
+    auc = roc_auc(false_accept_rate, false_reject_rate)
+
+    os.makedirs(os.path.dirname(curve_path) or '.', exist_ok=True)
+    with open(curve_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["threshold", "false_accept_rate", "false_reject_rate", "true_positive_rate"])
+        for threshold, *rates in zip(thresholds, false_accept_rate, false_reject_rate, true_positive_rate):
+            # The first threshold is a hair below the lowest score, so it's written in full
+            writer.writerow([repr(float(threshold))] + [f"{rate:.6f}" for rate in rates])
+
+    table_far, table_frr = error_rates(predictions, Y, TABLE_THRESHOLDS)
+    print(f"{'Threshold':>10}{'FAR':>10}{'FRR':>10}")
+    for threshold, far, frr in zip(TABLE_THRESHOLDS, table_far, table_frr):
+        print(f"{threshold:>10.2f}{far:>10.4f}{frr:>10.4f}")
+
+    points = operating_points(thresholds, false_accept_rate, false_reject_rate)
+    for name, point in points.items():
+        print(f"{name}: threshold {point['threshold']:.4f}, FAR {point['false_accept_rate']:.4f}, FRR {point['false_reject_rate']:.4f}")
+
+    samples_per_second = len(X) / elapsed
+    print(f"ROC AUC: {auc:.4f}")
+    print(f"Throughput: {samples_per_second:.0f} samples/sec ({elapsed:.2f}s)")
+    print(f"Wrote ROC/DET curve to {curve_path}")
+
+    return {
+        "samples": len(X),
+        "auc": auc,
+        "operating_points": points,
+        "samples_per_second": samples_per_second
+    }
+
+def evaluate_cascade(model_path=MODEL_PATH, stage1_path=STAGE1_PATH, threshold=0.7, stage1_threshold=0.1,
+                     batch_size=EVAL_BATCH_SIZE, threads=None):
+    """
+    Evaluate the two-stage cascade on the validation split: a sample is detected if the first
+    stage scores above `stage1_threshold` and the full model above `threshold`. Reports the
+    combined recall and false accept rate, the fraction of samples that reach the second stage,
+    and what that means for the average compute per stride, for a range of first-stage thresholds.
+    """
+    X, Y = ShardedDataset(DATASET_DIR).load('val')
+    if not len(X):
+        print("No validation samples found; run process first")
+        return None
+    positives = Y == 1
+
+    stage1, _ = predict_batched(stage1_path, X, batch_size, threads)
+    stage2, _ = predict_batched(model_path, X, batch_size, threads)
+    stage1_latency = measure_latency(TFLiteModel(stage1_path))
+    stage2_latency = measure_latency(TFLiteModel(model_path))
+
+    # The validation split has far more positives than live audio does, so the fraction of live
+    # strides reaching the second stage is lower still; `replay --stage1` measures that directly
+    def summarize(t1):
+        reaches_stage2 = stage1 > t1
+        detected = reaches_stage2 & (stage2 > threshold)
+        stage2_fraction = float(np.mean(reaches_stage2))
+        cost = stage1_latency + stage2_fraction * stage2_latency
+        return {
+            "stage1_threshold": t1,
+            "recall": float(np.mean(detected[positives])) if positives.any() else None,
+            "false_accept_rate": float(np.mean(detected[~positives])) if (~positives).any() else None,
+            "stage2_fraction": stage2_fraction,
+            "negative_stage2_fraction": float(np.mean(reaches_stage2[~positives])) if (~positives).any() else None,
+            "cost_ratio": cost / stage2_latency
+        }
+
+    single = stage2 > threshold
+    print(f"Evaluating cascade {stage1_path} -> {model_path} on {len(X)} validation samples (threshold {threshold})")
+    print(f"Full model alone: recall {np.mean(single[positives]) if positives.any() else float('nan'):.4f}, "
+          f"FAR {np.mean(single[~positives]) if (~positives).any() else float('nan'):.4f}")
+    print(f"Invoke latency: first stage {stage1_latency * 1000:.3f} ms, full model {stage2_latency * 1000:.3f} ms")
+
+    print(f"{'Stage 1':>8}{'Recall':>9}{'FAR':>9}{'Stage 2':>9}{'Neg. stage 2':>14}{'Cost':>8}")
+    for t1 in sorted(set(STAGE1_TABLE_THRESHOLDS) | {stage1_threshold}):
+        if t1 > threshold:
+            continue
+        row = summarize(t1)
+        recall = f"{row['recall']:.4f}" if row['recall'] is not None else "-"
+        far = f"{row['false_accept_rate']:.4f}" if row['false_accept_rate'] is not None else "-"
+        negative = f"{row['negative_stage2_fraction']:.4f}" if row['negative_stage2_fraction'] is not None else "-"
+        marker = " *" if t1 == stage1_threshold else ""
+        print(f"{t1:>8.2f}{recall:>9}{far:>9}{row['stage2_fraction']:>9.4f}{negative:>14}{row['cost_ratio']:>8.3f}{marker}")
+    print("Cost is the average per-stride invoke time relative to running only the full model")
+
+    return summarize(stage1_threshold)
@@ -0,0 +1,197 @@
+import numpy as np
+
+# These match librosa.feature.mfcc's defaults, which is what the model was originally trained on.
+# With a one second window, they give exactly N_FRAMES frames.
+SAMPLE_RATE = 16000
+WINDOW_SIZE = 16000
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 13
+N_FRAMES = 1 + WINDOW_SIZE // HOP_LENGTH
+TOP_DB = 80.0
+AMIN = 1e-10
+
+# Anything cached based on these features should include this in its key
+FEATURE_PARAMS = f"mfcc-v1-sr{SAMPLE_RATE}-w{WINDOW_SIZE}-fft{N_FFT}-hop{HOP_LENGTH}-mels{N_MELS}-mfcc{N_MFCC}-db{TOP_DB}"
+
+# Batches are featurized in chunks so the (chunk, N_FRAMES, N_FFT) frame array stays reasonably small
+BATCH_CHUNK_SIZE = 64
+
+def hz_to_mel(frequencies: np.ndarray) -> np.ndarray:
+    """
+    Convert Hz to mels using the Slaney formula (linear below 1 kHz, logarithmic above), like librosa.
+    """
+    frequencies = np.asanyarray(frequencies, dtype=np.float64)
+    f_sp = 200.0 / 3
+    mels = frequencies / f_sp
+
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+
+    log_region = frequencies >= min_log_hz
+    mels = np.where(log_region, min_log_mel + np.log(np.maximum(frequencies, min_log_hz) / min_log_hz) / logstep, mels)
+    return mels
+
+def mel_to_hz(mels: np.ndarray) -> np.ndarray:
+    """
+    Inverse of hz_to_mel.
+    """
+    mels = np.asanyarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    frequencies = f_sp * mels
+
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+
+    log_region = mels >= min_log_mel
+    frequencies = np.where(log_region, min_log_hz * np.exp(logstep * (mels - min_log_mel)), frequencies)
+    return frequencies
+
+def mel_filterbank(sr: int = SAMPLE_RATE, n_fft: int = N_FFT, n_mels: int = N_MELS) -> np.ndarray:
+    """
+    Build a Slaney-normalized mel filterbank of shape (n_mels, 1 + n_fft // 2), equivalent to
+    librosa.filters.mel with its default arguments.
+    """
+    fft_frequencies = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    mel_frequencies = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2.0), n_mels + 2))
+
+    frequency_diff = np.diff(mel_frequencies)
+    ramps = mel_frequencies[:, np.newaxis] - fft_frequencies[np.newaxis, :]
+
+    lower = -ramps[:-2] / frequency_diff[:-1, np.newaxis]
+    upper = ramps[2:] / frequency_diff[1:, np.newaxis]
+    weights = np.maximum(0, np.minimum(lower, upper))
+
+    # Slaney normalization: each filter has approximately constant energy
+    enorm = 2.0 / (mel_frequencies[2:n_mels + 2] - mel_frequencies[:n_mels])
+    weights *= enorm[:, np.newaxis]
+    return weights.astype(np.float32)
+
+def dct_matrix(n_input: int = N_MELS, n_output: int = N_MFCC) -> np.ndarray:
+    """
+    Build an orthonormal type-II DCT matrix of shape (n_input, n_output), so `x @ dct_matrix()` is
+    equivalent to scipy.fft.dct(x, type=2, norm='ortho', axis=-1)[..., :n_output].
+    """
+    n = np.arange(n_input)
+    k = np.arange(n_output)
+    basis = np.cos(np.pi * k[np.newaxis, :] * (2 * n[:, np.newaxis] + 1) / (2 * n_input))
+    basis *= np.sqrt(2.0 / n_input)
+    basis[:, 0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+def hann_window(n_fft: int = N_FFT) -> np.ndarray:
+    """
+    Periodic Hann window, like scipy.signal.get_window('hann', n_fft).
+    """
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+# Precomputed once on import; these are small (about 1 MB in total)
+MEL_BASIS_T = np.ascontiguousarray(mel_filterbank().T)
+DCT_MATRIX = dct_matrix()
+FFT_WINDOW = hann_window()
+
+def fix_length(audio: np.ndarray, size: int = WINDOW_SIZE) -> np.ndarray:
+    """
+    Pad with zeros or truncate the last axis of `audio` to `size` samples.
+    """
+    length = audio.shape[-1]
+    if length < size:
+        padding = [(0, 0)] * (audio.ndim - 1) + [(0, size - length)]
+        return np.pad(audio, padding)
+    return audio[..., :size]
+
+def frames_to_mel_db(frames: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., N_FFT) frames of audio to unclipped log-mel power in decibels, shape (..., N_MELS).
+    """
+    power = np.abs(np.fft.rfft(frames * FFT_WINDOW, axis=-1)) ** 2
+    mel = power @ MEL_BASIS_T
+    return 10.0 * np.log10(np.maximum(AMIN, mel))
+
+def mel_db_to_mfcc(mel_db: np.ndarray, reference: np.ndarray | float | None = None) -> np.ndarray:
+    """
+    Clip log-mel frames (..., frames, N_MELS) to TOP_DB below `reference` and apply the DCT.
+    `reference` defaults to the maximum over the frames, which is what librosa does.
+    """
+    if reference is None:
+        reference = mel_db.max(axis=(-2, -1), keepdims=True)
+    return np.maximum(mel_db, reference - TOP_DB) @ DCT_MATRIX
+
+def _mfcc_batch(audio: np.ndarray) -> np.ndarray:
+    padded = np.pad(audio, ((0, 0), (N_FFT // 2, N_FFT // 2)))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT, axis=-1)[:, ::HOP_LENGTH]
+    return mel_db_to_mfcc(frames_to_mel_db(frames))
+
+def mfcc(audio: np.ndarray) -> np.ndarray:
+    """
+    Compute the model's input features for one clip of shape (samples,) or a batch of shape
+    (N, samples). Clips are padded or truncated to WINDOW_SIZE first.
+
+    Returns float32 features of shape (N_FRAMES, N_MFCC) or (N, N_FRAMES, N_MFCC).
+    """
+    audio = fix_length(np.asarray(audio, dtype=np.float32))
+    if audio.ndim == 1:
+        return _mfcc_batch(audio[np.newaxis])[0]
+
+    out = np.empty((audio.shape[0], N_FRAMES, N_MFCC), dtype=np.float32)
+    for i in range(0, audio.shape[0], BATCH_CHUNK_SIZE):
+        out[i:i + BATCH_CHUNK_SIZE] = _mfcc_batch(audio[i:i + BATCH_CHUNK_SIZE])
+    return out
+
+class StreamingMFCC:
+    """
+    Computes the same features as mfcc() over a sliding window, but only runs the STFT on frames
+    that weren't already computed for the previous window.
+
+    The log-mel spectrogram is clipped to TOP_DB below its maximum over the whole window, so we
+    keep the unclipped log-mel frames and only clip and apply the DCT when producing output.
+    """
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self.window_size = window_size
+        self.n_frames = 1 + window_size // HOP_LENGTH
+
+        # Frames are centered, so the first and last few frames include zero padding. Those depend on
+        # where the window starts, so they can never be reused.
+        offsets = np.arange(self.n_frames) * HOP_LENGTH
+        self.interior = (offsets >= N_FFT // 2) & (offsets + N_FFT // 2 <= window_size)
+        self.frame_indices = np.arange(N_FFT)
+
+        self.mel_db = np.zeros((self.n_frames, N_MELS), dtype=np.float32)
+
+        # Absolute sample index of the window mel_db was computed for
+        self.start: int | None = None
+
+    def reset(self):
+        self.start = None
+
+    def update(self, window: np.ndarray, start: int) -> np.ndarray:
+        """
+        Returns the (N_FRAMES, N_MFCC) features for `window`, where `start` is the absolute index of
+        its first sample in the stream.
+        """
+        reusable = np.zeros(self.n_frames, dtype=bool)
+
+        if self.start is not None:
+            shift, remainder = divmod(start - self.start, HOP_LENGTH)
+            if remainder == 0 and 0 <= shift < self.n_frames:
+                kept = self.n_frames - shift
+                reusable[:kept] = self.interior[:kept] & self.interior[shift:]
+                source = np.flatnonzero(reusable) + shift
+                self.mel_db[reusable] = self.mel_db[source]
+
+        compute = np.flatnonzero(~reusable)
+        if compute.size > 0:
+            padded = np.pad(window, N_FFT // 2)
+            frames = padded[compute[:, np.newaxis] * HOP_LENGTH + self.frame_indices]
+            self.mel_db[compute] = frames_to_mel_db(frames)
+
+        self.start = start
+
+        features = mel_db_to_mfcc(self.mel_db[:N_FRAMES], self.mel_db.max())
+        if features.shape[0] < N_FRAMES:
+            features = np.pad(features, ((0, N_FRAMES - features.shape[0]), (0, 0)))
+        return features
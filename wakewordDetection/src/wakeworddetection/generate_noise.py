@@ -1,17 +1,180 @@
 import numpy as np
 import soundfile as sf
 import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE, mfcc
+from wakeworddetection.dataset import DATASET_DIR, MANIFEST_NAME, ShardWriter, ShardedDataset
 
 OUT_DIR = './data/silence/'
 
-def generate_silence(samples=1000):
-    os.makedirs(OUT_DIR, exist_ok=True)
+# - white: flat spectrum, which is all we used to generate
+# - pink and brown: 1/f and 1/f^2 power spectra, closer to real background noise
+# - room: brown-ish rumble with mains hum at 50 or 60 Hz and a few harmonics, like an idle room
+#   with electronics in it
+PROFILES = ("white", "pink", "brown", "room")
+SPECTRAL_EXPONENTS = {"white": 0.0, "pink": 1.0, "brown": 2.0}
+MAINS_FREQUENCIES = (50.0, 60.0)
+HUM_HARMONICS = 4
 
-    for i in range(samples):
-        amplitude = 10 ** np.random.uniform(-6, -3)
-        
-        silent_audio = np.random.normal(0, amplitude, 16000).astype(np.float32)
-        filename = os.path.join(OUT_DIR, f"silence_{i}.wav")
-        sf.write(filename, silent_audio, samplerate=16000)
+# Silence is generated and featurized this many samples at a time, to bound memory use
+GENERATION_CHUNK_SIZE = 1024
 
-    print(f"Generated {samples} silent samples in {OUT_DIR}")
\ No newline at end of file
+# Synthetic silence written straight to the shards is recorded here, so process_dataset can
+# regenerate it (deterministically) whenever it rebuilds the dataset
+SYNTHETIC_CONFIG_PATH = os.path.join(DATASET_DIR, 'synthetic_silence.json')
+SYNTHETIC_FOLDER = 'synthetic_silence'
+
+def shaped_noise(n, power_shape, rng, size=WINDOW_SIZE):
+    """
+    n rows of unit-RMS noise whose power spectrum follows `power_shape` (one value per rfft bin),
+    drawn directly in the frequency domain.
+    """
+    bins = size // 2 + 1
+    spectrum = rng.standard_normal((n, bins), dtype=np.float32) + 1j * rng.standard_normal((n, bins), dtype=np.float32)
+    spectrum *= np.sqrt(power_shape).astype(np.float32)
+    noise = np.fft.irfft(spectrum, n=size, axis=1).astype(np.float32)
+    return noise / np.sqrt(np.mean(noise ** 2, axis=1, keepdims=True) + 1e-20)
+
+def spectral_shape(profile, size=WINDOW_SIZE):
+    # Don't let the DC bin blow up
+    frequencies = np.maximum(np.fft.rfftfreq(size, d=1.0 / SAMPLE_RATE), 1.0)
+    if profile == "room":
+        # Mostly rumble, with some pink noise on top
+        return 1.0 / frequencies ** 2 + 0.002 / frequencies
+    return 1.0 / frequencies ** SPECTRAL_EXPONENTS[profile]
+
+def hum_basis(size=WINDOW_SIZE):
+    """
+    Sines and cosines of the first HUM_HARMONICS harmonics of 50 and 60 Hz, shape (2, 2 * HUM_HARMONICS, size).
+    Any phase of a harmonic is a weighted sum of its sine and cosine, so hum is just a matrix product.
+    """
+    t = np.arange(size) / SAMPLE_RATE
+    basis = []
+    for mains in MAINS_FREQUENCIES:
+        harmonics = 2 * np.pi * mains * np.arange(1, HUM_HARMONICS + 1)[:, np.newaxis] * t
+        basis.append(np.concatenate([np.sin(harmonics), np.cos(harmonics)]))
+    return np.array(basis, dtype=np.float32)
+
+def room_tone(n, rng, size=WINDOW_SIZE):
+    """
+    n rows of unit-RMS room tone: brown/pink noise plus mains hum with random harmonics.
+    """
+    noise = shaped_noise(n, spectral_shape("room", size), rng, size)
+
+    basis = hum_basis(size)
+    mains = rng.integers(len(MAINS_FREQUENCIES), size=n)
+    amplitude = rng.uniform(0, 1, size=(n, HUM_HARMONICS)) * (0.5 / np.arange(1, HUM_HARMONICS + 1))
+    phase = rng.uniform(0, 2 * np.pi, size=(n, HUM_HARMONICS))
+    # a * sin(x + phase) = a * cos(phase) * sin(x) + a * sin(phase) * cos(x)
+    weights = np.concatenate([amplitude * np.cos(phase), amplitude * np.sin(phase)], axis=1).astype(np.float32)
+
+    tone = noise
+    for i in range(len(MAINS_FREQUENCIES)):
+        mask = mains == i
+        tone[mask] += weights[mask] @ basis[i]
+    return tone / np.sqrt(np.mean(tone ** 2, axis=1, keepdims=True) + 1e-20)
+
+def make_silence(n, profiles=("white",), rng=None, size=WINDOW_SIZE) -> np.ndarray:
+    """
+    Generate n near-silent clips as one (n, size) float32 array. Each clip gets a random profile
+    from `profiles` and a random level between -120 and -60 dBFS RMS, the same range as before.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    for profile in profiles:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown silence profile: {profile}")
+
+    choices = rng.integers(len(profiles), size=n)
+    audio = np.empty((n, size), dtype=np.float32)
+    for i, profile in enumerate(profiles):
+        mask = choices == i
+        count = int(mask.sum())
+        if count == 0:
+            continue
+        if profile == "white":
+            audio[mask] = rng.standard_normal((count, size), dtype=np.float32)
+        elif profile == "room":
+            audio[mask] = room_tone(count, rng, size)
+        else:
+            audio[mask] = shaped_noise(count, spectral_shape(profile, size), rng, size)
+
+    amplitude = 10 ** rng.uniform(-6, -3, size=(n, 1))
+    audio *= amplitude.astype(np.float32)
+    return audio
+
+def make_silence_chunk(start, count, profiles, seed):
+    # Every chunk has its own seed, so the output doesn't depend on how chunks are spread over workers
+    return make_silence(count, profiles, np.random.default_rng([seed, start]))
+
+def featurize_silence_chunk(start, count, profiles, seed):
+    return mfcc(make_silence_chunk(start, count, profiles, seed))
+
+def iter_silence_features(samples, profiles=("white",), seed=0, workers=None):
+    """
+    Yield (start index, features) for chunks of generated silence, in order. Generating and
+    featurizing is spread over a process pool.
+    """
+    starts = list(range(0, samples, GENERATION_CHUNK_SIZE))
+    counts = [min(GENERATION_CHUNK_SIZE, samples - start) for start in starts]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(starts) == 1:
+        for start, count in zip(starts, counts):
+            yield start, featurize_silence_chunk(start, count, profiles, seed)
+        return
+
+    n = len(starts)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from zip(starts, executor.map(featurize_silence_chunk, starts, counts, [profiles] * n, [seed] * n))
+
+def write_synthetic_silence(writer: ShardWriter, config, workers=None):
+    """
+    Generate the silence described by `config`, featurize it in batches and add it to `writer`.
+    """
+    for start, features in iter_silence_features(config["samples"], config["profiles"], config["seed"], workers):
+        sources = [f"{SYNTHETIC_FOLDER}/silence_{config['seed']}_{start + i}.wav" for i in range(len(features))]
+        writer.add_batch(features, [0] * len(features), sources)
+
+def add_synthetic_silence(writer: ShardWriter, workers=None):
+    """
+    Called by process_dataset: re-adds the synthetic silence configured by generate_silence, if any.
+    """
+    if not os.path.exists(SYNTHETIC_CONFIG_PATH):
+        return 0
+    with open(SYNTHETIC_CONFIG_PATH) as f:
+        config = json.load(f)
+    print(f"Adding {config['samples']} synthetic silence samples ({', '.join(config['profiles'])})")
+    write_synthetic_silence(writer, config, workers)
+    return config["samples"]
+
+def generate_silence(samples=1000, seed=0, profiles=("white",), to_shards=False, workers=None):
+    """
+    Generate near-silent negative samples. By default they're written to OUT_DIR as wav files for
+    process_dataset to pick up; with `to_shards`, they're featurized straight into the processed
+    dataset instead, with no per-file I/O.
+    """
+    if not to_shards:
+        os.makedirs(OUT_DIR, exist_ok=True)
+        for start in range(0, samples, GENERATION_CHUNK_SIZE):
+            audio = make_silence_chunk(start, min(GENERATION_CHUNK_SIZE, samples - start), profiles, seed)
+            for i, silent_audio in enumerate(audio):
+                filename = os.path.join(OUT_DIR, f"silence_{start + i}.wav")
+                sf.write(filename, silent_audio, samplerate=SAMPLE_RATE)
+
+        print(f"Generated {samples} silent samples in {OUT_DIR}")
+        return
+
+    config = {"samples": samples, "seed": seed, "profiles": list(profiles)}
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    with open(SYNTHETIC_CONFIG_PATH, 'w') as f:
+        json.dump(config, f)
+
+    if os.path.exists(os.path.join(DATASET_DIR, MANIFEST_NAME)):
+        if any(source.startswith(f"{SYNTHETIC_FOLDER}/") for source in ShardedDataset(DATASET_DIR).sources):
+            # Shards are append-only, so the old samples can't be swapped out in place
+            print("The dataset already has synthetic silence; run process to rebuild it with these settings")
+            return
+
+    with ShardWriter(DATASET_DIR) as writer:
+        write_synthetic_silence(writer, config, workers)
+    print(f"Added {samples} synthetic silence samples to {DATASET_DIR}; process will keep regenerating them")
@@ -1,37 +1,121 @@
 import os
+import json
 import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 DATASET_DIR = './data/not_wakeword_dataset/'
 OUTPUT_DIR = './data/not_wakeword_from_dataset/'
 
-def load_datasets():
+# Every wav in DATASET_DIR, so repeat runs don't have to walk the whole tree. The first line is a
+# JSON header with the modification time of every directory, which is how we know it's stale; the
+# rest are paths relative to DATASET_DIR, one per line.
+CORPUS_MANIFEST_PATH = './processed/corpus_manifest.txt'
+
+def walk_corpus(directory=DATASET_DIR):
+    """
+    Yield (relative directory, directory mtime, wav file names) for every directory, in a stable order.
+    """
+    for root, dirs, filenames in os.walk(directory):
+        dirs.sort()
+        yield os.path.relpath(root, directory), os.path.getmtime(root), sorted(f for f in filenames if f.endswith('.wav'))
+
+def is_manifest_current(header, directory=DATASET_DIR):
+    """
+    Adding or removing a file or subdirectory changes its parent directory's mtime, so checking
+    every directory we saw last time is enough.
+    """
+    for relative_dir, mtime in header["dirs"].items():
+        path = os.path.join(directory, relative_dir)
+        if not os.path.isdir(path) or os.path.getmtime(path) != mtime:
+            return False
+    return header.get("directory") == os.path.abspath(directory)
+
+def iter_corpus(directory=DATASET_DIR, manifest_path=CORPUS_MANIFEST_PATH, rescan=False):
+    """
+    Yield the path of every wav in the corpus. Reads the cached manifest if it's current; otherwise
+    walks the directory, writing a new manifest as it goes. Either way, the list of files is never
+    held in memory.
+    """
+    if not rescan and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            header = json.loads(f.readline())
+            if is_manifest_current(header, directory):
+                print(f"Using corpus manifest {manifest_path} ({header['files']} files)")
+                for line in f:
+                    yield os.path.join(directory, line.rstrip('\n'))
+                return
+
+    print(f"Scanning {directory}...")
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    dirs = {}
+    count = 0
+    temp_path = manifest_path + '.tmp'
+    # The header needs every directory's mtime, so the paths go to a temporary file first
+    with open(temp_path + '.paths', 'w') as paths:
+        for relative_dir, mtime, filenames in walk_corpus(directory):
+            dirs[relative_dir] = mtime
+            for filename in filenames:
+                relative_path = os.path.normpath(os.path.join(relative_dir, filename))
+                paths.write(relative_path + '\n')
+                count += 1
+                yield os.path.join(directory, relative_path)
+
+    with open(temp_path, 'w') as f, open(temp_path + '.paths') as paths:
+        f.write(json.dumps({"directory": os.path.abspath(directory), "files": count, "dirs": dirs}) + '\n')
+        shutil.copyfileobj(paths, f)
+    os.remove(temp_path + '.paths')
+    os.replace(temp_path, manifest_path)
+    print(f"Wrote corpus manifest with {count} files to {manifest_path}")
+
+def reservoir_sample(items, k, rng):
+    """
+    Uniformly sample k items from an iterable of unknown length in one pass, keeping only k in memory.
+    """
+    sample = []
+    for i, item in enumerate(items):
+        if i < k:
+            sample.append(item)
+        else:
+            j = rng.randrange(i + 1)
+            if j < k:
+                sample[j] = item
+    return sample
+
+def link_or_copy(source, destination):
+    # Hardlinks are free and leave the source dataset intact; fall back to copying across devices
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+def load_datasets(samples=10000, seed=0, workers=None, rescan=False):
     # Because we intend for the user to download the entire speech_commands dataset,
-    # but don't want all the data, we will only load a random 10000 samples.
-    
+    # but don't want all the data, we will only load a random sample of it.
+
     os.makedirs(DATASET_DIR, exist_ok=True)
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
+
+    removed = 0
     for filename in os.listdir(OUTPUT_DIR):
         file_path = os.path.join(OUTPUT_DIR, filename)
         if os.path.isfile(file_path):
             os.remove(file_path)
-            print(f"Removed file {file_path}")
-    
-    # List every file from every subfolder in the dataset directory
-    files = []
-    for root, dirs, filenames in os.walk(DATASET_DIR):
-        for filename in filenames:
-            if filename.endswith('.wav'):
-                files.append(os.path.join(root, filename))
-    
-    # Randomly select 10000 files
-    selected_files = random.sample(files, 10000)
-    
-    # Copy the random files to the top-level dataset directory
-    for i, file in enumerate(selected_files):
-        new_file_path = os.path.join(OUTPUT_DIR, f"not_wakeword_{i}.wav")
-        if not os.path.exists(new_file_path):
-            os.rename(file, new_file_path)
-            print(f"Moved {file} to {new_file_path}")
-        else:
-            print(f"File {new_file_path} already exists, skipping.")
\ No newline at end of file
+            removed += 1
+    if removed:
+        print(f"Removed {removed} files from {OUTPUT_DIR}")
+
+    selected_files = reservoir_sample(iter_corpus(rescan=rescan), samples, random.Random(seed))
+    if len(selected_files) < samples:
+        print(f"Only found {len(selected_files)} files, using all of them")
+    # Reservoir sampling leaves the sample in a partly positional order
+    random.Random(seed).shuffle(selected_files)
+
+    # Link (or copy) the random files into the output directory
+    destinations = [os.path.join(OUTPUT_DIR, f"not_wakeword_{i}.wav") for i in range(len(selected_files))]
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for i, _ in enumerate(executor.map(link_or_copy, selected_files, destinations)):
+            if (i + 1) % 1000 == 0:
+                print(f"Linked {i + 1}/{len(selected_files)} files")
+
+    print(f"Loaded {len(selected_files)} files into {OUTPUT_DIR} (seed {seed})")
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+# Upper bounds of the duration buckets, in seconds. A stride is 0.256 seconds, so anything close to
+# the top buckets means the listener is about to fall behind.
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# How much audio is waiting to be evaluated, in seconds. One stride is normal; more means we're behind.
+QUEUE_LAG_BUCKETS = (0.0, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0)
+BUCKETS = {"queue_lag": QUEUE_LAG_BUCKETS}
+
+METRICS_INTERVAL = 10.0  # seconds
+METRIC_PREFIX = "wakeword"
+
+class Histogram:
+    """
+    A cumulative histogram with fixed buckets, like Prometheus'. Observing is a bisect and a few
+    additions, so it's cheap enough for the audio callback.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+
+        cumulative = []
+        running = 0
+        for le, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative.append([le, running])
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+class ListenerMetrics:
+    """
+    Histograms of the listener's timings, by name: "callback" (the audio callback), "queue_lag"
+    (audio waiting to be evaluated, in seconds) and one per evaluation stage. Counters aren't kept
+    here, since the listener and detectors already count everything; they're read at export time.
+    """
+
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(BUCKETS.get(name, DURATION_BUCKETS)))
+        histogram.observe(value)
+
+    def snapshot(self, counters=()):
+        """
+        `counters` is a list of (name, labels, value).
+        """
+        with self.lock:
+            histograms = dict(self.histograms)
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": time.time() - self.start_time,
+            "histograms": {name: histogram.snapshot() for name, histogram in sorted(histograms.items())},
+            "counters": [{"name": name, "labels": labels, "value": value} for name, labels, value in counters]
+        }
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+def to_prometheus(snapshot):
+    """
+    Render a snapshot in the Prometheus text format, e.g. for node_exporter's textfile collector.
+    """
+    # Every sample of a metric has to come right after its TYPE line, so they're grouped first
+    families: dict[str, tuple[str, list[str]]] = {
+        f"{METRIC_PREFIX}_uptime_seconds": ("gauge", [f"{METRIC_PREFIX}_uptime_seconds {snapshot['uptime_seconds']:.3f}"])
+    }
+
+    for name, histogram in snapshot["histograms"].items():
+        if name == "queue_lag":
+            metric, labels = f"{METRIC_PREFIX}_queue_lag_seconds", {}
+        elif name == "callback":
+            metric, labels = f"{METRIC_PREFIX}_callback_duration_seconds", {}
+        else:
+            metric, labels = f"{METRIC_PREFIX}_stage_duration_seconds", {"stage": name}
+
+        samples = families.setdefault(metric, ("histogram", []))[1]
+        for le, count in histogram["buckets"]:
+            samples.append(f"{metric}_bucket{format_labels({**labels, 'le': f'{le:g}'})} {count}")
+        samples.append(f"{metric}_bucket{format_labels({**labels, 'le': '+Inf'})} {histogram['count']}")
+        samples.append(f"{metric}_sum{format_labels(labels)} {histogram['sum']:.6f}")
+        samples.append(f"{metric}_count{format_labels(labels)} {histogram['count']}")
+
+    for counter in snapshot["counters"]:
+        metric = f"{METRIC_PREFIX}_{counter['name']}_total"
+        families.setdefault(metric, ("counter", []))[1].append(f"{metric}{format_labels(counter['labels'])} {counter['value']}")
+
+    lines = []
+    for metric, (kind, samples) in families.items():
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+def write_metrics(snapshot, path):
+    """
+    Write a snapshot as JSON if `path` ends in .json, otherwise in the Prometheus text format. The
+    file is replaced atomically, so readers never see a partial one.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        if path.endswith('.json'):
+            json.dump(snapshot, f, indent=2)
+        else:
+            f.write(to_prometheus(snapshot))
+    os.replace(temp_path, path)
+
+class MetricsExporter:
+    """
+    Writes `metrics` plus the counters from `get_counters()` to `path` every `interval` seconds on a
+    background thread, and once more when stopped.
+    """
+
+    def __init__(self, metrics: ListenerMetrics, get_counters, path, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.get_counters = get_counters
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def export(self):
+        write_metrics(self.metrics.snapshot(self.get_counters()), self.path)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.export()
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.export()
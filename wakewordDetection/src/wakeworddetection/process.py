@@ -1,39 +1,203 @@
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import librosa
 import numpy as np
 import soundfile as sf
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE, FEATURE_PARAMS, mfcc
+from wakeworddetection.dataset import DATASET_DIR, FEATURE_SHAPE, ShardWriter, get_split
+from wakeworddetection.generate_noise import add_synthetic_silence
 
 DATA_DIR = './data/'
 OUT_DIR = './processed/'
+CACHE_DIR = './processed/feature_cache/'
 os.makedirs(OUT_DIR, exist_ok=True)
 
-def process_audio(file_path, max_len=16000):
-    y, sr = librosa.load(file_path, sr=16000)
+FOLDERS = [(0, 'silence'), (0, 'not_wakeword_from_dataset'), (0, 'augmented_not_wakeword'), (1, 'augmented_wakeword')]
+
+# Long recordings from `record_negatives --session`, which are cut into overlapping windows here
+# rather than being saved as a file per window. This matches record_negatives' 0.5s stride.
+SESSION_FOLDERS = [(0, 'not_wakeword_sessions')]
+SESSION_STRIDE = WINDOW_SIZE // 2
+# Windows are assigned to a split in blocks this long, so overlapping windows can only end up in
+# different splits at a block boundary
+SESSION_SPLIT_BLOCK = 60 * SAMPLE_RATE
+
+# How often to print progress, in files
+PROGRESS_INTERVAL = 1000
+# Session windows featurized at once
+SESSION_BATCH_SIZE = 256
+
+def process_audio(file_path, max_len=WINDOW_SIZE):
+    y, _ = librosa.load(file_path, sr=SAMPLE_RATE)
     if len(y) < max_len:
         y = np.pad(y, (0, max_len - len(y)))
     else:
         y = y[:max_len]
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-    return mfcc.T  # shape: (time_steps, 13)
+    return mfcc(y)  # shape: (time_steps, 13)
 
-def process_dataset():
-    print("Processing dataset...")
-    X, y = [], []
-    for label, subfolder in [(0, 'silence'), (0, 'not_wakeword_from_dataset'), (0, 'augmented_not_wakeword'), (1, 'augmented_wakeword')]:
+def read_session(file_path, batch_size=SESSION_BATCH_SIZE):
+    """
+    Yield the WINDOW_SIZE windows of a long recording, SESSION_STRIDE apart, in batches of up to
+    `batch_size`. Only one batch's worth of audio is read at a time.
+    """
+    # Consecutive blocks overlap by a window less a stride, so every window is in exactly one block
+    blocksize = (batch_size - 1) * SESSION_STRIDE + WINDOW_SIZE
+    for block in sf.blocks(file_path, blocksize=blocksize, overlap=WINDOW_SIZE - SESSION_STRIDE, dtype='float32', always_2d=True):
+        block = block.mean(axis=1)
+        starts = range(0, len(block) - WINDOW_SIZE + 1, SESSION_STRIDE)
+        if len(starts):
+            yield np.stack([block[start:start + WINDOW_SIZE] for start in starts])
+
+def get_session_sample(file_path, i):
+    """
+    The source and split of a session's `i`th window.
+    """
+    name = file_path[:-4]
+    block = i * SESSION_STRIDE // SESSION_SPLIT_BLOCK
+    return f"{name}_{i * SESSION_STRIDE / SAMPLE_RATE:.1f}s.wav", get_split(f"{name}_block{block}.wav")
+
+def get_cache_path(file_path, kind=""):
+    """
+    The cache is keyed by the file's contents and the feature parameters, so renamed files still hit
+    the cache and changing the features invalidates it. `kind` distinguishes different ways of
+    featurizing the same file.
+    """
+    digest = hashlib.sha1(FEATURE_PARAMS.encode() + kind.encode())
+    with open(file_path, 'rb') as f:
+        # In chunks, since sessions can be hours long
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return os.path.join(CACHE_DIR, f"{digest.hexdigest()}.npy")
+
+def process_file(file_path, use_cache=True):
+    """
+    Featurize a single file, using the on-disk cache if possible. Returns (features, was_cached).
+    """
+    if not use_cache:
+        return process_audio(file_path), False
+
+    cache_path = get_cache_path(file_path)
+    if os.path.exists(cache_path):
+        try:
+            return np.load(cache_path), True
+        except (OSError, ValueError):
+            pass  # Corrupt cache entry; recompute it
+
+    features = process_audio(file_path)
+
+    # Write to a temporary file first so a crash or a concurrent worker can't leave a partial entry
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.save(f, features)
+    os.replace(temp_path, cache_path)
+
+    return features, False
+
+def process_session(file_path, writer: ShardWriter, label, use_cache=True):
+    """
+    Featurize every window of a long recording into `writer`, a batch at a time, so memory use
+    doesn't grow with the length of the session. The features are cached in a memory-mapped file
+    that's also filled in as they're produced. Returns (number of windows, was_cached).
+    """
+    info = sf.info(file_path)
+    if info.samplerate != SAMPLE_RATE:
+        # record_negatives always records at SAMPLE_RATE, and resampling block by block isn't exact
+        print(f"Skipping session {file_path}: it's {info.samplerate} Hz, not {SAMPLE_RATE} Hz")
+        return 0, False
+    n_windows = max(0, (info.frames - WINDOW_SIZE) // SESSION_STRIDE + 1)
+
+    def add_windows(features, first):
+        for i, row in enumerate(features, first):
+            source, split = get_session_sample(file_path, i)
+            writer.add(row, label, source, split)
+
+    cache_path = get_cache_path(file_path, f"session-{SESSION_STRIDE}") if use_cache else None
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            features = np.load(cache_path, mmap_mode='r')
+            if features.shape == (n_windows, *FEATURE_SHAPE):
+                for first in range(0, n_windows, SESSION_BATCH_SIZE):
+                    add_windows(features[first:first + SESSION_BATCH_SIZE], first)
+                return n_windows, True
+        except (OSError, ValueError):
+            pass  # Corrupt cache entry; recompute it
+
+    # Written to a temporary file first so a crash or a concurrent worker can't leave a partial entry
+    temp_path = f"{cache_path}.{os.getpid()}.tmp" if cache_path is not None else None
+    cache = None
+    if temp_path is not None and n_windows:
+        cache = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float32, shape=(n_windows, *FEATURE_SHAPE))
+
+    first = 0
+    for windows in read_session(file_path):
+        features = mfcc(windows)
+        add_windows(features, first)
+        if cache is not None:
+            cache[first:first + len(features)] = features
+        first += len(features)
+
+    if cache is not None:
+        cache.flush()
+        del cache
+        os.replace(temp_path, cache_path)
+    return n_windows, False
+
+def list_dataset(folders=FOLDERS):
+    paths, labels = [], []
+    for label, subfolder in folders:
         folder_path = os.path.join(DATA_DIR, subfolder)
-        print(f"Processing folder: {folder_path}")
-        
-        for fname in os.listdir(folder_path):
+        if not os.path.isdir(folder_path):
+            print(f"Skipping missing folder: {folder_path}")
+            continue
+
+        for fname in sorted(os.listdir(folder_path)):
             if fname.endswith('.wav'):
-                path = os.path.join(folder_path, fname)
-                mfcc = process_audio(path)
-                X.append(mfcc)
-                y.append(label)
-                
-                print(f"Processed {fname}, shape: {mfcc.shape}")
-    
-    X = np.array(X)
-    y = np.array(y)
-    
-    np.savez(os.path.join(OUT_DIR, 'data.npz'), X=X, y=y)
-    print(f"Saved {len(X)} samples to {OUT_DIR}data.npz")
\ No newline at end of file
+                paths.append(os.path.join(folder_path, fname))
+                labels.append(label)
+    return paths, labels
+
+def process_dataset(workers=None, use_cache=True):
+    """
+    Featurize every file in the dataset. `workers` is the number of processes to use, defaulting to
+    the number of CPUs; use 1 to process everything in this process.
+    """
+    print("Processing dataset...")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    paths, labels = list_dataset()
+    workers = workers or os.cpu_count() or 1
+    print(f"Found {len(paths)} files, processing with {workers} worker(s)")
+
+    cached = 0
+    session_windows = 0
+
+    # Results are written to shards as they arrive, so memory use doesn't grow with the dataset size
+    with ShardWriter(DATASET_DIR, overwrite=True) as writer:
+        def collect(results):
+            nonlocal cached
+            for i, (features, was_cached) in enumerate(results):
+                writer.add(features, labels[i], paths[i])
+                cached += was_cached
+                if (i + 1) % PROGRESS_INTERVAL == 0:
+                    print(f"Processed {i + 1}/{len(paths)} files ({cached} from cache)")
+
+        if workers == 1:
+            collect(process_file(path, use_cache) for path in paths)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, min(64, len(paths) // (workers * 4)))
+                collect(executor.map(process_file, paths, [use_cache] * len(paths), chunksize=chunksize))
+
+        sessions, session_labels = list_dataset(SESSION_FOLDERS)
+        for path, label in zip(sessions, session_labels):
+            n_windows, was_cached = process_session(path, writer, label, use_cache)
+            session_windows += n_windows
+            cached += was_cached
+        if sessions:
+            print(f"Cut {len(sessions)} session(s) into {session_windows} windows")
+
+        # Silence generated with `generate_noise --shards` only exists in the dataset
+        synthetic = add_synthetic_silence(writer, workers)
+
+    print(f"Saved {len(paths) + session_windows + synthetic} samples ({cached} from cache) to {DATASET_DIR}")
@@ -7,6 +7,11 @@ import numpy as np
 
 WAKEWORD_SAVE_PATH = './data/wakeword/'
 NOT_WAKEWORD_SAVE_PATH = './data/not_wakeword/'
+NOT_WAKEWORD_SESSION_PATH = './data/not_wakeword_sessions/'
+
+# Negative recordings are cut into overlapping windows this long, this far apart
+NEGATIVE_WINDOW = 1.0  # seconds
+NEGATIVE_STRIDE = 0.5  # seconds
     
 def record():
     os.makedirs(WAKEWORD_SAVE_PATH, exist_ok=True)
@@ -30,18 +35,37 @@ def record():
         sd.wait()
         sf.write(f"{WAKEWORD_SAVE_PATH}/wake_{i + start}.wav", recording, 16000)
 
-def record_negatives():
-    os.makedirs(NOT_WAKEWORD_SAVE_PATH, exist_ok=True)
-
+def next_negative_index():
     # Find the last recording number
     existing_files = os.listdir(NOT_WAKEWORD_SAVE_PATH)
     existing_files = [f for f in existing_files if f.endswith('.wav')]
     existing_numbers = [int(f.split('_')[-1].split('.')[0]) for f in existing_files]
-    start_idx = max(existing_numbers) + 1 if existing_numbers else 0
-    print(f"Starting from recording number {start_idx}.")
+    return max(existing_numbers) + 1 if existing_numbers else 0
+
+def record_negatives(session=False):
+    """
+    Record background audio until Enter is pressed. Audio is written as it arrives, so memory use
+    doesn't grow with the length of the recording and a crash only loses the last half second.
+
+    By default, every overlapping 1s window (at a 0.5s stride) is saved as its own file in
+    NOT_WAKEWORD_SAVE_PATH. With `session`, the audio is saved as one long file in
+    NOT_WAKEWORD_SESSION_PATH instead, which process_dataset cuts into the same windows itself, so
+    the audio is only stored once.
+    """
+    window = int(NEGATIVE_WINDOW * 16000)
+    stride = int(NEGATIVE_STRIDE * 16000)
+
+    if session:
+        os.makedirs(NOT_WAKEWORD_SESSION_PATH, exist_ok=True)
+        session_path = os.path.join(NOT_WAKEWORD_SESSION_PATH, f"session_{time.strftime('%Y%m%d_%H%M%S')}.wav")
+        session_file = sf.SoundFile(session_path, 'w', samplerate=16000, channels=1, subtype='PCM_16')
+        print(f"Recording to {session_path}.")
+    else:
+        os.makedirs(NOT_WAKEWORD_SAVE_PATH, exist_ok=True)
+        start_idx = next_negative_index()
+        print(f"Starting from recording number {start_idx}.")
 
     print("Press Enter to stop recording negative samples.")
-    recording = []
 
     def input_thread():
         input()  # wait for Enter to stop recording
@@ -49,33 +73,41 @@ def record_negatives():
         stop_recording = True
 
     stop_recording = False
-    thread = threading.Thread(target=input_thread)
+    thread = threading.Thread(target=input_thread, daemon=True)
     thread.start()
 
-    with sd.InputStream(samplerate=16000, channels=1, dtype='float32') as stream:
-        while not stop_recording:
-            chunk, _ = stream.read(16000)  # 1 second chunks
-            recording.append(chunk)
+    # The most recent window of audio; only this much is ever kept in memory
+    buffer = np.zeros(window, dtype=np.float32)
+    recorded = 0
+    index = 0
 
-    audio = np.concatenate(recording).squeeze()
-    print(f"Recorded {len(audio)/16000:.2f} seconds of audio.")
+    try:
+        with sd.InputStream(samplerate=16000, channels=1, dtype='float32') as stream:
+            while not stop_recording:
+                chunk, _ = stream.read(stride)
+                chunk = chunk[:, 0]
+                recorded += len(chunk)
 
-    # Now segment it into overlapping 1s windows with 0.5s stride
-    stride = 0.5
-    window = 1.0
+                if session:
+                    session_file.write(chunk)
+                    # Keep the header up to date, so the file is valid even if we crash
+                    session_file.flush()
+                    continue
 
-    index = 0
-    start = 0
-    end = int(window * 16000)
-    
-    while end <= len(audio):
-        segment = audio[start:end]
-        sf.write(f"{NOT_WAKEWORD_SAVE_PATH}/not_wakeword_{index + start_idx}.wav", segment, 16000)
-        index += 1
-        start += int(stride * 16000)
-        end = start + int(window * 16000)
-
-    print(f"Saved {index} negative segments.")
+                buffer[:-stride] = buffer[stride:]
+                buffer[-stride:] = chunk
+                if recorded >= window:
+                    sf.write(f"{NOT_WAKEWORD_SAVE_PATH}/not_wakeword_{index + start_idx}.wav", buffer, 16000)
+                    index += 1
+    finally:
+        if session:
+            session_file.close()
+
+    print(f"Recorded {recorded/16000:.2f} seconds of audio.")
+    if session:
+        print(f"Saved the session to {session_path}; process will cut it into windows.")
+    else:
+        print(f"Saved {index} negative segments.")
     
 def get_char():
     import msvcrt
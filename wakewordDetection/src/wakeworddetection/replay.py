@@ -0,0 +1,215 @@
+import os
+import csv
+import json
+import time
+import numpy as np
+import soundfile as sf
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE
+from wakeworddetection.test import CATCH_UP, DEFAULT_THRESHOLD, MODEL_PATHS, STAGES, STAGE1_THRESHOLD, STRIDE_SIZE, CascadeDetector, Detector, WakewordListener
+from wakeworddetection.vad import EnergyGate
+
+# A detection counts as the labeled wakeword if its window ends within this long after the onset
+DETECTION_WINDOW = WINDOW_SIZE / SAMPLE_RATE + 1.0  # seconds
+
+class FakeInputStream:
+    """
+    Stands in for sounddevice.InputStream: feeds `audio` to `callback` in `blocksize` blocks, as fast
+    as possible instead of in real time. `after_block` is called after every block, which is where
+    the replay drives the inference worker synchronously.
+    """
+
+    def __init__(self, audio, callback, blocksize=STRIDE_SIZE, after_block=None):
+        self.audio = audio
+        self.callback = callback
+        self.blocksize = blocksize
+        self.after_block = after_block
+
+    def run(self):
+        for start in range(0, len(self.audio), self.blocksize):
+            block = self.audio[start:start + self.blocksize]
+            if len(block) < self.blocksize:
+                # Real streams always deliver full blocks
+                block = np.pad(block, (0, self.blocksize - len(block)))
+            self.callback(block[:, np.newaxis], self.blocksize, None, None)
+            if self.after_block:
+                self.after_block()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+def load_labels(path):
+    """
+    Load a CSV with `file` and `onset` columns, where onset is the wakeword's start in seconds, or
+    empty if the file doesn't contain the wakeword. Returns {file name: onset or None}.
+    """
+    labels = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            onset = row.get("onset", "").strip()
+            labels[os.path.basename(row["file"])] = float(onset) if onset else None
+    return labels
+
+def load_audio(path):
+    audio, sr = sf.read(path, dtype='float32', always_2d=True)
+    if sr != SAMPLE_RATE:
+        raise ValueError(f"{path} is {sr} Hz; replay files must be {SAMPLE_RATE} Hz")
+    return audio[:, 0]
+
+def summarize_timings(values):
+    if not values:
+        return None
+    values = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max())
+    }
+
+def replay(paths, detectors: list[Detector], labels=None, policy=CATCH_UP, vad=False):
+    """
+    Run the live detection path over wav files as fast as possible. Each file is replayed as its own
+    session through a WakewordListener fed by a FakeInputStream, followed by a window of silence so
+    a wakeword at the very end can still be detected. With `vad`, every session gets an EnergyGate.
+    """
+    labels = labels or {}
+    timings = {stage: [] for stage in STAGES}
+    results = {detector.name: {"detected": 0, "missed": 0, "false_detections": 0, "duplicate_detections": 0, "latencies": [],
+                               "stage1_evaluations": 0, "stage2_evaluations": 0} for detector in detectors}
+    audio_seconds = 0.0
+    wall_seconds = 0.0
+    stream_stats = {"evaluated_strides": 0, "gated_strides": 0, "dropped_strides": 0, "overruns": 0}
+
+    for path in paths:
+        onset = labels.get(os.path.basename(path))
+        audio = np.concatenate([load_audio(path), np.zeros(WINDOW_SIZE, dtype=np.float32)])
+        detections = {detector.name: [] for detector in detectors}
+
+        for detector in detectors:
+            detector.reset()
+
+        def on_detection(detector, prediction, end):
+            detections[detector.name].append(end / SAMPLE_RATE)
+
+        listener = WakewordListener(detectors, policy, clock=lambda: listener.next_end / SAMPLE_RATE,
+                                    on_detection=on_detection, record_timings=True,
+                                    gate=EnergyGate() if vad else None)
+        stream = FakeInputStream(audio, listener.audio_callback, after_block=listener.process_pending)
+
+        start_time = time.perf_counter()
+        with stream:
+            stream.run()
+        wall_seconds += time.perf_counter() - start_time
+        audio_seconds += len(audio) / SAMPLE_RATE
+
+        for stage in STAGES:
+            timings[stage].extend(listener.timings[stage])
+        for detector in detectors:
+            if isinstance(detector, CascadeDetector):
+                results[detector.name]["stage1_evaluations"] += detector.stage1_evaluations
+                results[detector.name]["stage2_evaluations"] += detector.stage2_evaluations
+        for key in stream_stats:
+            stream_stats[key] += listener.stats()[key]
+
+        for name, times in detections.items():
+            result = results[name]
+            # A window ending before the onset can't contain the wakeword
+            true_times = [t for t in times if onset is not None and onset < t <= onset + DETECTION_WINDOW]
+            result["false_detections"] += len(times) - len(true_times)
+            if onset is not None:
+                if true_times:
+                    result["detected"] += 1
+                    result["latencies"].append(true_times[0] - onset)
+                    result["duplicate_detections"] += len(true_times) - 1
+                else:
+                    result["missed"] += 1
+
+    stride_time = sum(float(np.mean(timings[stage])) for stage in STAGES if timings[stage])
+    report = {
+        "files": len(paths),
+        "vad": vad,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": wall_seconds,
+        "realtime_factor": audio_seconds / wall_seconds if wall_seconds > 0 else float('inf'),
+        "stream": stream_stats,
+        "stages": {stage: summarize_timings(timings[stage]) for stage in STAGES},
+        "detectors": {}
+    }
+    for name, result in results.items():
+        latencies = np.array(result["latencies"])
+        positives = result["detected"] + result["missed"]
+        report["detectors"][name] = {
+            "detected": result["detected"],
+            "missed": result["missed"],
+            "recall": result["detected"] / positives if positives else None,
+            "false_detections": result["false_detections"],
+            "duplicate_detections": result["duplicate_detections"],
+            # Audio latency from the onset to the end of the first detecting window, plus the time
+            # it takes to evaluate a stride
+            "mean_latency_s": float(latencies.mean()) + stride_time if len(latencies) else None,
+            "max_latency_s": float(latencies.max()) + stride_time if len(latencies) else None
+        }
+        if result["stage1_evaluations"]:
+            # The fraction of evaluated strides the cascade's first stage passed on to the full model
+            report["detectors"][name]["stage2_fraction"] = result["stage2_evaluations"] / result["stage1_evaluations"]
+    return report
+
+def print_report(report):
+    print(f"Replayed {report['files']} files, {report['audio_seconds']:.1f}s of audio in {report['wall_seconds']:.2f}s "
+          f"({report['realtime_factor']:.1f}x realtime)")
+    print(f"Strides: {report['stream']}")
+    for stage, summary in report["stages"].items():
+        if summary:
+            print(f"  {stage}: mean {summary['mean_ms']:.3f} ms, p50 {summary['p50_ms']:.3f} ms, "
+                  f"p95 {summary['p95_ms']:.3f} ms, max {summary['max_ms']:.3f} ms")
+    for name, result in report["detectors"].items():
+        print(f"{name}: {result}")
+
+def print_vad_comparison(without_vad, with_vad):
+    strides = with_vad["stream"]["evaluated_strides"] + with_vad["stream"]["gated_strides"]
+    gated = with_vad["stream"]["gated_strides"] / strides if strides else 0.0
+    print(f"VAD gated {gated:.1%} of strides, realtime factor {without_vad['realtime_factor']:.1f}x -> {with_vad['realtime_factor']:.1f}x")
+    for name, result in with_vad["detectors"].items():
+        before = without_vad["detectors"][name]
+        print(f"{name}: recall {before['recall']} -> {result['recall']}, "
+              f"false detections {before['false_detections']} -> {result['false_detections']}")
+
+def replay_directory(directory, labels_path=None, model_path=None, threshold=DEFAULT_THRESHOLD, policy=CATCH_UP, output_path=None, vad=False,
+                     stage1_path=None, stage1_threshold=STAGE1_THRESHOLD):
+    """
+    Replay every wav in `directory`. Labels default to `labels.csv` in the directory, if it exists.
+    With `vad`, the files are replayed both without and with the voice activity gate, so its effect
+    on recall and on the number of evaluated strides can be compared. With `stage1_path`, the
+    models run as cascades behind that first-stage model.
+    """
+    paths = sorted(os.path.join(directory, fname) for fname in os.listdir(directory) if fname.endswith('.wav'))
+
+    if labels_path is None and os.path.exists(os.path.join(directory, 'labels.csv')):
+        labels_path = os.path.join(directory, 'labels.csv')
+    labels = load_labels(labels_path) if labels_path else {}
+
+    models = [(os.path.basename(model_path), model_path, threshold)] if model_path else MODEL_PATHS
+    if stage1_path:
+        detectors = [CascadeDetector(name, path, stage1_path, model_threshold, stage1_threshold) for name, path, model_threshold in models]
+    else:
+        detectors = [Detector(name, path, model_threshold) for name, path, model_threshold in models]
+
+    report = replay(paths, detectors, labels, policy)
+    print_report(report)
+
+    if vad:
+        print("Replaying with the voice activity gate...")
+        vad_report = replay(paths, detectors, labels, policy, vad=True)
+        print_report(vad_report)
+        print_vad_comparison(report, vad_report)
+        report = {"without_vad": report, "with_vad": vad_report}
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report to {output_path}")
+    return report
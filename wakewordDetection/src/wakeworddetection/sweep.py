@@ -0,0 +1,139 @@
+import os
+import csv
+import json
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from wakeworddetection.dataset import DATASET_DIR, ShardedDataset
+
+SWEEP_DIR = './processed/sweep/'
+LEADERBOARD_PATH = os.path.join(SWEEP_DIR, 'leaderboard.json')
+LEADERBOARD_CSV_PATH = os.path.join(SWEEP_DIR, 'leaderboard.csv')
+
+# Every combination of these is trained
+SWEEP_GRID = {
+    "architecture": ("conv", "separable", "dense"),
+    "learning_rate": (0.001, 0.003),
+    "batch_size": (32, 128)
+}
+
+# Threshold used for the validation metrics; the same as the live detector's default
+SWEEP_THRESHOLD = 0.7
+
+def get_candidates(grid=SWEEP_GRID):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+def get_candidate_name(candidate):
+    return f"{candidate['architecture']}_lr{candidate['learning_rate']:g}_bs{candidate['batch_size']}"
+
+def train_candidate(candidate, epochs, mode, threads):
+    """
+    Train, convert and score one candidate. Runs in its own process, so TensorFlow state isn't
+    shared between candidates.
+    """
+    import tensorflow as tf
+    from wakeworddetection.train import MODEL_BUILDERS, fit
+    from wakeworddetection.convert_to_tflite import convert
+    from wakeworddetection.evaluate import predict_batched
+
+    # Split the CPUs between the workers instead of letting each one try to use all of them
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    name = get_candidate_name(candidate)
+    dataset = ShardedDataset(DATASET_DIR)
+    train_data = dataset.as_tf_dataset('train', batch_size=candidate["batch_size"], shuffle=True)
+    val_data = dataset.as_tf_dataset('val', batch_size=256)
+
+    model = MODEL_BUILDERS[candidate["architecture"]]()
+    fit(model, train_data, val_data, epochs=epochs, learning_rate=candidate["learning_rate"], verbose=0)
+    model.save(os.path.join(SWEEP_DIR, f"{name}.keras"))
+
+    tflite_path = os.path.join(SWEEP_DIR, f"{name}.tflite")
+    with open(tflite_path, 'wb') as f:
+        f.write(convert(model, mode))
+
+    # Score the converted model, since that's what will actually run
+    X_val, Y_val = dataset.load('val')
+    predictions, _ = predict_batched(tflite_path, X_val, threads=1)
+    detected = predictions > SWEEP_THRESHOLD
+    positives = Y_val == 1
+
+    return {
+        "name": name,
+        **candidate,
+        "path": tflite_path,
+        "parameters": int(model.count_params()),
+        "size_kb": os.path.getsize(tflite_path) / 1024,
+        "accuracy": float(np.mean(detected == positives)),
+        "recall": float(np.mean(detected[positives])) if positives.any() else None,
+        "false_accept_rate": float(np.mean(detected[~positives])) if (~positives).any() else None
+    }
+
+def mark_pareto_front(results):
+    """
+    A candidate is on the Pareto front if no other one is at least as accurate and as fast, and
+    strictly better at one of them.
+    """
+    for result in results:
+        result["pareto"] = not any(
+            other["accuracy"] >= result["accuracy"] and other["latency_ms"] <= result["latency_ms"]
+            and (other["accuracy"] > result["accuracy"] or other["latency_ms"] < result["latency_ms"])
+            for other in results
+        )
+
+def print_leaderboard(results):
+    print(f"{'':2}{'Candidate':<28}{'Params':>8}{'Size (KB)':>11}{'Latency (ms)':>14}{'Accuracy':>10}{'Recall':>8}{'FAR':>8}")
+    for result in results:
+        recall = f"{result['recall']:.3f}" if result['recall'] is not None else "-"
+        far = f"{result['false_accept_rate']:.3f}" if result['false_accept_rate'] is not None else "-"
+        marker = "* " if result["pareto"] else "  "
+        print(f"{marker}{result['name']:<28}{result['parameters']:>8}{result['size_kb']:>11.1f}"
+              f"{result['latency_ms']:>14.3f}{result['accuracy']:>10.4f}{recall:>8}{far:>8}")
+    print("* = on the accuracy/latency Pareto front")
+
+def sweep(architectures=None, epochs=50, mode="dynamic", workers=None):
+    """
+    Train every combination in SWEEP_GRID (optionally only some architectures) across a process
+    pool, convert each one to TFLite, benchmark its invoke latency on this CPU, and rank them.
+    """
+    grid = dict(SWEEP_GRID)
+    if architectures:
+        grid["architecture"] = tuple(architectures)
+    candidates = get_candidates(grid)
+
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, len(candidates))
+    threads = max(1, cpus // workers)
+    print(f"Training {len(candidates)} candidates with {workers} worker(s), {threads} thread(s) each")
+
+    results = []
+    # TensorFlow isn't fork-safe, so every worker starts from a fresh interpreter
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        n = len(candidates)
+        for i, result in enumerate(executor.map(train_candidate, candidates, [epochs] * n, [mode] * n, [threads] * n)):
+            print(f"Trained {result['name']} ({i + 1}/{n}): accuracy {result['accuracy']:.4f}")
+            results.append(result)
+
+    # Benchmark after training is done, one model at a time, so the timings aren't skewed by
+    # other workers competing for the CPU
+    from wakeworddetection.tflite_model import TFLiteModel, measure_latency
+    for result in results:
+        result["latency_ms"] = measure_latency(TFLiteModel(result["path"])) * 1000
+
+    mark_pareto_front(results)
+    results.sort(key=lambda result: (-result["accuracy"], result["latency_ms"]))
+    print_leaderboard(results)
+
+    with open(LEADERBOARD_PATH, 'w') as f:
+        json.dump({"threshold": SWEEP_THRESHOLD, "mode": mode, "candidates": results}, f, indent=2)
+    with open(LEADERBOARD_CSV_PATH, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Wrote leaderboard to {LEADERBOARD_PATH} and {LEADERBOARD_CSV_PATH}")
+    return results
@@ -1,85 +1,397 @@
-import sounddevice as sd
 import numpy as np
-import tensorflow as tf
-import librosa
-from collections import deque
 import time
 import threading
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE, HOP_LENGTH, StreamingMFCC
+from wakeworddetection.tflite_model import TFLiteModel
+from wakeworddetection.vad import EnergyGate
+from wakeworddetection.metrics import ListenerMetrics, MetricsExporter, METRICS_INTERVAL
 
-SAMPLE_RATE = 16000
-WINDOW_DURATION = 1.0  # seconds
-STRIDE_DURATION = 0.25  # seconds
+# The stride has to be a whole number of hops so StreamingMFCC can reuse frames between windows.
+# 8 hops is 0.256 seconds, which is close enough to the 0.25 seconds we used before.
+STRIDE_SIZE = 8 * HOP_LENGTH
+STRIDE_DURATION = STRIDE_SIZE / SAMPLE_RATE  # seconds
 
-WINDOW_SIZE = int(SAMPLE_RATE * WINDOW_DURATION)
-STRIDE_SIZE = int(SAMPLE_RATE * STRIDE_DURATION)
+# How much audio the inference worker can fall behind by before samples are overwritten
+RING_BUFFER_SIZE = 4 * WINDOW_SIZE
 
+# What the inference worker does when it falls behind:
+# - SKIP jumps straight to the newest stride, dropping the ones in between
+# - CATCH_UP evaluates every stride in order, only dropping strides that were overwritten
+SKIP = "skip"
+CATCH_UP = "catch_up"
+
+DEFAULT_THRESHOLD = 0.7
+
+# (name, path, threshold). All models share one audio stream and one feature computation per stride.
 MODEL_PATHS = [
-    ("Normal", './processed/wakeword_model.tflite'),
-    # ("Optimized", './processed/wakeword_model_v2_optimized.tflite')
+    ("Normal", './processed/wakeword_model.tflite', DEFAULT_THRESHOLD),
+    # ("Optimized", './processed/wakeword_model_v2_optimized.tflite', DEFAULT_THRESHOLD)
 ]
 
+# The cascade's tiny first-stage model. Its threshold is low, since all it has to do is avoid
+# running the full model on strides that obviously aren't the wakeword.
+STAGE1_PATH = './processed/wakeword_stage1.tflite'
+STAGE1_THRESHOLD = 0.1
+
 DEBOUNCE_TIME = 0.5  # seconds
+STATS_INTERVAL = 5.0  # seconds
+
+# Stages of evaluating a stride, which can be timed with `record_timings`
+STAGES = ("buffer_copy", "vad", "mfcc", "invoke", "decision")
+
+class RingBuffer:
+    """
+    Preallocated ring buffer of mono audio. It's written by the audio callback and read by the
+    inference worker; the callback never blocks on the reader.
+
+    Like a seqlock, the writer publishes how far it's about to write (`writing`) before copying
+    and how far it has written (`written`) after, so a reader can tell if samples it copied were
+    being overwritten at the time.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        # Total number of samples ever written, and the total once the write in progress is done
+        self.written = 0
+        self.writing = 0
+        self.condition = threading.Condition()
+
+    def write(self, samples: np.ndarray):
+        total = len(samples)
+        # Only the newest `capacity` samples fit, but they're all counted
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        # Published before copying, so readers treat the samples about to be overwritten as gone
+        self.writing = self.written + total
+        start = (self.written + total - n) % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:n - first] = samples[first:]
+
+        with self.condition:
+            self.written += total
+            self.condition.notify()
+
+    def wait_for(self, end: int, timeout: float | None = None) -> bool:
+        """
+        Wait until at least `end` samples have been written.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.written >= end, timeout)
+
+    def oldest_available(self) -> int:
+        """
+        The oldest sample that isn't overwritten, or being overwritten.
+        """
+        return max(0, self.writing - self.capacity)
+
+    def read(self, end: int, out: np.ndarray) -> bool:
+        """
+        Copy the len(out) samples ending at absolute position `end` into `out`. Returns False if
+        some of them were overwritten, either before or while copying.
+        """
+        size = len(out)
+        if end - size < self.oldest_available():
+            return False
+
+        start = (end - size) % self.capacity
+        first = min(size, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:] = self.buffer[:size - first]
+
+        # A write may have started during the copy; `writing` covers it even if it hasn't finished
+        return end - size >= self.oldest_available()
+
+class Detector:
+    """
+    A single wakeword model with its own threshold and debounce state.
+    """
+
+    def __init__(self, name, path, threshold=DEFAULT_THRESHOLD, debounce_time=DEBOUNCE_TIME):
+        self.name = name
+        self.threshold = threshold
+        self.debounce_time = debounce_time
+
+        # Handles quantized models, so int8 exports can be used directly
+        self.model = TFLiteModel(path)
+
+        self.reset()
+
+    def reset(self):
+        self.last_detection_time = float('-inf')
+        # Strides above the threshold, and detections that survived debouncing
+        self.detections = 0
+        self.debounced_detections = 0
+
+    def predict(self, input_tensor) -> float:
+        return self.model.predict(input_tensor)[0]
+
+    def update(self, prediction, current_time) -> bool:
+        """
+        Returns whether `prediction` counts as a new detection.
+        """
+        if prediction <= self.threshold:
+            return False
+
+        self.detections += 1
+        if current_time - self.last_detection_time <= self.debounce_time:
+            return False
+
+        self.last_detection_time = current_time
+        self.debounced_detections += 1
+        return True
+
+class CascadeDetector(Detector):
+    """
+    A Detector that only runs its full model when a small first-stage model scores above
+    `stage1_threshold`. Strides rejected by the first stage get the first stage's score, which is
+    below the detection threshold as long as `stage1_threshold` is.
+    """
+
+    def __init__(self, name, path, stage1_path=STAGE1_PATH, threshold=DEFAULT_THRESHOLD,
+                 stage1_threshold=STAGE1_THRESHOLD, debounce_time=DEBOUNCE_TIME):
+        if stage1_threshold > threshold:
+            raise ValueError("The first-stage threshold can't be above the detection threshold")
+
+        self.stage1_model = TFLiteModel(stage1_path)
+        self.stage1_threshold = stage1_threshold
+        super().__init__(name, path, threshold, debounce_time)
 
-def extract_features(audio):
-    mfcc = librosa.feature.mfcc(y=audio, sr=SAMPLE_RATE, n_mfcc=13, n_fft=512, hop_length=256)
-    mfcc = mfcc.T  # (frames, 13)
-    if mfcc.shape[0] < 32:
-        mfcc = np.pad(mfcc, ((0, 32 - mfcc.shape[0]), (0, 0)))
-    return mfcc[:32, :]  # (32, 13)
+    def reset(self):
+        super().reset()
+        self.stage1_evaluations = 0
+        self.stage2_evaluations = 0
 
+    def predict(self, input_tensor) -> float:
+        self.stage1_evaluations += 1
+        prediction = self.stage1_model.predict(input_tensor)[0]
+        if prediction <= self.stage1_threshold:
+            return prediction
 
-def test_model_with_path(path, name):
-    interpreter = tf.lite.Interpreter(path)
-    interpreter.allocate_tensors()
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
+        self.stage2_evaluations += 1
+        return self.model.predict(input_tensor)[0]
 
-    # Audio buffer
-    buffer = deque(maxlen=WINDOW_SIZE)
-    
-    last_detection_time = 0
+    def stage2_fraction(self):
+        return self.stage2_evaluations / self.stage1_evaluations if self.stage1_evaluations else 0.0
 
-    def audio_callback(indata, frames, time_info, status):
+def print_detection(detector, prediction, end):
+    print(f"Wakeword detected by {detector.name}! Confidence: {prediction:.3f}")
+
+class WakewordListener:
+    """
+    Runs wakeword models over a live audio stream. The audio callback only writes into a ring
+    buffer; a separate inference worker thread consumes it one stride at a time, computes the
+    features once and runs every detector on them.
+
+    `clock` returns the current time used for debouncing, and `on_detection(detector, prediction, end)`
+    is called for each debounced detection, where `end` is the absolute end of the window. With
+    `record_timings`, the duration of each of STAGES is recorded in `timings`. With a `gate` (e.g.
+    an EnergyGate), windows it rejects are counted in `gated_strides` and skip the models entirely.
+    With `metrics`, the callback duration, queue lag and stage durations go into its histograms.
+    """
+
+    def __init__(self, detectors: list[Detector], policy=CATCH_UP, ring_buffer_size=RING_BUFFER_SIZE,
+                 clock=time.time, on_detection=None, record_timings=False, gate: EnergyGate | None = None,
+                 metrics: ListenerMetrics | None = None):
+        if policy not in (SKIP, CATCH_UP):
+            raise ValueError(f"Unknown policy: {policy}")
+
+        self.detectors = detectors
+        self.policy = policy
+        self.clock = clock
+        self.on_detection = on_detection or print_detection
+        self.gate = gate
+        self.metrics = metrics
+        self.timings: dict[str, list[float]] | None = {stage: [] for stage in STAGES} if record_timings else None
+
+        self.ring = RingBuffer(ring_buffer_size)
+        self.window = np.zeros(WINDOW_SIZE, dtype=np.float32)
+        self.streaming_mfcc = StreamingMFCC()
+        # Absolute end position of the next window to evaluate
+        self.next_end = WINDOW_SIZE
+
+        self.status_errors = 0
+        self.overruns = 0
+        self.dropped_strides = 0
+        self.evaluated_strides = 0
+        self.gated_strides = 0
+
+        self.stop_event = threading.Event()
+        self.worker = threading.Thread(target=self.run_worker, daemon=True)
+
+    def audio_callback(self, indata, frames, time_info, status):
+        # This runs on PortAudio's thread, so it must not do anything slow
+        start_time = time.perf_counter()
         if status:
-            print("Audio error:", status)
+            self.status_errors += 1
+        self.ring.write(indata[:, 0])  # mono
+        if self.metrics is not None:
+            self.metrics.observe("callback", time.perf_counter() - start_time)
+
+    def process_pending(self) -> int:
+        """
+        Evaluate the strides that are available according to the policy. Returns how many were evaluated.
+        """
+        evaluated = 0
+        while self.ring.written >= self.next_end:
+            if self.policy == SKIP:
+                behind = (self.ring.written - self.next_end) // STRIDE_SIZE
+                if behind > 0:
+                    self.dropped_strides += behind
+                    self.next_end += behind * STRIDE_SIZE
+            else:
+                oldest_end = self.ring.oldest_available() + WINDOW_SIZE
+                if self.next_end < oldest_end:
+                    lost = -(-(oldest_end - self.next_end) // STRIDE_SIZE)
+                    self.overruns += 1
+                    self.dropped_strides += lost
+                    self.next_end += lost * STRIDE_SIZE
+                    continue
+
+            if self.metrics is not None:
+                # How much audio arrived after the end of this window and is still waiting
+                self.metrics.observe("queue_lag", (self.ring.written - self.next_end) / SAMPLE_RATE)
+
+            start_time = time.perf_counter()
+            read = self.ring.read(self.next_end, self.window)
+            self.record_timing("buffer_copy", start_time)
+
+            if not read:
+                self.overruns += 1
+                self.dropped_strides += 1
+            elif not self.is_active(self.window, self.next_end - WINDOW_SIZE):
+                self.gated_strides += 1
+            else:
+                self.detect_wakeword(self.window, self.next_end - WINDOW_SIZE)
+                self.evaluated_strides += 1
+                evaluated += 1
+            self.next_end += STRIDE_SIZE
+        return evaluated
+
+    def run_worker(self):
+        while not self.stop_event.is_set():
+            if self.ring.wait_for(self.next_end, timeout=0.5):
+                self.process_pending()
 
-        buffer.extend(indata[:, 0])  # mono
+    def record_timing(self, stage, start_time):
+        if self.timings is None and self.metrics is None:
+            return
+        elapsed = time.perf_counter() - start_time
+        if self.timings is not None:
+            self.timings[stage].append(elapsed)
+        if self.metrics is not None:
+            self.metrics.observe(stage, elapsed)
 
-        if len(buffer) == WINDOW_SIZE:
-            detect_wakeword()
-    
-    def detect_wakeword():
-        audio_np = np.array(buffer, dtype=np.float32)
-        features = extract_features(audio_np)
+    def is_active(self, window, start) -> bool:
+        if self.gate is None:
+            return True
+        start_time = time.perf_counter()
+        active = self.gate.update(window, start)
+        self.record_timing("vad", start_time)
+        return active
+
+    def detect_wakeword(self, window, start):
+        start_time = time.perf_counter()
+        features = self.streaming_mfcc.update(window, start)
         input_tensor = features[np.newaxis, ..., np.newaxis].astype(np.float32)
+        self.record_timing("mfcc", start_time)
+
+        current_time = self.clock()
+        for detector in self.detectors:
+            start_time = time.perf_counter()
+            prediction = detector.predict(input_tensor)
+            self.record_timing("invoke", start_time)
+
+            start_time = time.perf_counter()
+            if detector.update(prediction, current_time):
+                self.on_detection(detector, prediction, start + WINDOW_SIZE)
+            self.record_timing("decision", start_time)
+
+    def stats(self):
+        return {
+            "evaluated_strides": self.evaluated_strides,
+            "gated_strides": self.gated_strides,
+            "dropped_strides": self.dropped_strides,
+            "overruns": self.overruns,
+            "status_errors": self.status_errors,
+            "detections": {detector.name: detector.debounced_detections for detector in self.detectors},
+            "stage2_fraction": {detector.name: detector.stage2_fraction() for detector in self.detectors if isinstance(detector, CascadeDetector)}
+        }
+
+    def metric_counters(self):
+        """
+        The listener's and detectors' counters as (name, labels, value), for a MetricsExporter.
+        """
+        counters = [
+            ("strides", {"result": "evaluated"}, self.evaluated_strides),
+            ("strides", {"result": "gated"}, self.gated_strides),
+            ("strides", {"result": "dropped"}, self.dropped_strides),
+            ("overruns", {}, self.overruns),
+            ("audio_status_errors", {}, self.status_errors)
+        ]
+        for detector in self.detectors:
+            labels = {"detector": detector.name}
+            counters.append(("detections", labels, detector.detections))
+            counters.append(("debounced_detections", labels, detector.debounced_detections))
+            if isinstance(detector, CascadeDetector):
+                counters.append(("stage2_evaluations", labels, detector.stage2_evaluations))
+        return counters
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.worker.join()
+
+def listen(detectors: list[Detector], policy=CATCH_UP, vad=False, metrics_path=None, metrics_interval=METRICS_INTERVAL):
+    """
+    With `metrics_path`, latency histograms and counters are written there every `metrics_interval`
+    seconds: as JSON if it ends in .json, otherwise in the Prometheus text format.
+    """
+    # Imported here so the listener can be used without an audio device, e.g. by the replay harness
+    import sounddevice as sd
+
+    metrics = ListenerMetrics() if metrics_path else None
+    listener = WakewordListener(detectors, policy, gate=EnergyGate() if vad else None, metrics=metrics)
+    listener.start()
+
+    exporter = None
+    if metrics_path:
+        exporter = MetricsExporter(metrics, listener.metric_counters, metrics_path, metrics_interval)
+        exporter.start()
+        print(f"Writing metrics to {metrics_path} every {metrics_interval:g} seconds")
 
-        interpreter.set_tensor(input_details[0]['index'], input_tensor)
-        interpreter.invoke()
-        prediction = interpreter.get_tensor(output_details[0]['index'])[0][0]
-
-        if prediction > 0.7:
-            nonlocal last_detection_time
-            current_time = time.time()
-            if current_time - last_detection_time > DEBOUNCE_TIME:
-                last_detection_time = current_time
-                print(f"Wakeword detected by {name}! Confidence: {prediction:.3f}")
-    
     print("Listening for wakeword...")
-    with sd.InputStream(channels=1, samplerate=SAMPLE_RATE, blocksize=STRIDE_SIZE, callback=audio_callback):
-        while True:
-            time.sleep(0.1)
-
-def test_model():
-    threads: list[threading.Thread] = []
-        
-    for name, path in MODEL_PATHS:
-        print(f"Testing model: {name}")
-        # Spawn a thread so we can run multiple models at once
-        thread = threading.Thread(target=test_model_with_path, args=(path, name))
-        thread.daemon = True
-        
-        thread.start()
-        threads.append(thread)
-        
-    while True:
-        time.sleep(1)
\ No newline at end of file
+    try:
+        with sd.InputStream(channels=1, samplerate=SAMPLE_RATE, blocksize=STRIDE_SIZE, callback=listener.audio_callback):
+            last_stats = listener.stats()
+            while True:
+                time.sleep(STATS_INTERVAL)
+                stats = listener.stats()
+                if any(stats[key] != last_stats[key] for key in ("dropped_strides", "overruns", "status_errors")):
+                    print(f"Listener stats: {stats}")
+                last_stats = stats
+    finally:
+        # Write the final numbers, e.g. after a Ctrl+C
+        if exporter is not None:
+            exporter.stop()
+
+def test_model_with_path(path, name, policy=CATCH_UP, threshold=DEFAULT_THRESHOLD, vad=False,
+                         metrics_path=None, metrics_interval=METRICS_INTERVAL):
+    listen([Detector(name, path, threshold)], policy, vad, metrics_path, metrics_interval)
+
+def test_model(policy=CATCH_UP, vad=False, cascade=False, stage1_threshold=STAGE1_THRESHOLD,
+               metrics_path=None, metrics_interval=METRICS_INTERVAL):
+    # One capture stream and one feature computation per stride, fanned out to every model
+    detectors = []
+    for name, path, threshold in MODEL_PATHS:
+        if cascade:
+            print(f"Testing model: {name} (threshold {threshold}, first stage {stage1_threshold})")
+            detectors.append(CascadeDetector(name, path, STAGE1_PATH, threshold, stage1_threshold))
+        else:
+            print(f"Testing model: {name} (threshold {threshold})")
+            detectors.append(Detector(name, path, threshold))
+
+    listen(detectors, policy, vad, metrics_path, metrics_interval)
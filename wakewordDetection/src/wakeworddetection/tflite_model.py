@@ -0,0 +1,119 @@
+import time
+import numpy as np
+
+# (runtime name, Interpreter class), set by get_interpreter
+_interpreter = None
+
+# Invokes timed by measure_latency, after a few to warm up
+LATENCY_RUNS = 200
+
+def get_interpreter():
+    """
+    The lightest TFLite interpreter that's installed, as (runtime name, Interpreter class): LiteRT
+    (ai_edge_litert), then the older tflite_runtime, and only then full TensorFlow, which takes
+    seconds and hundreds of MB to import.
+    """
+    global _interpreter
+    if _interpreter is not None:
+        return _interpreter
+
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        _interpreter = ("ai_edge_litert", Interpreter)
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+            _interpreter = ("tflite_runtime", Interpreter)
+        except ImportError:
+            import tensorflow as tf
+            _interpreter = ("tensorflow", tf.lite.Interpreter)
+    return _interpreter
+
+class TFLiteModel:
+    """
+    A TFLite wakeword model that takes float features and returns float probabilities, whether the
+    model itself has float or quantized (int8/uint8) inputs and outputs.
+    """
+
+    def __init__(self, path, num_threads=None, batch_size=None):
+        self.path = path
+        self.num_threads = num_threads
+        self.load(batch_size)
+
+    def load(self, batch_size=None):
+        _, Interpreter = get_interpreter()
+        self.interpreter = Interpreter(model_path=self.path, num_threads=self.num_threads)
+        self.input_details = self.interpreter.get_input_details()[0]
+        # Resizing has to happen before the first allocate_tensors: with the XNNPACK delegate,
+        # an interpreter resized after allocating crashes when it's deleted
+        if batch_size is not None and batch_size != self.input_details['shape'][0]:
+            self.interpreter.resize_tensor_input(self.input_details['index'], [batch_size, *self.input_details['shape'][1:]])
+        self.interpreter.allocate_tensors()
+
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = self.input_details['shape'][0]
+
+    @property
+    def input_shape(self):
+        return tuple(self.input_details['shape'][1:])
+
+    def resize(self, batch_size):
+        """
+        Make the model take `batch_size` samples per invoke. This reloads the interpreter, so it's
+        best to pick a batch size once.
+        """
+        if batch_size != self.batch_size:
+            self.load(batch_size)
+
+    def quantize_input(self, features):
+        dtype = self.input_details['dtype']
+        if dtype == np.float32:
+            return features.astype(np.float32)
+        scale, zero_point = self.input_details['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(features / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def dequantize_output(self, output):
+        if self.output_details['dtype'] == np.float32:
+            return output
+        scale, zero_point = self.output_details['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def invoke(self, input_tensor):
+        """
+        Run the model on an already quantized input tensor of the current batch size.
+        """
+        self.interpreter.set_tensor(self.input_details['index'], input_tensor)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_details['index'])
+
+    def predict(self, features) -> np.ndarray:
+        """
+        Predict wakeword probabilities for features of shape (N, 32, 13) or (N, 32, 13, 1).
+        """
+        features = np.reshape(features, (-1, *self.input_shape))
+        n = len(features)
+        if n > self.batch_size:
+            self.resize(n)
+        elif n < self.batch_size:
+            # Pad a partial batch rather than reloading the interpreter for it
+            features = np.concatenate([features, np.zeros((self.batch_size - n, *self.input_shape), dtype=features.dtype)])
+        output = self.invoke(self.quantize_input(features))
+        return self.dequantize_output(output).reshape(self.batch_size, -1)[:n, 0]
+
+def measure_latency(model: TFLiteModel, runs=LATENCY_RUNS):
+    """
+    Median time of a single-sample invoke, in seconds.
+    """
+    model.resize(1)
+    input_tensor = model.quantize_input(np.zeros((1, *model.input_shape), dtype=np.float32))
+    for _ in range(10):
+        model.invoke(input_tensor)
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.invoke(input_tensor)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
@@ -1,49 +1,22 @@
-DATA_FILE = './processed/data.npz'
+import numpy as np
+from wakeworddetection.dataset import DATASET_DIR, FEATURE_SHAPE, ShardedDataset
 
-def train_model():
-    import numpy as np
-    from sklearn.model_selection import train_test_split
+# Folders written by `augment`, which are replaced by online augmentation
+AUGMENTED_FOLDERS = ('augmented_wakeword', 'augmented_not_wakeword')
 
-    data = np.load(DATA_FILE)
-    X = data['X']
-    Y = data['y']
+MODEL_PATH = './processed/wakeword_model.keras'
+STAGE1_MODEL_PATH = './processed/wakeword_stage1.keras'
 
-    # Maybe we should be normalizing? I'm not sure.
-    # X = X.astype('float32') / np.max(np.abs(X))
-
-    # Train/val split
-    X_train, X_val, Y_train, Y_val = train_test_split(X, Y, test_size=0.2, random_state=42, stratify=Y)
-    
-    # Add channel dim, e.g. (32, 13) to (32, 13, 1)
-    X_train = X_train[..., np.newaxis]
-    X_val = X_val[..., np.newaxis]
-    
-    import tensorflow as tf
+def build_model():
     # It's an IDE issue if keras isn't found; don't worry about it
-    from tensorflow.keras import layers, models, callbacks
+    from tensorflow.keras import layers, models
 
-    input_shape = X_train.shape[1:]  # e.g., (32, 32, 1) if MFCC or spectrogram
+    input_shape = (*FEATURE_SHAPE, 1)  # Add channel dim, e.g. (32, 13) to (32, 13, 1)
 
-    model = models.Sequential([
+    return models.Sequential([
         # I pulled this out of nowhere, it's probably not the best layer configuration
         layers.InputLayer(input_shape),
         
-        # layers.SeparableConv2D(16, (3, 3), activation='relu', padding='same'),
-        # layers.BatchNormalization(),
-        # layers.MaxPooling2D((2, 2)),
-        # layers.Dropout(0.2),
-        # layers.SeparableConv2D(32, (3, 3), activation='relu', padding='same'),
-        # layers.BatchNormalization(),
-        # layers.MaxPooling2D((2, 2)),
-        # layers.Dropout(0.2),
-        # layers.SeparableConv2D(64, (3, 3), activation='relu', padding='same'),
-        # layers.BatchNormalization(),
-        # layers.GlobalAveragePooling2D(),
-
-        # layers.Dense(32, activation='relu'),
-        # layers.Dropout(0.2),
-        # layers.Dense(1, activation='sigmoid')
-        
         layers.Conv2D(8, (3, 3), activation='relu'),
         layers.MaxPooling2D((2, 2)),
         layers.Conv2D(16, (3, 3), activation='relu'),
@@ -52,20 +25,127 @@ def train_model():
         layers.Dense(16, activation='relu'),
         layers.Dense(1, activation='sigmoid')  # Binary classification
     ])
-    
+
+def build_separable_model():
+    """
+    The alternative we've been meaning to compare against; `sweep` does that.
+    """
+    from tensorflow.keras import layers, models
+
+    return models.Sequential([
+        layers.InputLayer((*FEATURE_SHAPE, 1)),
+
+        layers.SeparableConv2D(16, (3, 3), activation='relu', padding='same'),
+        layers.BatchNormalization(),
+        layers.MaxPooling2D((2, 2)),
+        layers.Dropout(0.2),
+        layers.SeparableConv2D(32, (3, 3), activation='relu', padding='same'),
+        layers.BatchNormalization(),
+        layers.MaxPooling2D((2, 2)),
+        layers.Dropout(0.2),
+        layers.SeparableConv2D(64, (3, 3), activation='relu', padding='same'),
+        layers.BatchNormalization(),
+        layers.GlobalAveragePooling2D(),
+
+        layers.Dense(32, activation='relu'),
+        layers.Dropout(0.2),
+        layers.Dense(1, activation='sigmoid')
+    ])
+
+def build_stage1_model():
+    """
+    The first stage of the cascade: a tiny model that only has to reject the obvious non-wakewords
+    cheaply, at a low threshold. It's roughly 2k multiply-adds, against roughly 70k for the full model.
+    """
+    from tensorflow.keras import layers, models
+
+    return models.Sequential([
+        layers.InputLayer((*FEATURE_SHAPE, 1)),
+        # Halve the time resolution; the first stage doesn't need much detail
+        layers.AveragePooling2D((2, 1)),
+        layers.Flatten(),
+        layers.Dense(8, activation='relu'),
+        layers.Dense(1, activation='sigmoid')
+    ])
+
+# Architectures by name, for `sweep`
+MODEL_BUILDERS = {
+    "conv": build_model,
+    "separable": build_separable_model,
+    "dense": build_stage1_model
+}
+
+def fit(model, train_data, val_data, epochs=50, learning_rate=None, verbose='auto'):
+    import tensorflow as tf
+    from tensorflow.keras import callbacks
+
     model.compile(
-        optimizer='adam',
+        optimizer=tf.keras.optimizers.Adam(learning_rate) if learning_rate else 'adam',
         loss='binary_crossentropy',
         metrics=['accuracy']
     )
 
-    model.fit(X_train, Y_train,
-        validation_data=(X_val, Y_val),
-        epochs=50,
-        batch_size=32,
+    model.fit(train_data,
+        validation_data=val_data,
+        epochs=epochs,
+        verbose=verbose,
         callbacks=[
             callbacks.EarlyStopping(patience=5, restore_best_weights=True) # Stop training if no improvement
         ]
     )
-    
-    model.save('./processed/wakeword_model.keras')
\ No newline at end of file
+    return model
+
+def train_model(online_augment=False, n_augment=10, seed=0, workers=None, stage1=True):
+    """
+    Train the model on the processed dataset. With `online_augment`, the recordings are augmented
+    freshly every epoch by a background worker pool instead of using the augmented folders. With
+    `stage1`, the cascade's tiny first-stage model is trained on the same data afterwards.
+    """
+    import tensorflow as tf
+
+    # Maybe we should be normalizing? I'm not sure.
+
+    # The train/val split is assigned when the dataset is processed. Batches are streamed from
+    # memory-mapped shards, so the dataset doesn't have to fit in memory.
+    dataset = ShardedDataset(DATASET_DIR)
+    stream = None
+
+    # Everything after the stream is created is in here, so its worker pool is always shut down
+    try:
+        if not online_augment:
+            print(f"Training on {dataset.count('train')} samples, validating on {dataset.count('val')}")
+            train_data = dataset.as_tf_dataset('train', batch_size=32, shuffle=True)
+            val_data = dataset.as_tf_dataset('val', batch_size=256)
+        else:
+            from wakeworddetection.augment_stream import AugmentedStream, load_recordings
+            from wakeworddetection.features import mfcc
+
+            stream = AugmentedStream('train', n_augment=n_augment, seed=seed, workers=workers)
+            static_count = dataset.count('train', AUGMENTED_FOLDERS)
+            print(f"Training on {static_count} processed samples and {len(stream)} augmented samples per epoch")
+
+            static_data = dataset.as_tf_dataset('train', batch_size=1024, shuffle=True, exclude_folders=AUGMENTED_FOLDERS).unbatch()
+            train_data = tf.data.Dataset.sample_from_datasets(
+                [static_data, stream.as_tf_dataset()],
+                weights=[float(static_count), float(len(stream))],
+                stop_on_empty_dataset=False
+            ).shuffle(8192).batch(32).prefetch(tf.data.AUTOTUNE)
+
+            # Validate on the unaugmented validation recordings, plus the processed validation samples
+            clips, labels, _ = load_recordings('val')
+            X_val, Y_val = dataset.load('val', exclude_folders=AUGMENTED_FOLDERS)
+            X_val = np.concatenate([X_val, mfcc(clips)])[..., np.newaxis]
+            Y_val = np.concatenate([Y_val.astype(np.float32), labels])
+            print(f"Validating on {len(X_val)} samples")
+            val_data = tf.data.Dataset.from_tensor_slices((X_val, Y_val)).batch(256)
+
+        model = fit(build_model(), train_data, val_data)
+        model.save(MODEL_PATH)
+
+        if stage1:
+            print("Training the first-stage model...")
+            stage1_model = fit(build_stage1_model(), train_data, val_data)
+            stage1_model.save(STAGE1_MODEL_PATH)
+    finally:
+        if stream is not None:
+            stream.close()
@@ -0,0 +1,62 @@
+import numpy as np
+from wakeworddetection.features import HOP_LENGTH
+
+# Audio is gated in frames this long, so a short, loud onset isn't averaged away over a whole stride
+VAD_FRAME_SIZE = HOP_LENGTH
+
+# A frame is active if it's louder than both VAD_MIN_DB and the noise floor plus VAD_MARGIN_DB. The
+# minimum keeps a silent room (or a muted mic) from opening the gate on tiny fluctuations.
+VAD_MIN_DB = -55.0  # dBFS
+VAD_MARGIN_DB = 10.0
+
+# How fast the noise floor estimate follows the level upwards, per frame. It drops to quieter
+# frames immediately, so speech barely raises it but a noisier room does over a few seconds.
+NOISE_FLOOR_RISE = 0.002
+
+class EnergyGate:
+    """
+    A cheap energy-based voice activity gate. It tracks the level of incoming audio against an
+    adaptive noise floor, and only lets a window through if some frame in it was active. Windows
+    that contain nothing but the room's background noise skip feature extraction and inference.
+    """
+
+    def __init__(self, min_db=VAD_MIN_DB, margin_db=VAD_MARGIN_DB, frame_size=VAD_FRAME_SIZE):
+        self.min_db = min_db
+        self.margin_db = margin_db
+        self.frame_size = frame_size
+        self.reset()
+
+    def reset(self):
+        # Starting at the minimum means the gate errs on the side of being open while the floor
+        # adapts to a noisy room, and speech right at the start isn't mistaken for the floor
+        self.noise_floor_db = self.min_db
+        # Absolute end of the audio seen so far, and of the last active frame
+        self.seen_end = 0
+        self.last_active_end = float('-inf')
+
+    def frame_levels(self, audio) -> np.ndarray:
+        n_frames = len(audio) // self.frame_size
+        frames = audio[len(audio) - n_frames * self.frame_size:].reshape(n_frames, self.frame_size)
+        power = np.mean(frames.astype(np.float32) ** 2, axis=1)
+        return 10 * np.log10(np.maximum(power, 1e-10))
+
+    def update(self, window, start) -> bool:
+        """
+        Feed the window starting at absolute position `start`, and return whether it may contain
+        speech. Only the part of the window that's newer than the previous one is analyzed.
+        """
+        end = start + len(window)
+        new = min(len(window), end - self.seen_end)
+        if new > 0:
+            levels = self.frame_levels(window[len(window) - new:])
+            for i, level in enumerate(levels):
+                if level < self.noise_floor_db:
+                    self.noise_floor_db = level
+                else:
+                    self.noise_floor_db += (level - self.noise_floor_db) * NOISE_FLOOR_RISE
+
+                if level > max(self.min_db, self.noise_floor_db + self.margin_db):
+                    self.last_active_end = end - (len(levels) - 1 - i) * self.frame_size
+            self.seen_end = end
+
+        return self.last_active_end > start
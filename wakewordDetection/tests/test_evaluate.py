@@ -0,0 +1,35 @@
+import numpy as np
+from wakeworddetection.evaluate import roc_curve, roc_auc, operating_points
+
+def test_target_point_prefers_lower_false_accept_rate_then_higher_threshold():
+    # The false reject rate is flat over most of the range, like it is when the positives all
+    # score near 1, so the lowest threshold ties with much safer ones
+    thresholds = np.array([0.1, 0.3, 0.5, 0.7, 0.9])
+    false_accept_rate = np.array([0.01, 0.005, 0.0, 0.0, 0.0])
+    false_reject_rate = np.array([0.02, 0.02, 0.02, 0.02, 0.5])
+
+    point = operating_points(thresholds, false_accept_rate, false_reject_rate)["target_false_accept_rate"]
+    assert point["threshold"] == 0.7
+    assert point["false_accept_rate"] == 0.0
+    assert point["false_reject_rate"] == 0.02
+
+def test_equal_error_rate_ties_prefer_higher_threshold():
+    thresholds = np.array([0.2, 0.4, 0.6, 0.8])
+    false_accept_rate = np.array([0.3, 0.1, 0.1, 0.0])
+    false_reject_rate = np.array([0.0, 0.1, 0.1, 0.4])
+
+    point = operating_points(thresholds, false_accept_rate, false_reject_rate)["equal_error_rate"]
+    assert point["threshold"] == 0.6
+
+def test_roc_curve_reaches_every_point_with_scores_of_zero():
+    # Int8 models often score exactly 0, so the lowest threshold has to be below that
+    predictions = np.array([0, 0, 0, 0, 0.5, 0.9, 0, 0.9], dtype=np.float32)
+    labels = np.array([0, 0, 0, 0, 0, 1, 1, 1])
+
+    thresholds, false_accept_rate, false_reject_rate = roc_curve(predictions, labels)
+    assert np.isfinite(thresholds).all()
+    assert thresholds[0] < 0
+    assert false_accept_rate[0] == 1 and false_reject_rate[0] == 0
+    assert false_accept_rate[-1] == 0 and false_reject_rate[-1] == 1
+    # What sklearn.metrics.roc_auc_score gives
+    assert np.isclose(roc_auc(false_accept_rate, false_reject_rate), 0.8)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE, N_FFT, HOP_LENGTH, N_MFCC, StreamingMFCC, mfcc
+from wakeworddetection.benchmark import make_test_audio
+
+librosa = pytest.importorskip("librosa")
+
+# Max abs difference from librosa allowed, on features that range over hundreds of dB
+TOLERANCE = 1e-4
+
+def librosa_mfcc(y):
+    return librosa.feature.mfcc(y=y, sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH).T
+
+def test_single_clip_matches_librosa():
+    for y in make_test_audio(4):
+        np.testing.assert_allclose(mfcc(y), librosa_mfcc(y), rtol=0, atol=TOLERANCE)
+
+def test_batch_matches_librosa():
+    # More clips than one chunk of the batched path
+    audio = make_test_audio(70, seed=1)
+    features = mfcc(audio)
+    assert features.shape == (70, *librosa_mfcc(audio[0]).shape)
+    np.testing.assert_allclose(features, np.stack([librosa_mfcc(y) for y in audio]), rtol=0, atol=TOLERANCE)
+
+def test_streaming_matches_librosa():
+    # Clips back to back, so the stream has loud and quiet stretches, compared at every stride
+    stream = make_test_audio(3, seed=2).reshape(-1)
+    streaming = StreamingMFCC()
+    for end in range(WINDOW_SIZE, len(stream) + 1, 8 * HOP_LENGTH):
+        window = stream[end - WINDOW_SIZE:end]
+        np.testing.assert_allclose(streaming.update(window, end - WINDOW_SIZE), librosa_mfcc(window), rtol=0, atol=TOLERANCE)
+
+def test_streaming_after_a_gap_matches_librosa():
+    # A window that doesn't follow on from the last one has to be computed from scratch
+    audio = make_test_audio(2, seed=3)
+    streaming = StreamingMFCC()
+    streaming.update(audio[0], 0)
+    np.testing.assert_allclose(streaming.update(audio[1], 10 * WINDOW_SIZE), librosa_mfcc(audio[1]), rtol=0, atol=TOLERANCE)
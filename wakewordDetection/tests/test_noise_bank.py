@@ -0,0 +1,72 @@
+import json
+import random
+import numpy as np
+import pytest
+import soundfile as sf
+from wakeworddetection import augment
+from wakeworddetection.augment import NoiseBank, build_noise_bank
+
+@pytest.fixture
+def noise_dir(tmp_path, monkeypatch):
+    """
+    A few noise files, and the noise bank paths pointed at tmp_path.
+    """
+    directory = tmp_path / "background"
+    directory.mkdir()
+    rng = np.random.default_rng(0)
+    for i, seconds in enumerate([1.0, 0.5, 2.0]):
+        sf.write(directory / f"noise_{i}.wav", rng.uniform(-0.5, 0.5, int(seconds * 16000)).astype(np.float32), 16000)
+
+    monkeypatch.setattr(augment, "NOISE_DIR", str(directory))
+    monkeypatch.setattr(augment, "NOISE_BANK_PATH", str(tmp_path / "noise_bank.f32"))
+    monkeypatch.setattr(augment, "NOISE_BANK_INDEX_PATH", str(tmp_path / "noise_bank.json"))
+    return directory
+
+def open_bank():
+    return NoiseBank(augment.NOISE_BANK_PATH, augment.NOISE_BANK_INDEX_PATH)
+
+def test_build_and_read(noise_dir):
+    build_noise_bank(workers=1)
+    bank = open_bank()
+
+    assert bank.names == ["noise_0.wav", "noise_1.wav", "noise_2.wav"]
+    assert list(bank.lengths) == [16000, 8000, 32000]
+    assert len(bank.data) == 56000
+    # Normalized to -10 dBFS
+    assert np.isclose(np.abs(bank.data[:16000]).max(), 10**(-10 / 20))
+
+    noise = bank.random_slice(12000, random.Random(0))
+    assert noise.shape == (12000,)
+
+def test_failed_index_write_keeps_the_old_bank(noise_dir, monkeypatch):
+    build_noise_bank(workers=1)
+    with open(augment.NOISE_BANK_INDEX_PATH) as f:
+        old_index = f.read()
+
+    (noise_dir / "noise_1.wav").unlink()
+    def fail(*args, **kwargs):
+        raise OSError("Disk full")
+    monkeypatch.setattr(augment.json, "dump", fail)
+    with pytest.raises(OSError):
+        build_noise_bank(workers=1)
+
+    with open(augment.NOISE_BANK_INDEX_PATH) as f:
+        assert f.read() == old_index
+    assert len(open_bank().data) == 56000
+
+def test_bank_that_does_not_match_its_index_is_rejected(noise_dir):
+    build_noise_bank(workers=1)
+
+    # What a crash between replacing the bank and replacing the index leaves behind
+    np.zeros(40000, dtype=np.float32).tofile(augment.NOISE_BANK_PATH)
+    with pytest.raises(ValueError, match="doesn't match its index"):
+        open_bank()
+
+    # An index from before the size was recorded is checked against its last file
+    with open(augment.NOISE_BANK_INDEX_PATH) as f:
+        index = json.load(f)
+    del index["samples"]
+    with open(augment.NOISE_BANK_INDEX_PATH, 'w') as f:
+        json.dump(index, f)
+    with pytest.raises(ValueError):
+        open_bank()
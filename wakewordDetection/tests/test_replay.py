@@ -0,0 +1,87 @@
+import numpy as np
+import soundfile as sf
+from wakeworddetection.features import SAMPLE_RATE, WINDOW_SIZE, N_MFCC
+from wakeworddetection.test import Detector, STRIDE_SIZE, STAGES
+from wakeworddetection.replay import replay
+
+# The first MFCC of a window of pure silence is far below this, and of any window with sound in it, above
+SILENCE_LEVEL = -800
+
+class StubDetector(Detector):
+    """
+    Detects any window with sound in it, without a model, and remembers when it detected.
+    """
+
+    def __init__(self, name="stub"):
+        # Detector.__init__ would load a model
+        self.name = name
+        self.threshold = 0.5
+        self.debounce_time = 0.5
+        self.times = []
+        self.reset()
+
+    def predict(self, input_tensor) -> float:
+        return 1.0 if np.reshape(input_tensor, (-1, N_MFCC))[:, 0].max() > SILENCE_LEVEL else 0.0
+
+    def update(self, prediction, current_time) -> bool:
+        detected = super().update(prediction, current_time)
+        if detected:
+            self.times.append(current_time)
+        return detected
+
+def write_clip(path, seconds, tone_start=None, tone_length=0.1):
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    if tone_start is not None:
+        start, end = int(tone_start * SAMPLE_RATE), int((tone_start + tone_length) * SAMPLE_RATE)
+        audio[start:end] = 0.5 * np.sin(2 * np.pi * 440 * np.arange(end - start) / SAMPLE_RATE)
+    sf.write(path, audio, SAMPLE_RATE)
+    return str(path)
+
+def test_replay_detects_a_synthetic_wakeword(tmp_path):
+    wakeword = write_clip(tmp_path / "wakeword.wav", 3, tone_start=1.5)
+    silence = write_clip(tmp_path / "silence.wav", 3)
+    detector = StubDetector()
+
+    report = replay([wakeword, silence], [detector], {"wakeword.wav": 1.5, "silence.wav": None})
+
+    # Windows end every stride after the first full window. The first to reach the tone detects
+    # it, and the tone stays in view long enough for two more once the debounce time has passed.
+    tone_start, tone_end = int(1.5 * SAMPLE_RATE), int(1.6 * SAMPLE_RATE)
+    ends = [end for end in range(WINDOW_SIZE, 4 * SAMPLE_RATE, STRIDE_SIZE) if tone_start < end < tone_end + WINDOW_SIZE]
+    expected = [ends[0] / SAMPLE_RATE]
+    for end in ends[1:]:
+        if end / SAMPLE_RATE - expected[-1] > detector.debounce_time:
+            expected.append(end / SAMPLE_RATE)
+    assert len(expected) == 3
+    assert np.allclose(detector.times, expected)
+
+    assert set(report) == {"files", "vad", "audio_seconds", "wall_seconds", "realtime_factor", "stream", "stages", "detectors"}
+    assert report["files"] == 2
+    # Each file is followed by a window of silence
+    assert report["audio_seconds"] == 2 * (3 + WINDOW_SIZE / SAMPLE_RATE)
+    assert report["realtime_factor"] > 1
+    assert report["stream"]["evaluated_strides"] > 0
+    assert report["stream"]["dropped_strides"] == 0
+    assert set(report["stages"]) == set(STAGES)
+
+    result = report["detectors"]["stub"]
+    assert result["detected"] == 1
+    assert result["missed"] == 0
+    assert result["recall"] == 1.0
+    assert result["false_detections"] == 0
+    assert result["duplicate_detections"] == 2
+    assert result["mean_latency_s"] >= expected[0] - 1.5
+
+def test_replay_counts_missed_and_false_detections(tmp_path):
+    # Labeled with an onset, but silent, and a tone where there's no wakeword
+    missed = write_clip(tmp_path / "missed.wav", 2)
+    false_alarm = write_clip(tmp_path / "false_alarm.wav", 2, tone_start=0.5)
+    detector = StubDetector()
+
+    report = replay([missed, false_alarm], [detector], {"missed.wav": 1.0})
+
+    result = report["detectors"]["stub"]
+    assert (result["detected"], result["missed"]) == (0, 1)
+    assert result["recall"] == 0.0
+    assert result["false_detections"] == len(detector.times) > 0
+    assert result["mean_latency_s"] is None
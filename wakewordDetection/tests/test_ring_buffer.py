@@ -0,0 +1,78 @@
+import time
+import threading
+import numpy as np
+from wakeworddetection.features import WINDOW_SIZE
+from wakeworddetection.test import RingBuffer, WakewordListener, STRIDE_SIZE, CATCH_UP
+
+def ramp(start, stop):
+    # Every sample is its own position, so a window that mixes old and new audio is easy to spot
+    return np.arange(start, stop, dtype=np.float32)
+
+def start_unfinished_write(ring: RingBuffer, samples: np.ndarray) -> threading.Thread:
+    """
+    Start writing `samples` on another thread, like the audio callback, and return once the
+    samples are copied in but before `written` is updated. The caller must hold ring.condition,
+    which is what holds the writer there.
+    """
+    writer = threading.Thread(target=ring.write, args=(samples,))
+    writer.start()
+    end = (ring.written + len(samples) - 1) % ring.capacity
+    deadline = time.monotonic() + 5
+    while ring.buffer[end] != samples[-1]:
+        assert time.monotonic() < deadline, "the writer never copied its samples"
+        time.sleep(0.001)
+    return writer
+
+def test_read_returns_window():
+    ring = RingBuffer(8)
+    ring.write(ramp(0, 6))
+    ring.write(ramp(6, 12))
+
+    out = np.zeros(4, dtype=np.float32)
+    assert ring.read(12, out)
+    np.testing.assert_array_equal(out, ramp(8, 12))
+    assert not ring.read(7, out)
+
+def test_read_during_write_of_oldest_samples():
+    ring = RingBuffer(8)
+    ring.write(ramp(0, 8))
+
+    # Read the oldest samples, which is where catch-up resumes after an overrun, while the next
+    # block is overwriting them
+    out = np.zeros(4, dtype=np.float32)
+    with ring.condition:
+        writer = start_unfinished_write(ring, ramp(8, 12))
+        assert not ring.read(4, out)
+    writer.join()
+
+def test_read_during_write_elsewhere():
+    ring = RingBuffer(8)
+    ring.write(ramp(0, 8))
+
+    # The new block doesn't touch the samples being read
+    out = np.zeros(4, dtype=np.float32)
+    with ring.condition:
+        writer = start_unfinished_write(ring, ramp(8, 10))
+        assert ring.read(8, out)
+    writer.join()
+    np.testing.assert_array_equal(out, ramp(4, 8))
+
+def test_catch_up_during_write_never_evaluates_mixed_windows():
+    listener = WakewordListener([], policy=CATCH_UP, ring_buffer_size=2 * WINDOW_SIZE)
+    windows = []
+    listener.detect_wakeword = lambda window, start: windows.append((start, window.copy()))
+
+    # Fall far enough behind that catch-up has to skip ahead to the oldest samples, and catch up
+    # while the next block is being written over them
+    total = 3 * WINDOW_SIZE
+    listener.ring.write(ramp(0, total))
+    with listener.ring.condition:
+        writer = start_unfinished_write(listener.ring, ramp(total, total + STRIDE_SIZE))
+        listener.process_pending()
+    writer.join()
+    listener.process_pending()
+
+    assert listener.overruns >= 1
+    assert windows
+    for start, window in windows:
+        np.testing.assert_array_equal(window, ramp(start, start + WINDOW_SIZE))